@@ -1,6 +1,11 @@
 from django.contrib import admin
-from .models import Calendar, Event
+from .models import Calendar, DeletionJob, Event, EventOccurrence, FeedVersion, ImportJob, ParsedFeed
 
 # Register your models here.
 admin.site.register(Calendar)
-admin.site.register(Event)
\ No newline at end of file
+admin.site.register(Event)
+admin.site.register(ImportJob)
+admin.site.register(ParsedFeed)
+admin.site.register(FeedVersion)
+admin.site.register(EventOccurrence)
+admin.site.register(DeletionJob)
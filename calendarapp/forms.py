@@ -1,19 +1,41 @@
 from django import forms
 
-# from .models import Event
+from .models import Calendar
 
 
 class CalendarUploadForm(forms.Form):
     name = forms.CharField(
         max_length=255,
+        required=False,
         widget=forms.TextInput(attrs={
             'class': 'form-control',
             'placeholder': 'Enter calendar name'
         })
     )
+    calendar = forms.ModelChoiceField(
+        queryset=Calendar.objects.none(),
+        required=False,
+        empty_label="New calendar",
+        label="Update an existing calendar",
+        widget=forms.Select(attrs={
+            'class': 'form-control'
+        })
+    )
     ics_file = forms.FileField(
         widget=forms.ClearableFileInput(attrs={
             'class': 'form-control',
             'accept': '.ics'
         })
-    )
\ No newline at end of file
+    )
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only the user's own calendars can be re-imported into
+        if user is not None:
+            self.fields["calendar"].queryset = Calendar.objects.filter(user=user, pending_delete=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get("name") and not cleaned_data.get("calendar"):
+            self.add_error("name", "Enter a name for the new calendar, or pick a calendar to update.")
+        return cleaned_data
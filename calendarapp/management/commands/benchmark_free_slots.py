@@ -0,0 +1,103 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from util.busy_intervals import group_busy_intervals
+from util.free_slots import MIN_BREAK, SCHEDULING_HORIZON, find_group_slots, find_slots
+
+
+def dense_calendar(randomizer, start, days, per_day):
+    """
+    Returns busy intervals of 15 minutes to 3 hours, per_day of them a day on average, mostly between 8am and
+    8pm and overlapping freely, as in a timetable with clubs, shifts and study sessions on top.
+    """
+    intervals = []
+    for _ in range(days * per_day):
+        interval_start = start + timedelta(days=randomizer.randrange(days), minutes=randomizer.randrange(8 * 60, 20 * 60, 5))
+        intervals.append((interval_start, interval_start + timedelta(minutes=randomizer.randrange(15, 181, 15))))
+    return intervals
+
+
+class Command(BaseCommand):
+    help = (
+        "Times finding free slots for a study session in dense generated calendars of growing size, over "
+        "horizons of growing length, then for study groups sharing a week, and with --user in real users' calendars."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--per-day", type=int, default=12,
+            help="Average number of busy intervals a day in the generated calendars (default: 12).",
+        )
+        parser.add_argument(
+            "--days", type=int, nargs="+", default=[7, 30, 365, 3650],
+            help="Lengths in days of the generated calendars (default: 7 30 365 3650).",
+        )
+        parser.add_argument(
+            "--group-sizes", type=int, nargs="+", default=[2, 10, 30, 100],
+            help="Numbers of people in the generated study groups (default: 2 10 30 100).",
+        )
+        parser.add_argument(
+            "--group-per-day", type=int, default=2,
+            help="Average number of busy intervals a day for each person in a generated study group (default: 2).",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5,
+            help="Number of times each search is run, of which the fastest is reported (default: 5).",
+        )
+        parser.add_argument(
+            "--user", nargs="+", default=None,
+            help="Usernames of a study group whose calendars are searched over the scheduling horizon, host first.",
+        )
+
+    def handle(self, *args, **options):
+        randomizer = random.Random(0)
+        start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        self.stdout.write(f"{'days':>6} {'intervals':>10} {'slots':>6} {'ms':>9} {'us/interval':>12}")
+        for days in options["days"]:
+            busy = dense_calendar(randomizer, start, days, options["per_day"])
+            end = start + timedelta(days=days)
+            best, slots = self.time(options["repeat"], lambda: find_slots(busy, start, end, min_break=timedelta(minutes=15)))
+            self.stdout.write(
+                f"{days:>6} {len(busy):>10} {len(slots):>6} {best * 1000:>9.2f} {best * 1e6 / max(len(busy), 1):>12.2f}"
+            )
+
+        self.stdout.write(f"{'people':>6} {'intervals':>10} {'slots':>6} {'ms':>9}")
+        end = start + SCHEDULING_HORIZON
+        for size in options["group_sizes"]:
+            group = [dense_calendar(randomizer, start, SCHEDULING_HORIZON.days, options["group_per_day"]) for _ in range(size)]
+            best, slots = self.time(options["repeat"], lambda: find_group_slots(group, start, end, min_break=timedelta(0)))
+            self.stdout.write(f"{size:>6} {sum(map(len, group)):>10} {len(slots):>6} {best * 1000:>9.2f}")
+
+        if options["user"]:
+            users = []
+            for username in options["user"]:
+                try:
+                    users.append(get_user_model().objects.get(username=username))
+                except get_user_model().DoesNotExist:
+                    raise CommandError(f"No user called {username}")
+            now = timezone.localtime()
+            end = now + SCHEDULING_HORIZON
+
+            def search():
+                busy = group_busy_intervals(users, now - MIN_BREAK, end + MIN_BREAK)
+                return find_group_slots(list(busy.values()), now, end)
+
+            best, slots = self.time(options["repeat"], search)
+            first = f", first at {slots[0].start:%a %d %b %H:%M}" if slots else ""
+            names = ", ".join(user.username for user in users)
+            self.stdout.write(f"{names}: {len(slots)} slot(s) in {best * 1000:.2f} ms including the queries{first}")
+
+    def time(self, repeat, search):
+        best = None
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            result = search()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
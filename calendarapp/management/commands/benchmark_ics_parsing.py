@@ -0,0 +1,74 @@
+import io
+import os
+import re
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from util.parse_ics import ImportResult, iter_rows
+
+
+def build_feed(events, source):
+    """
+    Builds an ICS feed with the given number of events by repeating the VEVENTs of a sample
+    file, giving each copy its own UID.
+    """
+    with open(source, encoding="utf-8") as f:
+        text = f.read()
+
+    header = text[:text.index("BEGIN:VEVENT")]
+    vevents = re.findall(r"BEGIN:VEVENT.*?END:VEVENT\r?\n", text, re.S)
+    body = "".join(vevents[i % len(vevents)].replace("UID:", f"UID:{i}-", 1) for i in range(events))
+    return (header + body + "END:VCALENDAR\n").encode("utf-8")
+
+
+class Command(BaseCommand):
+    help = "Times ICS parsing with different numbers of parse workers, to show how it scales."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--events", type=int, default=50000,
+            help="Number of events in the generated feed (default: 50000).",
+        )
+        parser.add_argument(
+            "--files", type=int, default=1,
+            help="Split the events across this many files, as for a multi-file upload (default: 1).",
+        )
+        parser.add_argument(
+            "--workers", default=None,
+            help="Comma separated worker counts to try (default: 1, 2, 4... up to the number of CPUs).",
+        )
+        parser.add_argument(
+            "--source", default=os.path.join(settings.BASE_DIR, "calendarTest.ics"),
+            help="ICS file whose events are repeated to build the feed.",
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"]:
+            worker_counts = [int(count) for count in options["workers"].split(",")]
+        else:
+            worker_counts = [1]
+            while worker_counts[-1] * 2 <= (os.cpu_count() or 1):
+                worker_counts.append(worker_counts[-1] * 2)
+
+        files = max(options["files"], 1)
+        per_file = options["events"] // files
+        feeds = [build_feed(per_file, options["source"]) for _ in range(files)]
+        self.stdout.write(
+            f"Parsing {per_file * files} events in {files} file(s), "
+            f"{sum(len(feed) for feed in feeds) / 1024 / 1024:.1f} MB, on {os.cpu_count()} CPU(s)"
+        )
+        self.stdout.write(f"{'workers':>8} {'seconds':>9} {'events/s':>10} {'speedup':>8}")
+
+        baseline = None
+        for workers in worker_counts:
+            result = ImportResult()
+            started = time.perf_counter()
+            parsed = sum(1 for _ in iter_rows([io.BytesIO(feed) for feed in feeds], result, workers))
+            elapsed = time.perf_counter() - started
+
+            baseline = baseline or elapsed
+            self.stdout.write(
+                f"{workers:>8} {elapsed:>9.2f} {parsed / elapsed:>10.0f} {baseline / elapsed:>7.2f}x"
+            )
@@ -0,0 +1,55 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from util.recurrence import event_rule
+from util.vector_recurrence import expand_rules, to_datetimes
+
+# Rules like those found in imported timetables. Rules outside these shapes fall back to dateutil
+# and expand no faster.
+SAMPLE_RULES = (
+    "FREQ=WEEKLY;COUNT=11",
+    "FREQ=WEEKLY;COUNT=10;BYDAY=MO,WE",
+    "FREQ=WEEKLY;INTERVAL=2;UNTIL=20260601T000000Z",
+    "FREQ=WEEKLY;BYDAY=TU,TH",
+    "FREQ=DAILY;COUNT=30",
+    "FREQ=DAILY;BYDAY=MO,TU,WE,TH,FR",
+)
+
+
+class Command(BaseCommand):
+    help = "Times expanding recurring events over a year with dateutil and with the vectorized engine."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--events", type=int, default=10000,
+            help="Number of recurring events to expand (default: 10000).",
+        )
+
+    def handle(self, *args, **options):
+        randomizer = random.Random(0)
+        now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        rules = [
+            event_rule(randomizer.choice(SAMPLE_RULES), now + timedelta(hours=randomizer.randrange(24 * 180)))
+            for _ in range(options["events"])
+        ]
+        window = (now, now + timedelta(days=365))
+
+        started = time.perf_counter()
+        expected = [rule.between(*window, inc=True) for rule in rules]
+        dateutil_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        walls = expand_rules(rules, *window)
+        numpy_time = time.perf_counter() - started
+
+        occurrences = sum(len(rule_occurrences) for rule_occurrences in expected)
+        matches = all(to_datetimes(a, rule._tzinfo) == b for a, b, rule in zip(walls, expected, rules))
+        self.stdout.write(f"Expanded {len(rules)} events into {occurrences} occurrences over a year")
+        self.stdout.write(f"{'engine':>10} {'seconds':>9}")
+        self.stdout.write(f"{'dateutil':>10} {dateutil_time:>9.3f}")
+        self.stdout.write(f"{'numpy':>10} {numpy_time:>9.3f}  {dateutil_time / numpy_time:.1f}x faster")
+        self.stdout.write("Results match" if matches else "Results differ")
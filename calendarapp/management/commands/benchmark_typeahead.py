@@ -0,0 +1,81 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from calendarapp.views import typeahead
+from util.typeahead import TitleTrie
+
+# Words that timetable titles are made of
+SAMPLE_WORDS = (
+    "lecture", "tutorial", "lab", "seminar", "workshop", "revision", "software", "engineering", "databases",
+    "networks", "operating", "systems", "maths", "statistics", "algorithms", "security", "machine", "learning",
+    "graphics", "project", "group", "meeting", "exam", "coursework", "physics", "chemistry", "week",
+)
+
+
+def percentile(times, fraction):
+    return sorted(times)[min(len(times) - 1, int(len(times) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Times typeahead suggestions for bursts of keystrokes, each burst typing a title one character "
+        "at a time, against a generated trie or, with --user, through the endpoint for a real user."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--titles", type=int, default=5000,
+            help="Number of distinct titles in the generated trie (default: 5000).",
+        )
+        parser.add_argument(
+            "--bursts", type=int, default=200,
+            help="Number of titles typed (default: 200).",
+        )
+        parser.add_argument(
+            "--user", default=None,
+            help="Username whose events, sessions and modules are searched through the endpoint.",
+        )
+
+    def handle(self, *args, **options):
+        randomizer = random.Random(0)
+        titles = {}
+        while len(titles) < options["titles"]:
+            title = " ".join(randomizer.choice(SAMPLE_WORDS).capitalize() for _ in range(randomizer.randint(1, 4)))
+            titles[randomizer.choice(("event", "session")), f"{title} {len(titles)}"] = randomizer.randint(1, 30)
+
+        started = time.perf_counter()
+        trie = TitleTrie(titles)
+        self.stdout.write(f"Built a trie of {len(titles)} titles in {time.perf_counter() - started:.3f}s")
+
+        typed = [randomizer.choice(list(titles))[1] for _ in range(options["bursts"])]
+        keystrokes = [title[:length] for title in typed for length in range(1, len(title) + 1)]
+        self.report("trie", keystrokes, trie.search)
+
+        if options["user"]:
+            try:
+                user = get_user_model().objects.get(username=options["user"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user called {options['user']}")
+            factory = RequestFactory()
+
+            def request(query):
+                request = factory.get("/typeahead/", {"q": query})
+                request.user = user
+                return typeahead(request)
+
+            self.report("endpoint", keystrokes, request)
+
+    def report(self, name, keystrokes, search):
+        times = []
+        for query in keystrokes:
+            started = time.perf_counter()
+            search(query)
+            times.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(
+            f"{name}: {len(keystrokes)} keystrokes, p50 {percentile(times, 0.5):.2f} ms, "
+            f"p99 {percentile(times, 0.99):.2f} ms, max {max(times):.2f} ms"
+        )
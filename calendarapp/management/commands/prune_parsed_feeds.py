@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from calendarapp.models import ParsedFeed
+
+
+class Command(BaseCommand):
+    help = "Deletes cached ICS parses that have not been used recently."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=30,
+            help="Delete parses not used for this many days (default: 30).",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        pruned = 0
+        for feed in ParsedFeed.objects.filter(last_used_at__lt=cutoff):
+            feed.rows.delete(save=False)
+            feed.delete()
+            pruned += 1
+        self.stdout.write(f"Deleted {pruned} cached parse(s)")
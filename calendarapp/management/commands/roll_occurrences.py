@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from util.occurrences import OCCURRENCE_HORIZON, roll
+
+
+class Command(BaseCommand):
+    help = "Writes the occurrences of recurring events up to the rolling horizon. Run it daily."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=OCCURRENCE_HORIZON.days,
+            help=f"Write occurrences up to this many days from now (default: {OCCURRENCE_HORIZON.days}).",
+        )
+
+    def handle(self, *args, **options):
+        written = roll(timezone.now() + timedelta(days=options["days"]))
+        self.stdout.write(f"Wrote {written} occurrence(s)")
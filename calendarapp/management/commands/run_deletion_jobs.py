@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from calendarapp.models import DeletionJob
+from util.deletion_jobs import PURGE_CHUNK_SIZE, claim_jobs, run_deletion_job
+
+
+class Command(BaseCommand):
+    help = "Deletes queued calendars and accounts, a chunk of rows at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=PURGE_CHUNK_SIZE,
+            help=f"Number of rows deleted in each transaction (default: {PURGE_CHUNK_SIZE}).",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=5.0,
+            help="Seconds to wait between checks for new jobs.",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Exit once the queue is empty instead of waiting for new jobs.",
+        )
+
+    def handle(self, *args, **options):
+        # Deletions run one at a time, so they never hold more than one chunk's locks between them
+        while True:
+            claimed = claim_jobs(1)
+            for job_id in claimed:
+                run_deletion_job(job_id, max(options["chunk_size"], 1))
+                job = DeletionJob.objects.get(id=job_id)
+                self.stdout.write(f"Deletion job {job_id} ({job.kind} {job.name}): {job.state}. {job.message}")
+            if not claimed:
+                if options["once"]:
+                    return
+                time.sleep(options["poll_interval"])
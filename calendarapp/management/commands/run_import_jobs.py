@@ -0,0 +1,73 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from util.import_jobs import claim_jobs, fail_job, run_import_job
+from util.workers import run, worker_pool
+
+
+class Command(BaseCommand):
+    help = "Runs queued calendar import jobs using a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1,
+            help="Number of imports to run at the same time (default: number of CPUs).",
+        )
+        parser.add_argument(
+            "--parse-workers", type=int, default=1,
+            help="Number of processes each import uses to parse its file (default: 1).",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=1.0,
+            help="Seconds to wait between checks for new jobs.",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Exit once the queue is empty instead of waiting for new jobs.",
+        )
+        parser.add_argument(
+            "--inline", action="store_true",
+            help="Run jobs one at a time in this process instead of a worker pool.",
+        )
+
+    def handle(self, *args, **options):
+        if options["inline"]:
+            self.run_inline(options)
+        else:
+            self.run_pool(options)
+
+    def run_inline(self, options):
+        while True:
+            claimed = claim_jobs(1)
+            for job_id in claimed:
+                run_import_job(job_id, options["parse_workers"])
+                self.stdout.write(f"Finished import job {job_id}")
+            if not claimed:
+                if options["once"]:
+                    return
+                time.sleep(options["poll_interval"])
+
+    def run_pool(self, options):
+        workers = max(options["workers"], 1)
+        running = {}
+
+        with worker_pool(workers) as pool:
+            while True:
+                for future, job_id in list(running.items()):
+                    if future.done():
+                        del running[future]
+                        if future.exception():
+                            fail_job(job_id, f"Import failed: {future.exception()}")
+                            self.stderr.write(f"Import job {job_id} crashed: {future.exception()}")
+                        else:
+                            self.stdout.write(f"Finished import job {job_id}")
+
+                claimed = claim_jobs(workers - len(running)) if len(running) < workers else []
+                for job_id in claimed:
+                    running[pool.submit(run, "util.import_jobs.run_import_job", job_id, options["parse_workers"])] = job_id
+
+                if options["once"] and not running and not claimed:
+                    return
+                time.sleep(0 if claimed else options["poll_interval"])
@@ -0,0 +1,46 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from calendarapp.models import Calendar
+from util.time_shift import parse_shift, shift_calendar, shift_sessions
+
+
+class Command(BaseCommand):
+    help = "Moves every event in a calendar, or every study session a user hosts, by a number of days, hours and minutes."
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument("--calendar", type=int, help="Id of the calendar whose events are moved.")
+        target.add_argument("--sessions-of", help="Username of the user whose study sessions are moved.")
+        parser.add_argument("--days", type=int, default=0, help="Days to move by, negative to move earlier.")
+        parser.add_argument("--hours", type=int, default=0, help="Hours to move by. Not allowed for study sessions.")
+        parser.add_argument("--minutes", type=int, default=0, help="Minutes to move by. Not allowed for study sessions.")
+
+    def handle(self, *args, **options):
+        try:
+            delta = parse_shift(options)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        if options["calendar"] is not None:
+            try:
+                calendar = Calendar.objects.get(id=options["calendar"])
+            except Calendar.DoesNotExist:
+                raise CommandError(f"No calendar with id {options['calendar']}")
+            moved = shift_calendar(calendar, delta)
+            what = "event(s)"
+        else:
+            try:
+                user = get_user_model().objects.get(username=options["sessions_of"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user called {options['sessions_of']}")
+            try:
+                moved = shift_sessions(user, delta)
+            except ValueError as e:
+                raise CommandError(str(e))
+            what = "study session(s)"
+
+        self.stdout.write(f"Moved {moved} {what} by {delta} in {time.perf_counter() - started:.3f}s")
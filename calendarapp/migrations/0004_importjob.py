@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0003_event_type'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ics_file', models.FileField(blank=True, upload_to='calendar_imports/')),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('parsing', 'Parsing'), ('writing', 'Writing'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('bytes_total', models.PositiveBigIntegerField(default=0)),
+                ('bytes_read', models.PositiveBigIntegerField(default=0)),
+                ('events_parsed', models.PositiveIntegerField(default=0)),
+                ('events_created', models.PositiveIntegerField(default=0)),
+                ('events_skipped', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('calendar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='calendarapp.calendar')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0004_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='sequence',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='uid',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='events_deleted',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='events_updated',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='reimport',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['calendar', 'uid'], name='event_calendar_uid_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0006_parsedfeed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['calendar', 'start'], name='event_calendar_start_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0008_feedversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['calendar', 'end'], name='event_calendar_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('rrule__isnull', False)), fields=['calendar', 'start'], name='event_recurring_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0009_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='occurrences_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='EventOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('occurrence_start', models.DateTimeField()),
+                ('occurrence_end', models.DateTimeField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='calendarapp.event')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['event', 'occurrence_start'], name='occurrence_event_start_idx'), models.Index(fields=['occurrence_start'], name='occurrence_start_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:05
+
+import re
+from datetime import timedelta
+from itertools import islice
+
+from dateutil.rrule import rrule as Rule, rrulestr
+from django.db import migrations, models
+from django.utils import timezone
+
+FIELDS = ["rrule_freq", "rrule_interval", "rrule_count", "rrule_until", "rrule_byday", "last_occurrence"]
+
+# Frozen copies of util.recurrence as it stood when this migration was written, so later changes
+# to how rules are read don't change what it backfills
+
+NAIVE_UNTIL = re.compile(r"UNTIL=(\d{8})(T\d{6})?(?=;|$)", re.IGNORECASE)
+
+MAX_SCANNED_OCCURRENCES = 5000
+
+
+def rule_text(rrule):
+    lines = [line.strip() for line in rrule.splitlines() if line.strip()]
+    lines = [line for line in lines if not line.upper().startswith("DTSTART")]
+    return "\n".join(line[len("RRULE:"):] if line.upper().startswith("RRULE:") else line for line in lines)
+
+
+def event_rule(rrule, start):
+    def utc_until(match):
+        return f"UNTIL={match.group(1)}{match.group(2) or 'T235959'}Z"
+
+    return rrulestr(NAIVE_UNTIL.sub(utc_until, rule_text(rrule)), dtstart=timezone.localtime(start))
+
+
+def recurrence_fields(rrule, start, duration):
+    """
+    Returns the structured recurrence columns for an event's rrule text. Rules with more than
+    MAX_SCANNED_OCCURRENCES occurrences are given no last_occurrence, as if they never ended.
+    """
+    fields = {}
+    for line in rule_text(rrule).splitlines():
+        parts = dict(part.split("=", 1) for part in line.upper().split(";") if "=" in part)
+        if "FREQ" in parts:
+            fields["rrule_freq"] = parts["FREQ"][:10]
+            fields["rrule_byday"] = parts.get("BYDAY", "")[:64]
+            break
+
+    try:
+        rule = event_rule(rrule, start)
+    except (TypeError, ValueError):
+        return fields
+    if not isinstance(rule, Rule):
+        return fields
+
+    fields["rrule_interval"] = rule._interval
+    fields["rrule_count"] = rule._count
+    fields["rrule_until"] = rule._until
+    if rule._count is None and rule._until is None:
+        return fields
+    if rule._count is not None and rule._count > MAX_SCANNED_OCCURRENCES:
+        return fields
+    occurrences = list(islice(rule, MAX_SCANNED_OCCURRENCES + 1))
+    if len(occurrences) > MAX_SCANNED_OCCURRENCES:
+        return fields
+    if occurrences:
+        fields["last_occurrence"] = occurrences[-1] + (duration or timedelta(0))
+    else:
+        fields["last_occurrence"] = start
+    return fields
+
+
+def fill_recurrence_columns(apps, schema_editor):
+    Event = apps.get_model("calendarapp", "Event")
+    batch = []
+    for event in Event.objects.filter(rrule__isnull=False).exclude(rrule="").iterator(chunk_size=1000):
+        duration = event.duration or (event.end - event.start if event.end else None)
+        for field, value in recurrence_fields(event.rrule, event.start, duration).items():
+            setattr(event, field, value)
+        batch.append(event)
+        if len(batch) >= 1000:
+            Event.objects.bulk_update(batch, FIELDS)
+            batch = []
+    Event.objects.bulk_update(batch, FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0010_eventoccurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='last_occurrence',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='rrule_byday',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='rrule_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='rrule_freq',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='rrule_interval',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='rrule_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('rrule__isnull', False)), fields=['calendar', 'last_occurrence'], name='event_last_occurrence_idx'),
+        ),
+        migrations.RunPython(fill_recurrence_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:08
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Frozen copy of the trigger SQL as it stood when this migration was written
+INSTALL_TRIGGER = [
+    """
+    CREATE FUNCTION calendarapp_event_search_vector() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND NEW.title IS NOT DISTINCT FROM OLD.title
+                AND NEW.description IS NOT DISTINCT FROM OLD.description THEN
+            -- Django writes every column on save(), so keep the vector it doesn't know about
+            NEW.search_vector := OLD.search_vector;
+        ELSE
+            NEW.search_vector :=
+                setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER calendarapp_event_search_vector_update BEFORE INSERT OR UPDATE ON calendarapp_event
+    FOR EACH ROW EXECUTE FUNCTION calendarapp_event_search_vector()
+    """,
+    """
+    UPDATE calendarapp_event SET search_vector =
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    """,
+    "CREATE INDEX calendarapp_event_search_idx ON calendarapp_event USING gin (search_vector)",
+]
+
+REMOVE_TRIGGER = [
+    "DROP INDEX IF EXISTS calendarapp_event_search_idx",
+    "DROP TRIGGER IF EXISTS calendarapp_event_search_vector_update ON calendarapp_event",
+    "DROP FUNCTION IF EXISTS calendarapp_event_search_vector()",
+]
+
+
+def install_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for sql in INSTALL_TRIGGER:
+        schema_editor.execute(sql)
+
+
+def remove_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for sql in REMOVE_TRIGGER:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0011_event_recurrence_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(install_trigger, remove_trigger),
+    ]
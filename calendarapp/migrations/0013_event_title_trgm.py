@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:14
+
+from django.db import migrations
+
+
+def install_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute("CREATE INDEX calendarapp_event_title_trgm_idx ON calendarapp_event USING gin (title gin_trgm_ops)")
+
+
+def remove_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS calendarapp_event_title_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0012_event_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_index, remove_index),
+    ]
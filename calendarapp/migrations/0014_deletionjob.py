@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0013_event_title_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('calendar', 'Calendar'), ('account', 'Account')], max_length=10)),
+                ('user_id', models.PositiveIntegerField(db_index=True)),
+                ('calendar_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('rows_total', models.PositiveBigIntegerField(default=0)),
+                ('rows_deleted', models.PositiveBigIntegerField(default=0)),
+                ('message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='calendar',
+            name='pending_delete',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,99 @@
+import re
+from datetime import timedelta
+
+from dateutil.rrule import rrulestr
+from django.db import migrations
+from django.utils import timezone
+
+# Frozen copies of util.recurrence and util.occurrences as they stood when this migration was
+# written, so later changes to how occurrences are written don't change what it backfills
+
+NAIVE_UNTIL = re.compile(r"UNTIL=(\d{8})(T\d{6})?(?=;|$)", re.IGNORECASE)
+
+OCCURRENCE_HORIZON = timedelta(days=365)
+OCCURRENCE_HISTORY = timedelta(days=365)
+MAX_OCCURRENCES = 2000
+BATCH_SIZE = 500
+
+
+def event_rule(rrule, start):
+    lines = [line.strip() for line in rrule.splitlines() if line.strip()]
+    lines = [line for line in lines if not line.upper().startswith("DTSTART")]
+    text = "\n".join(line[len("RRULE:"):] if line.upper().startswith("RRULE:") else line for line in lines)
+
+    def utc_until(match):
+        return f"UNTIL={match.group(1)}{match.group(2) or 'T235959'}Z"
+
+    return rrulestr(NAIVE_UNTIL.sub(utc_until, text), dtstart=timezone.localtime(start))
+
+
+def expand(event, history_start, until):
+    """
+    Returns the (start, end) of an event's occurrences from history_start, or its start if that
+    is later, up to until, and the time they were written up to.
+    """
+    rule = event_rule(event.rrule, event.start)
+    if event.duration:
+        duration = event.duration
+    elif event.end:
+        duration = event.end - event.start
+    else:
+        duration = timedelta(0)
+
+    occurrences = []
+    for start in rule.xafter(max(event.start, history_start), count=MAX_OCCURRENCES, inc=True):
+        if start > until:
+            return occurrences, until
+        occurrences.append((start, start + duration))
+    if len(occurrences) == MAX_OCCURRENCES:
+        return occurrences, occurrences[-1][0]
+    return occurrences, until
+
+
+def write_batch(apps, events, history_start, until):
+    Event = apps.get_model("calendarapp", "Event")
+    EventOccurrence = apps.get_model("calendarapp", "EventOccurrence")
+    occurrences = []
+    by_horizon = {}
+    for event in events:
+        try:
+            event_occurrences, event_horizon = expand(event, history_start, until)
+        except (TypeError, ValueError):
+            continue
+        occurrences.extend(
+            EventOccurrence(event_id=event.id, occurrence_start=start, occurrence_end=end)
+            for start, end in event_occurrences
+        )
+        by_horizon.setdefault(event_horizon, []).append(event.id)
+    EventOccurrence.objects.bulk_create(occurrences, batch_size=BATCH_SIZE)
+    for event_horizon, event_ids in by_horizon.items():
+        Event.objects.filter(id__in=event_ids).update(occurrences_until=event_horizon)
+
+
+def backfill_occurrences(apps, schema_editor):
+    """
+    Materializes the recurring events saved before EventOccurrence was added, which search and the
+    windowed feeds otherwise never find occurrences for.
+    """
+    Event = apps.get_model("calendarapp", "Event")
+    now = timezone.now()
+    history_start, until = now - OCCURRENCE_HISTORY, now + OCCURRENCE_HORIZON
+    missing = Event.objects.filter(rrule__isnull=False, occurrences_until__isnull=True).exclude(rrule="")
+    batch = []
+    for event in missing.order_by("id").iterator(chunk_size=BATCH_SIZE):
+        batch.append(event)
+        if len(batch) >= BATCH_SIZE:
+            write_batch(apps, batch, history_start, until)
+            batch = []
+    write_batch(apps, batch, history_start, until)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0014_deletionjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_occurrences, migrations.RunPython.noop),
+    ]
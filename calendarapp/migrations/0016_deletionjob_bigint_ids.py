@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0015_backfill_event_occurrences'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deletionjob',
+            name='calendar_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='deletionjob',
+            name='user_id',
+            field=models.PositiveBigIntegerField(db_index=True),
+        ),
+    ]
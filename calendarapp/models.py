@@ -1,12 +1,18 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from users.models import CustomUser
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from util.recurrence import recurrence_fields
 
 # Create your models here.
 class Calendar(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="calendars")
     name = models.CharField(max_length=255, blank=False, null=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set once the calendar is queued for deletion, which hides it and its events until a DeletionJob purges them
+    pending_delete = models.BooleanField(default=False)
 
     def __str__(self):
         return self.user.username + " - " + self.name
@@ -26,6 +32,45 @@ class Event(models.Model):
     rrule = models.TextField(blank=True, null=True)
     type = models.CharField(max_length=10, choices=Types.choices, default=Types.EVENT)
 
+    # Set for imported events, so a re-import of the same feed can tell which events changed
+    uid = models.CharField(max_length=255, blank=True, default="")
+    sequence = models.PositiveIntegerField(default=0)
+    content_hash = models.CharField(max_length=64, blank=True, default="")
+
+    # How far ahead the occurrences of a recurring event have been written to EventOccurrence
+    occurrences_until = models.DateTimeField(null=True, blank=True)
+
+    # The parts of rrule that queries filter on, kept in step with it by normalize()
+    rrule_freq = models.CharField(max_length=10, blank=True, default="")
+    rrule_interval = models.PositiveIntegerField(null=True, blank=True)
+    rrule_count = models.PositiveIntegerField(null=True, blank=True)
+    rrule_until = models.DateTimeField(null=True, blank=True)
+    rrule_byday = models.CharField(max_length=64, blank=True, default="")
+    # When the last occurrence of a recurring event ends, or null if it never stops recurring
+    last_occurrence = models.DateTimeField(null=True, blank=True)
+
+    # Filled from the title and description by a trigger on PostgreSQL, and unused elsewhere (see util.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["calendar", "uid"], name="event_calendar_uid_idx"),
+            models.Index(fields=["calendar", "start"], name="event_calendar_start_idx"),
+            models.Index(fields=["calendar", "end"], name="event_calendar_end_idx"),
+            # Recurring events are looked up on their own, by feeds and search
+            models.Index(
+                fields=["calendar", "start"],
+                name="event_recurring_idx",
+                condition=models.Q(rrule__isnull=False),
+            ),
+            # Lets windowed queries rule out recurring events that have stopped recurring
+            models.Index(
+                fields=["calendar", "last_occurrence"],
+                name="event_last_occurrence_idx",
+                condition=models.Q(rrule__isnull=False),
+            ),
+        ]
+
     def clean(self):
         # Ensure start is set
         if not self.start:
@@ -40,7 +85,11 @@ class Event(models.Model):
             self.end = self.start + self.duration
 
 
-    def save(self, *args, **kwargs):
+    def normalize(self):
+        """
+        Coerces string datetimes and derives the duration and the structured recurrence columns.
+        Called by save(), and directly by bulk writers which skip save().
+        """
         # Ensure start and end are datetime objects
         if isinstance(self.start, str):
             from django.utils.dateparse import parse_datetime
@@ -54,7 +103,163 @@ class Event(models.Model):
         if self.end and self.start and not self.duration:
             self.duration = self.end - self.start
 
+        duration = self.duration or (self.end - self.start if self.end and self.start else None)
+        for field, value in recurrence_fields(self.rrule, self.start, duration).items():
+            setattr(self, field, value)
+
+    def save(self, *args, **kwargs):
+        self.normalize()
         self.full_clean()
 
         super().save(*args, **kwargs)
-        
\ No newline at end of file
+
+
+class EventOccurrence(models.Model):
+    """
+    One occurrence of a recurring event, so windows can be searched with an indexed range query
+    instead of expanding every rule. Occurrences are written from a year ago at most up to the
+    event's occurrences_until, which the roll_occurrences command moves forward.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="occurrences")
+    occurrence_start = models.DateTimeField()
+    occurrence_end = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["event", "occurrence_start"], name="occurrence_event_start_idx"),
+            models.Index(fields=["occurrence_start"], name="occurrence_start_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.event.title} - {self.occurrence_start}"
+
+
+class ImportJob(models.Model):
+    """
+    An uploaded ICS file waiting to be, or being, imported into a calendar by the
+    run_import_jobs worker.
+    """
+
+    class States(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        PARSING = "parsing", "Parsing"
+        WRITING = "writing", "Writing"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="import_jobs")
+    calendar = models.ForeignKey(Calendar, on_delete=models.CASCADE, related_name="import_jobs")
+    ics_file = models.FileField(upload_to="calendar_imports/", blank=True)
+    state = models.CharField(max_length=10, choices=States.choices, default=States.QUEUED)
+    reimport = models.BooleanField(default=False)
+    bytes_total = models.PositiveBigIntegerField(default=0)
+    bytes_read = models.PositiveBigIntegerField(default=0)
+    events_parsed = models.PositiveIntegerField(default=0)
+    events_created = models.PositiveIntegerField(default=0)
+    events_updated = models.PositiveIntegerField(default=0)
+    events_deleted = models.PositiveIntegerField(default=0)
+    events_skipped = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.calendar} - {self.state}"
+
+    @property
+    def is_finished(self):
+        return self.state in (self.States.DONE, self.States.FAILED)
+
+    def progress(self):
+        """
+        Returns how far through the import the job is, as a percentage.
+        """
+        if self.is_finished:
+            return 100
+        if self.state == self.States.WRITING:
+            return 90
+        if not self.bytes_total:
+            return 0
+        # Parsing is most of the work, writing happens in a single transaction at the end
+        return int(90 * min(self.bytes_read, self.bytes_total) / self.bytes_total)
+
+
+class ParsedFeed(models.Model):
+    """
+    The parsed events of an ICS file, stored once per distinct file content so that repeat
+    uploads of the same file (such as a course timetable shared by a cohort) skip parsing.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    rows = models.FileField(upload_to="parsed_feeds/")
+    events = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    uses = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} - {self.events} events"
+
+
+class FeedVersion(models.Model):
+    """
+    A counter bumped whenever any of a user's events, calendars or study sessions change. It keys
+    the user's cached feeds and is sent as the feeds' ETag.
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name="feed_version")
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user} - {self.version}"
+
+
+class DeletionJob(models.Model):
+    """
+    A calendar or account waiting to be, or being, deleted by the run_deletion_jobs worker, which
+    removes its rows a chunk at a time. The calendar and user are kept as plain ids, as the job
+    outlives them, wide enough for any of their BigAutoField primary keys.
+    """
+
+    class Kinds(models.TextChoices):
+        CALENDAR = "calendar", "Calendar"
+        ACCOUNT = "account", "Account"
+
+    class States(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    kind = models.CharField(max_length=10, choices=Kinds.choices)
+    user_id = models.PositiveBigIntegerField(db_index=True)
+    calendar_id = models.PositiveBigIntegerField(null=True, blank=True)
+    # The calendar's name or the account's username, for showing the job once they are gone
+    name = models.CharField(max_length=255, blank=True)
+    state = models.CharField(max_length=10, choices=States.choices, default=States.QUEUED)
+    rows_total = models.PositiveBigIntegerField(default=0)
+    rows_deleted = models.PositiveBigIntegerField(default=0)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.name} - {self.state}"
+
+    @property
+    def is_finished(self):
+        return self.state in (self.States.DONE, self.States.FAILED)
+
+    def progress(self):
+        """
+        Returns how far through the deletion the job is, as a percentage.
+        """
+        if self.state == self.States.DONE:
+            return 100
+        if not self.rows_total:
+            return 0
+        return min(99, int(100 * self.rows_deleted / self.rows_total))
@@ -0,0 +1,54 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Calendar, Event
+from util.feed_cache import invalidate_feeds
+from util.occurrences import materialize
+
+# Set while a bulk writer that invalidates the feeds once itself is saving or deleting events
+_feeds_invalidated_by_caller = ContextVar("feeds_invalidated_by_caller", default=False)
+
+
+@contextmanager
+def feeds_invalidated_by_caller():
+    """
+    Skips invalidating the feeds for each event saved or deleted inside the block, for bulk writers
+    that invalidate them once when they are done.
+    """
+    token = _feeds_invalidated_by_caller.set(True)
+    try:
+        yield
+    finally:
+        _feeds_invalidated_by_caller.reset(token)
+
+
+def calendar_user_id(event):
+    # Avoid a query when the event's calendar has already been loaded
+    if Event.calendar.is_cached(event):
+        return event.calendar.user_id
+    return Calendar.objects.filter(id=event.calendar_id).values_list("user_id", flat=True).first()
+
+
+@receiver(post_save, sender=Calendar)
+@receiver(post_delete, sender=Calendar)
+def invalidate_calendar_feeds(sender, instance, **kwargs):
+    invalidate_feeds([instance.user_id])
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_feeds(sender, instance, origin=None, **kwargs):
+    # Deleting a calendar deletes its events too, and the calendar's own signal covers those
+    if isinstance(origin, Calendar) or _feeds_invalidated_by_caller.get():
+        return
+    invalidate_feeds([calendar_user_id(instance)])
+
+
+@receiver(post_save, sender=Event)
+def materialize_event_occurrences(sender, instance, raw=False, **kwargs):
+    # Occurrences of a deleted event go with it, through the foreign key
+    if not raw:
+        materialize([instance])
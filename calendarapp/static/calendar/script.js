@@ -7,10 +7,8 @@ document.addEventListener("DOMContentLoaded", function () {
 
   calendar = new FullCalendar.Calendar(calendarDiv, {
     initialView: "timeGridWeek",
-    eventSources: [
-      'get-calendar',
-      '/study_sessions/sessions/',
-    ],
+    // Events and study sessions come from one feed, fetched for the visible range
+    events: '/calendar/feed/',
     timeZone: 'local',
     eventTimeFormat: {
       hour: "2-digit",
@@ -0,0 +1,127 @@
+import io
+import json
+
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from django.utils.timezone import make_aware
+
+from datetime import datetime, timedelta
+
+from calendarapp.models import Calendar, DeletionJob, Event, EventOccurrence
+from modules.models import Module
+from notifications.models import Notification
+from study_sessions.models import StudySession, RecurringStudySession, StudySessionParticipant
+from users.models import FriendRequest
+from util.deletion_jobs import (
+    claim_jobs, request_account_deletion, request_calendar_deletion, run_deletion_job,
+)
+
+CustomUser = get_user_model()
+
+
+class DeletionJobTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.friend = CustomUser.objects.create_user(username='friend', password='testpass123')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        self.other_calendar = Calendar.objects.create(user=self.user, name='Sport')
+        start = make_aware(datetime(2025, 1, 6, 9))
+        Event.objects.bulk_create([
+            Event(calendar=self.calendar, title=f'Lecture {i}', start=start + timedelta(days=i)) for i in range(25)
+        ])
+        Event.objects.create(
+            calendar=self.calendar, title='Lab', start=start, end=start + timedelta(hours=1),
+            rrule='FREQ=WEEKLY;COUNT=5'
+        )
+        Event.objects.create(calendar=self.other_calendar, title='Football', start=start)
+        self.session = StudySession.objects.create(
+            title='Revision', date='2025-01-08', start_time='14:00', end_time='16:00',
+            is_recurring=True, host=self.user, calendar_id=self.calendar
+        )
+        RecurringStudySession.objects.create(session_id=self.session, recurrence_amount=4)
+        StudySessionParticipant.objects.create(study_session=self.session, participant=self.friend)
+        self.client.login(username='testuser', password='testpass123')
+
+    def run_jobs(self, chunk_size=10):
+        for job_id in claim_jobs(10):
+            run_deletion_job(job_id, chunk_size)
+
+    def test_calendar_hidden_at_once(self):
+        """A calendar queued for deletion disappears from the feeds and search straight away"""
+        request_calendar_deletion(self.calendar)
+
+        events = json.loads(self.client.get(reverse('prep_events')).getvalue())
+        self.assertEqual([e['title'] for e in events], ['Football'])
+        self.assertEqual(self.client.get(reverse('search_results'), {'q': 'lecture'}).context['event_results'], [])
+
+        self.client.login(username='friend', password='testpass123')
+        self.assertEqual(json.loads(self.client.get(reverse('study_sessions:get_sessions')).getvalue()), [])
+
+    def test_calendar_purged_in_chunks(self):
+        """The worker deletes the calendar's rows a chunk at a time and leaves the rest alone"""
+        job = request_calendar_deletion(self.calendar)
+        with CaptureQueriesContext(connection) as queries:
+            self.run_jobs(chunk_size=10)
+
+        self.assertFalse(Calendar.objects.filter(id=self.calendar.id).exists())
+        self.assertFalse(Event.objects.filter(calendar_id=self.calendar.id).exists())
+        self.assertFalse(EventOccurrence.objects.exists())
+        self.assertFalse(StudySession.objects.exists())
+        self.assertEqual(Event.objects.filter(calendar=self.other_calendar).count(), 1)
+
+        # 26 events are deleted in three chunks of at most ten
+        event_deletes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('DELETE FROM "calendarapp_event"')]
+        self.assertEqual(len(event_deletes), 3)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, DeletionJob.States.DONE)
+        self.assertEqual(job.rows_deleted, job.rows_total)
+        self.assertEqual(job.progress(), 100)
+        self.assertTrue(Notification.objects.filter(user=self.user, message__contains='Timetable').exists())
+
+    def test_account_deletion(self):
+        """Deleting an account deactivates it, then the worker removes everything that was theirs"""
+        Module.objects.create(user=self.user, name='Maths')
+        FriendRequest.objects.create(from_user=self.friend, to_user=self.user)
+        self.user.friends.add(self.friend)
+
+        request_account_deletion(self.user)
+        self.assertFalse(CustomUser.objects.get(id=self.user.id).is_active)
+        self.assertFalse(Calendar.objects.filter(user=self.user, pending_delete=False).exists())
+
+        self.run_jobs()
+        self.assertFalse(CustomUser.objects.filter(id=self.user.id).exists())
+        self.assertFalse(Event.objects.exists())
+        self.assertFalse(Module.objects.exists())
+        self.assertFalse(FriendRequest.objects.exists())
+        self.assertEqual(self.friend.friends.count(), 0)
+        self.assertEqual(DeletionJob.objects.get().state, DeletionJob.States.DONE)
+
+    def test_status_endpoint(self):
+        """Users can follow their own deletions only"""
+        job = request_calendar_deletion(self.calendar)
+        url = reverse('deletion_job_status', args=[job.id])
+        self.assertEqual(self.client.get(url).json()['state'], 'queued')
+
+        self.run_jobs()
+        data = self.client.get(url).json()
+        self.assertEqual((data['state'], data['progress'], data['name']), ('done', 100, 'Timetable'))
+
+        self.client.login(username='friend', password='testpass123')
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_pending_calendar_cannot_be_deleted_twice(self):
+        request_calendar_deletion(self.calendar)
+        response = self.client.post(reverse('delete_calendar', args=[self.calendar.id]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(DeletionJob.objects.count(), 1)
+
+    def test_command(self):
+        request_calendar_deletion(self.calendar)
+        out = io.StringIO()
+        call_command('run_deletion_jobs', once=True, stdout=out)
+        self.assertIn('calendar Timetable): done', out.getvalue())
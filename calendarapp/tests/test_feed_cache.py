@@ -0,0 +1,194 @@
+import io
+import json
+
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.urls import reverse
+from django.utils.timezone import make_aware
+
+from datetime import datetime
+
+from calendarapp.models import Calendar, Event
+from study_sessions.models import StudySession, RecurringStudySession, StudySessionParticipant
+from util.feed_cache import cache_stats
+from util.parse_ics import parse_ics
+
+CustomUser = get_user_model()
+
+
+class FeedCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        self.event = Event.objects.create(
+            calendar=self.calendar,
+            title='Lecture',
+            start=make_aware(datetime(2025, 1, 6, 9)),
+            end=make_aware(datetime(2025, 1, 6, 10)),
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def get_titles(self):
+        response = self.client.get(reverse('prep_events'))
+        return sorted(e['title'] for e in json.loads(response.getvalue()))
+
+    def test_repeat_load_skips_events_table(self):
+        """A second load of the same feed is served from the cache"""
+        self.get_titles()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_titles(), ['Lecture'])
+
+        self.assertFalse(any('calendarapp_event' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(cache_stats()['hits'], 1)
+        self.assertEqual(cache_stats()['misses'], 1)
+
+    def test_windows_are_cached_separately(self):
+        """Each requested window has its own cache entry"""
+        url = reverse('prep_events')
+        inside = self.client.get(url, {'start': '2025-01-06', 'end': '2025-01-13'})
+        outside = self.client.get(url, {'start': '2025-02-03', 'end': '2025-02-10'})
+
+        self.assertEqual(len(json.loads(inside.getvalue())), 1)
+        self.assertEqual(json.loads(outside.getvalue()), [])
+
+    def test_event_changes_invalidate(self):
+        """Saving or deleting an event refreshes the feed"""
+        self.get_titles()
+        self.event.title = 'Seminar'
+        self.event.save()
+        self.assertEqual(self.get_titles(), ['Seminar'])
+
+        self.event.delete()
+        self.assertEqual(self.get_titles(), [])
+
+    def test_calendar_delete_invalidates(self):
+        """Deleting a calendar removes its events from the cached feed"""
+        self.get_titles()
+        self.calendar.delete()
+        self.assertEqual(self.get_titles(), [])
+
+    def test_import_invalidates(self):
+        """Events bulk created by an import show up straight away"""
+        self.get_titles()
+        ics = (
+            b"BEGIN:VCALENDAR\nBEGIN:VEVENT\nUID:tutorial@example.com\nDTSTART:20250107T090000Z\n"
+            b"SUMMARY:Tutorial\nEND:VEVENT\nEND:VCALENDAR\n"
+        )
+        parse_ics(io.BytesIO(ics), self.calendar)
+        self.assertEqual(self.get_titles(), ['Lecture', 'Tutorial'])
+
+    def test_other_users_changes_keep_cache(self):
+        """Another user's changes don't touch this user's cached feed"""
+        self.get_titles()
+        other = CustomUser.objects.create_user(username='otheruser', password='testpass123')
+        other_calendar = Calendar.objects.create(user=other, name='Other')
+        Event.objects.create(calendar=other_calendar, title='Other', start=make_aware(datetime(2025, 1, 6, 9)))
+
+        self.get_titles()
+        self.assertEqual(cache_stats()['hits'], 1)
+
+    def test_session_changes_invalidate_participants(self):
+        """Joining a session, or changing its recurrence, refreshes the participants' session feed"""
+        other = CustomUser.objects.create_user(username='otheruser', password='testpass123')
+        session = StudySession.objects.create(
+            title='Revision', date='2025-01-08', start_time='14:00', end_time='16:00',
+            is_recurring=True, host=other, calendar_id=self.calendar
+        )
+        url = reverse('study_sessions:get_sessions')
+        self.assertEqual(json.loads(self.client.get(url).getvalue()), [])
+
+        StudySessionParticipant.objects.create(study_session=session, participant=self.user)
+        sessions = json.loads(self.client.get(url).getvalue())
+        self.assertEqual([s['title'] for s in sessions], ['Revision'])
+        self.assertNotIn('rrule', sessions[0])
+
+        RecurringStudySession.objects.create(session_id=session, recurrence_amount=4)
+        sessions = json.loads(self.client.get(url).getvalue())
+        self.assertIn('COUNT=4', sessions[0]['rrule'])
+
+    def test_stats_are_staff_only(self):
+        """The cache counters are shown to staff only"""
+        url = reverse('feed_cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.get_titles()
+        self.get_titles()
+        response = self.client.get(url)
+        self.assertEqual(response.json(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+
+class ConditionalFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        self.event = Event.objects.create(
+            calendar=self.calendar,
+            title='Lecture',
+            start=make_aware(datetime(2025, 1, 6, 9)),
+            end=make_aware(datetime(2025, 1, 6, 10)),
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_feeds_send_validators(self):
+        """Both feeds send an ETag and Last-Modified, and ask browsers to revalidate"""
+        for url in (reverse('prep_events'), reverse('study_sessions:get_sessions')):
+            response = self.client.get(url)
+            self.assertTrue(response.has_header('ETag'))
+            self.assertTrue(response.has_header('Last-Modified'))
+            self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_matching_etag_gets_not_modified(self):
+        """A request with the current ETag gets a 304 without the feed being read"""
+        url = reverse('prep_events')
+        etag = self.client.get(url)['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any('calendarapp_event' in q['sql'] for q in queries.captured_queries))
+
+    def test_changes_give_new_etag(self):
+        """Once the user's events change the old ETag no longer matches"""
+        url = reverse('prep_events')
+        etag = self.client.get(url)['ETag']
+
+        self.event.title = 'Seminar'
+        self.event.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(json.loads(response.getvalue())[0]['title'], 'Seminar')
+
+    def test_creating_events_is_not_conditional(self):
+        """A POST to prep_events creates the event whatever the preconditions, and sends no validators"""
+        url = reverse('prep_events')
+        etag = self.client.get(url)['ETag']
+        data = {'title': 'Seminar', 'start': '2025-01-07T09:00:00Z', 'calendar': self.calendar.id}
+
+        for headers in ({'HTTP_IF_NONE_MATCH': etag}, {'HTTP_IF_MATCH': '"stale"'}):
+            response = self.client.post(url, data, content_type='application/json', **headers)
+            self.assertEqual(response.status_code, 201)
+            self.assertFalse(response.has_header('ETag'))
+            self.assertFalse(response.has_header('Last-Modified'))
+        self.assertEqual(Event.objects.filter(title='Seminar').count(), 2)
+
+    def test_session_feed_not_modified(self):
+        """The session feed answers conditional requests too"""
+        url = reverse('study_sessions:get_sessions')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        StudySession.objects.create(
+            title='Revision', date='2025-01-08', start_time='14:00', end_time='16:00',
+            host=self.user, calendar_id=self.calendar
+        )
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
@@ -0,0 +1,163 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+
+from io import StringIO
+
+from calendarapp.models import Calendar, Event, ImportJob, ParsedFeed
+from notifications.models import Notification
+from util.import_jobs import claim_jobs, run_import_job
+
+CustomUser = get_user_model()
+
+
+class ImportJobTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+
+        with open('calendarTest.ics', 'rb') as ics_file:
+            content = ics_file.read()
+        self.job = ImportJob.objects.create(
+            user=self.user,
+            calendar=self.calendar,
+            ics_file=SimpleUploadedFile('timetable.ics', content),
+            bytes_total=len(content),
+        )
+
+    def tearDown(self):
+        for job in ImportJob.objects.all():
+            job.ics_file.delete(save=False)
+        for feed in ParsedFeed.objects.all():
+            feed.rows.delete(save=False)
+
+    def test_claim_jobs_only_claims_once(self):
+        """A queued job is handed to one worker only"""
+        self.assertEqual(claim_jobs(5), [self.job.id])
+        self.assertEqual(claim_jobs(5), [])
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.state, ImportJob.States.PARSING)
+        self.assertIsNotNone(self.job.started_at)
+
+    def test_run_import_job(self):
+        """Running a job imports its events and records the outcome"""
+        claim_jobs(1)
+        run_import_job(self.job.id)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.state, ImportJob.States.DONE)
+        self.assertEqual(self.job.progress(), 100)
+        self.assertEqual(self.job.events_parsed, 73)
+        self.assertEqual(self.job.events_created, 73)
+        self.assertEqual(self.job.events_skipped, 0)
+        self.assertIsNotNone(self.job.finished_at)
+        self.assertEqual(Event.objects.filter(calendar=self.calendar).count(), 73)
+
+        # The uploaded file is removed once it has been imported
+        self.assertFalse(self.job.ics_file)
+
+        notification = Notification.objects.get(user=self.user)
+        self.assertIn('Timetable', notification.message)
+        self.assertIn('73 events imported', notification.message)
+
+    def queue(self, content, calendar_name):
+        calendar = Calendar.objects.create(user=self.user, name=calendar_name)
+        return ImportJob.objects.create(
+            user=self.user,
+            calendar=calendar,
+            ics_file=SimpleUploadedFile('timetable.ics', content),
+            bytes_total=len(content),
+        )
+
+    def test_repeat_upload_uses_cached_parse(self):
+        """Uploading a file that was parsed before reuses the stored parse"""
+        with open('calendarTest.ics', 'rb') as ics_file:
+            content = ics_file.read()
+        repeat = self.queue(content, 'Timetable copy')
+        claim_jobs(2)
+        run_import_job(self.job.id)
+        run_import_job(repeat.id)
+
+        feed = ParsedFeed.objects.get()
+        self.assertEqual(feed.uses, 2)
+        self.assertEqual(feed.events, 73)
+
+        repeat.refresh_from_db()
+        self.assertEqual(repeat.state, ImportJob.States.DONE)
+        self.assertEqual(repeat.events_parsed, 73)
+        self.assertEqual(Event.objects.filter(calendar=repeat.calendar).count(), 73)
+
+    def test_cached_parse_keeps_errors(self):
+        """Events that failed to parse are reported again when the cached parse is used"""
+        content = (
+            b"BEGIN:VCALENDAR\nBEGIN:VEVENT\nSUMMARY:No Start\nEND:VEVENT\n"
+            b"BEGIN:VEVENT\nDTSTART:20250106T090000Z\nSUMMARY:Lecture\nEND:VEVENT\nEND:VCALENDAR\n"
+        )
+        first = self.queue(content, 'First')
+        second = self.queue(content, 'Second')
+        claim_jobs(3)
+        run_import_job(first.id)
+        run_import_job(second.id)
+
+        second.refresh_from_db()
+        self.assertEqual(second.events_created, 1)
+        self.assertEqual(second.events_skipped, 1)
+        self.assertEqual(second.errors[0]['title'], 'No Start')
+
+    def test_different_files_are_parsed_separately(self):
+        """A file with different content gets its own cached parse"""
+        with open('calendarTest.ics', 'rb') as ics_file:
+            content = ics_file.read()
+        other = self.queue(content.replace(b'SUMMARY:', b'SUMMARY:Changed ', 1), 'Other')
+        claim_jobs(2)
+        run_import_job(self.job.id)
+        run_import_job(other.id)
+
+        self.assertEqual(ParsedFeed.objects.count(), 2)
+        self.assertTrue(Event.objects.filter(calendar=other.calendar, title__startswith='Changed ').exists())
+
+    def test_failed_job(self):
+        """A job whose file can't be read is marked as failed and the user is told"""
+        self.job.ics_file.delete(save=True)
+        claim_jobs(1)
+        run_import_job(self.job.id)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.state, ImportJob.States.FAILED)
+        self.assertTrue(self.job.message.startswith('Import failed'))
+        self.assertFalse(Event.objects.filter(calendar=self.calendar).exists())
+        self.assertIn('could not be imported', Notification.objects.get(user=self.user).message)
+
+    def test_command_runs_queued_jobs(self):
+        """The worker command empties the queue when run with --once"""
+        out = StringIO()
+        call_command('run_import_jobs', '--inline', '--once', stdout=out)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.state, ImportJob.States.DONE)
+        self.assertIn(f'Finished import job {self.job.id}', out.getvalue())
+
+    def test_reimport_job_only_writes_changes(self):
+        """A re-import job leaves an unchanged calendar alone"""
+        claim_jobs(1)
+        run_import_job(self.job.id)
+        original_ids = set(Event.objects.values_list('id', flat=True))
+
+        with open('calendarTest.ics', 'rb') as ics_file:
+            content = ics_file.read()
+        reimport = ImportJob.objects.create(
+            user=self.user,
+            calendar=self.calendar,
+            ics_file=SimpleUploadedFile('timetable.ics', content),
+            bytes_total=len(content),
+            reimport=True,
+        )
+        claim_jobs(1)
+        run_import_job(reimport.id)
+
+        reimport.refresh_from_db()
+        self.assertEqual(reimport.state, ImportJob.States.DONE)
+        self.assertEqual((reimport.events_created, reimport.events_updated, reimport.events_deleted), (0, 0, 0))
+        self.assertEqual(set(Event.objects.values_list('id', flat=True)), original_ids)
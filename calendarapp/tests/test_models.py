@@ -1,8 +1,9 @@
 from django.test import TestCase
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from django.utils.timezone import make_aware
 from django.contrib.auth import get_user_model
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 
 from calendarapp.models import Calendar, Event
 
@@ -329,3 +330,65 @@ class EventModelTests(TestCase):
                 event.full_clean()
             except ValidationError:
                 self.fail(f"Type '{choice}' should be valid")
+
+    def test_recurrence_columns(self):
+        """
+        Test the rule is stored in its structured columns, with when its last occurrence ends
+        """
+        start = make_aware(datetime(2024, 9, 30, 9))
+        event = Event.objects.create(
+            calendar=self.calendar,
+            title='Lecture',
+            start=start,
+            end=start + timedelta(hours=1),
+            rrule='DTSTART:20240930T090000\nRRULE:FREQ=WEEKLY;INTERVAL=2;COUNT=4;BYDAY=MO,WE',
+        )
+        self.assertEqual(event.rrule_freq, 'WEEKLY')
+        self.assertEqual(event.rrule_interval, 2)
+        self.assertEqual(event.rrule_count, 4)
+        self.assertIsNone(event.rrule_until)
+        self.assertEqual(event.rrule_byday, 'MO,WE')
+        # Mon 30 Sep, Wed 2 Oct, then two weeks on Mon 14 and Wed 16 Oct
+        self.assertEqual(event.last_occurrence, make_aware(datetime(2024, 10, 16, 10)))
+
+    def test_last_occurrence_of_dense_rules(self):
+        """
+        Test rules with too many occurrences to step through are saved quickly, as if they never ended
+        """
+        start = make_aware(datetime(2025, 1, 1, 9))
+        event = Event.objects.create(
+            calendar=self.calendar, title='Ping', start=start, rrule='FREQ=MINUTELY;UNTIL=20270101T000000Z'
+        )
+        self.assertEqual(event.rrule_freq, 'MINUTELY')
+        self.assertIsNone(event.last_occurrence)
+
+        event.rrule = 'FREQ=SECONDLY;COUNT=100000'
+        event.save()
+        self.assertIsNone(event.last_occurrence)
+
+        event.rrule = 'FREQ=HOURLY;UNTIL=20250101T120000Z'
+        event.save()
+        self.assertEqual(event.last_occurrence, make_aware(datetime(2025, 1, 1, 12)))
+
+    def test_recurrence_columns_follow_rule(self):
+        """
+        Test changing or removing the rule updates the columns, and an endless rule has no last occurrence
+        """
+        event = Event.objects.create(
+            calendar=self.calendar,
+            title='Lecture',
+            start=self.now,
+            rrule='FREQ=DAILY;UNTIL=20300101',
+        )
+        self.assertEqual(event.rrule_until, datetime(2030, 1, 1, 23, 59, 59, tzinfo=dt_timezone.utc))
+        self.assertIsNotNone(event.last_occurrence)
+
+        event.rrule = 'FREQ=WEEKLY'
+        event.save()
+        self.assertIsNone(event.rrule_until)
+        self.assertIsNone(event.last_occurrence)
+
+        event.rrule = None
+        event.save()
+        self.assertEqual(event.rrule_freq, '')
+        self.assertIsNone(event.rrule_interval)
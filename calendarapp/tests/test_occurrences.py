@@ -0,0 +1,200 @@
+import io
+import json
+from importlib import import_module
+
+from django.apps import apps
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils.timezone import make_aware
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from calendarapp.models import Calendar, Event, EventOccurrence
+from util import occurrences
+from util.parse_ics import parse_ics
+
+CustomUser = get_user_model()
+
+# The events these tests are fixed on are older than OCCURRENCE_HISTORY
+PAST_EVENTS = patch.object(occurrences, 'OCCURRENCE_HISTORY', timedelta(days=36500))
+
+
+@PAST_EVENTS
+class EventOccurrenceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        self.start = make_aware(datetime(2025, 1, 6, 9))
+        self.client.login(username='testuser', password='testpass123')
+
+    def create_weekly(self, rrule='FREQ=WEEKLY;COUNT=4', **kwargs):
+        return Event.objects.create(
+            calendar=self.calendar,
+            title='Lecture',
+            start=self.start,
+            end=self.start + timedelta(hours=1),
+            duration=timedelta(hours=1),
+            rrule=rrule,
+            **kwargs,
+        )
+
+    def occurrence_starts(self, event):
+        return list(event.occurrences.order_by('occurrence_start').values_list('occurrence_start', flat=True))
+
+    def test_save_materializes(self):
+        """Saving a recurring event writes its occurrences and horizon"""
+        event = self.create_weekly()
+
+        self.assertEqual(self.occurrence_starts(event), [self.start + timedelta(weeks=i) for i in range(4)])
+        self.assertEqual(event.occurrences.first().occurrence_end - event.occurrences.first().occurrence_start, timedelta(hours=1))
+        event.refresh_from_db()
+        self.assertIsNotNone(event.occurrences_until)
+
+    def test_update_rewrites(self):
+        """Changing the rule replaces the old occurrences, and removing it clears them"""
+        event = self.create_weekly()
+        event.rrule = 'FREQ=WEEKLY;COUNT=2'
+        event.save()
+        self.assertEqual(len(self.occurrence_starts(event)), 2)
+
+        event.rrule = None
+        event.save()
+        self.assertEqual(self.occurrence_starts(event), [])
+        event.refresh_from_db()
+        self.assertIsNone(event.occurrences_until)
+
+    def test_delete_cascades(self):
+        """Deleting an event deletes its occurrences"""
+        event = self.create_weekly()
+        event.delete()
+        self.assertFalse(EventOccurrence.objects.exists())
+
+    def test_unreadable_rule(self):
+        """An event whose rule can't be read is left unmaterialized"""
+        event = self.create_weekly(rrule='FREQ=SOMETIMES')
+        self.assertEqual(self.occurrence_starts(event), [])
+        event.refresh_from_db()
+        self.assertIsNone(event.occurrences_until)
+
+    def test_import_materializes(self):
+        """Recurring events bulk created by an import get their occurrences"""
+        ics = (
+            b"BEGIN:VCALENDAR\nBEGIN:VEVENT\nUID:lecture@example.com\nDTSTART:20250106T090000Z\n"
+            b"DTEND:20250106T100000Z\nRRULE:FREQ=WEEKLY;COUNT=3\nSUMMARY:Lecture\nEND:VEVENT\nEND:VCALENDAR\n"
+        )
+        parse_ics(io.BytesIO(ics), self.calendar)
+        event = Event.objects.get(uid='lecture@example.com')
+        self.assertEqual(len(self.occurrence_starts(event)), 3)
+
+    def test_cap_limits_occurrences(self):
+        """An endless rule is only written MAX_OCCURRENCES at a time, and roll picks up where it stopped"""
+        until = self.start + timedelta(days=30)
+        with patch.object(occurrences, 'MAX_OCCURRENCES', 10):
+            event = Event.objects.create(calendar=self.calendar, title='Check', start=self.start, rrule='FREQ=DAILY')
+            occurrences.materialize([event], until)
+            event.refresh_from_db()
+            self.assertEqual(len(self.occurrence_starts(event)), 10)
+            self.assertEqual(event.occurrences_until, self.start + timedelta(days=9))
+
+            occurrences.roll(until)
+            self.assertEqual(len(self.occurrence_starts(event)), 20)
+
+    def test_roll_extends_horizon(self):
+        """The roll command writes the occurrences that came into the horizon, without repeating any"""
+        event = Event.objects.create(calendar=self.calendar, title='Check', start=self.start, rrule='FREQ=WEEKLY')
+        occurrences.materialize([event], self.start + timedelta(weeks=2))
+        self.assertEqual(len(self.occurrence_starts(event)), 3)
+
+        occurrences.roll(self.start + timedelta(weeks=5))
+        self.assertEqual(self.occurrence_starts(event), [self.start + timedelta(weeks=i) for i in range(6)])
+
+        out = io.StringIO()
+        call_command('roll_occurrences', stdout=out)
+        self.assertIn('occurrence(s)', out.getvalue())
+        event.refresh_from_db()
+        self.assertGreater(event.occurrences_until, self.start + timedelta(weeks=5))
+
+    def test_roll_skips_finished_events(self):
+        """Events whose last occurrence is already written are not read again by roll"""
+        self.create_weekly()
+        endless = Event.objects.create(calendar=self.calendar, title='Check', start=self.start, rrule='FREQ=WEEKLY')
+        until = self.start + timedelta(days=3650)
+
+        with patch.object(occurrences, 'extend', wraps=occurrences.extend) as extend:
+            occurrences.roll(until)
+        extended = [event.id for call in extend.call_args_list for event in call.args[0]]
+        self.assertEqual(extended, [endless.id])
+
+    def test_feed_window_uses_occurrences(self):
+        """The windowed feed matches recurring events against their occurrences, inside and past the horizon"""
+        Event.objects.create(calendar=self.calendar, title='Check', start=self.start, rrule='FREQ=WEEKLY;BYDAY=MO')
+        Event.objects.create(
+            calendar=self.calendar, title='Spring', start=self.start, rrule='FREQ=WEEKLY;UNTIL=20250120T235959Z'
+        )
+        url = reverse('prep_events')
+
+        def titles(start, end):
+            response = self.client.get(url, {'start': start, 'end': end})
+            return sorted(e['title'] for e in json.loads(response.getvalue()))
+
+        self.assertEqual(titles('2025-01-13', '2025-01-14'), ['Check', 'Spring'])
+        self.assertEqual(titles('2025-02-03', '2025-02-04'), ['Check'])
+        self.assertEqual(titles('2025-02-04', '2025-02-10'), [])
+        # Past the horizon the rule is checked directly
+        self.assertEqual(titles('2040-01-02', '2040-01-03'), ['Check'])
+
+    def test_search_uses_occurrences(self):
+        """Search lists the matching occurrences of recurring events"""
+        self.start = make_aware(datetime.now().replace(microsecond=0))
+        self.create_weekly()
+        response = self.client.get(reverse('search_results'), {'q': 'lecture'})
+        self.assertEqual(response.context['event_results_count'], 4)
+
+
+class OccurrenceHistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        self.client.login(username='testuser', password='testpass123')
+        self.start = make_aware(datetime.now().replace(microsecond=0)) - timedelta(days=1000)
+        self.event = Event.objects.create(
+            calendar=self.calendar, title='Lecture', start=self.start, end=self.start + timedelta(hours=1),
+            rrule='FREQ=WEEKLY'
+        )
+
+    def test_written_from_a_year_ago(self):
+        """Old events are written from OCCURRENCE_HISTORY ago, which covers everything search looks at"""
+        first = self.event.occurrences.order_by('occurrence_start').first().occurrence_start
+        self.assertGreaterEqual(first, occurrences.history_start() - timedelta(minutes=1))
+        self.assertLess(first, occurrences.history_start() + timedelta(weeks=1))
+
+        response = self.client.get(reverse('search_results'), {'q': 'lecture'})
+        self.assertGreater(response.context['event_results_count'], 100)
+
+    def test_older_windows_check_the_rule(self):
+        """A window from before the occurrences were written still finds the event"""
+        day = (self.start + timedelta(weeks=10)).date()
+        response = self.client.get(reverse('prep_events'), {'start': str(day), 'end': str(day + timedelta(days=1))})
+        self.assertEqual([e['title'] for e in json.loads(response.getvalue())], ['Lecture'])
+
+    def test_backfill(self):
+        """The migration materializes recurring events saved before there were occurrences"""
+        written = list(EventOccurrence.objects.order_by('occurrence_start').values_list('occurrence_start', 'occurrence_end'))
+        EventOccurrence.objects.all().delete()
+        Event.objects.update(occurrences_until=None)
+        migration = import_module('calendarapp.migrations.0015_backfill_event_occurrences')
+        migration.backfill_occurrences(apps, None)
+
+        self.event.refresh_from_db()
+        self.assertIsNotNone(self.event.occurrences_until)
+        backfilled = list(EventOccurrence.objects.order_by('occurrence_start').values_list('occurrence_start', 'occurrence_end'))
+        # The horizon moved on a little since the event was saved
+        self.assertEqual(backfilled[:len(written)], written)
+        response = self.client.get(reverse('search_results'), {'q': 'lecture'})
+        self.assertGreater(response.context['event_results_count'], 100)
@@ -0,0 +1,349 @@
+import io
+
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+
+from datetime import datetime, timezone as dt_timezone
+
+from calendarapp.models import Calendar, Event, EventOccurrence
+from util.parse_ics import (
+    CHUNK_SIZE, ImportResult, iter_rows, iter_vevent_blocks, parse_chunk, parse_ics, parse_rows, parse_rows_parallel, reimport_ics,
+)
+
+CustomUser = get_user_model()
+
+VEVENT = """BEGIN:VEVENT
+UID:uid{index}@example.com
+DTSTAMP:20250101T090000Z
+DTSTART:20250106T{hour:02d}0000Z
+DTEND:20250106T{end_hour:02d}0000Z
+SUMMARY:Lecture {index}
+END:VEVENT
+"""
+
+
+def build_ics(events):
+    return ("BEGIN:VCALENDAR\nVERSION:2.0\nPRODID:-//test//EN\n" + "".join(events) + "END:VCALENDAR\n").encode("utf-8")
+
+
+class ParseIcsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+
+    def test_imports_sample_timetable(self):
+        """Every event in the bundled sample timetable is imported"""
+        with open('calendarTest.ics', 'rb') as ics_file:
+            result = parse_ics(ics_file, self.calendar)
+
+        self.assertEqual(result.created, 73)
+        self.assertEqual(result.errors, [])
+        self.assertEqual(Event.objects.filter(calendar=self.calendar).count(), 73)
+        self.assertEqual(Event.objects.filter(calendar=self.calendar).exclude(rrule=None).count(), 60)
+
+    def test_durations_are_set(self):
+        """Bulk inserted events still get their duration derived from start and end"""
+        ics = build_ics([VEVENT.format(index=1, hour=9, end_hour=11)])
+        parse_ics(SimpleUploadedFile("test.ics", ics), self.calendar)
+
+        event = Event.objects.get(calendar=self.calendar)
+        self.assertEqual(event.title, 'Lecture 1')
+        self.assertEqual(event.duration.total_seconds(), 7200)
+
+    def test_queries_do_not_grow_with_event_count(self):
+        """Events are written in batches rather than one query per event"""
+        ics = build_ics([VEVENT.format(index=i, hour=9, end_hour=10) for i in range(200)])
+
+        with CaptureQueriesContext(connection) as queries:
+            result = parse_ics(SimpleUploadedFile("test.ics", ics), self.calendar, batch_size=50)
+
+        self.assertEqual(result.created, 200)
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 4)
+
+    def test_invalid_events_are_reported_not_fatal(self):
+        """An invalid event is skipped and reported while the rest are imported"""
+        ics = build_ics([
+            VEVENT.format(index=1, hour=9, end_hour=10),
+            VEVENT.format(index=2, hour=12, end_hour=11),  # Ends before it starts
+            VEVENT.format(index=3, hour=14, end_hour=15),
+        ])
+        result = parse_ics(SimpleUploadedFile("test.ics", ics), self.calendar)
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(result.errors[0]['index'], 1)
+        self.assertEqual(result.errors[0]['title'], 'Lecture 2')
+        self.assertIn('End time must be after the start time.', result.errors[0]['messages'])
+        self.assertEqual(
+            sorted(Event.objects.values_list('title', flat=True)),
+            ['Lecture 1', 'Lecture 3']
+        )
+
+    def test_event_without_start_is_reported(self):
+        """A VEVENT with no DTSTART is reported rather than crashing the import"""
+        ics = build_ics([
+            "BEGIN:VEVENT\nUID:nostart@example.com\nSUMMARY:No Start\nEND:VEVENT\n",
+            VEVENT.format(index=1, hour=9, end_hour=10),
+        ])
+        result = parse_ics(SimpleUploadedFile("test.ics", ics), self.calendar)
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.errors[0]['title'], 'No Start')
+
+
+class IterVeventBlocksTests(TestCase):
+    def blocks(self, ics, chunk_size=CHUNK_SIZE):
+        return list(iter_vevent_blocks(io.BytesIO(ics), chunk_size=chunk_size))
+
+    def test_splits_on_vevent_boundaries(self):
+        """Each VEVENT is yielded as its own block"""
+        ics = build_ics([VEVENT.format(index=i, hour=9, end_hour=10) for i in range(3)])
+        blocks = self.blocks(ics)
+
+        self.assertEqual(len(blocks), 3)
+        self.assertTrue(blocks[0].startswith('BEGIN:VEVENT'))
+        self.assertTrue(blocks[0].rstrip().endswith('END:VEVENT'))
+        self.assertIn('SUMMARY:Lecture 1', blocks[1])
+
+    def test_small_chunks_give_same_blocks(self):
+        """Lines split across chunk boundaries are reassembled"""
+        with open('calendarTest.ics', 'rb') as ics_file:
+            ics = ics_file.read()
+
+        self.assertEqual(self.blocks(ics, chunk_size=7), self.blocks(ics))
+
+    def test_multibyte_characters_split_across_chunks(self):
+        """UTF-8 characters split between chunks are decoded correctly"""
+        ics = build_ics(["BEGIN:VEVENT\nDTSTART:20250106T090000Z\nSUMMARY:Café ☕ meetup\nEND:VEVENT\n"])
+        for chunk_size in range(1, 8):
+            self.assertIn('SUMMARY:Café ☕ meetup', self.blocks(ics, chunk_size=chunk_size)[0])
+
+    def test_unused_properties_and_alarms_are_dropped(self):
+        """Properties the importer does not use, including folded ones and alarms, are not kept"""
+        ics = build_ics([
+            "BEGIN:VEVENT\n"
+            "DTSTART:20250106T090000Z\n"
+            "CATEGORIES:Lecture\n"
+            "LOCATION:Park Building\\, \n"
+            " 2.23\n"
+            "DESCRIPTION:First line \n"
+            " continued\n"
+            "BEGIN:VALARM\n"
+            "ACTION:DISPLAY\n"
+            "DESCRIPTION:Reminder\n"
+            "END:VALARM\n"
+            "SUMMARY:Lecture\n"
+            "END:VEVENT\n"
+        ])
+        block = self.blocks(ics)[0]
+
+        self.assertNotIn('CATEGORIES', block)
+        self.assertNotIn('2.23', block)
+        self.assertNotIn('VALARM', block)
+        self.assertNotIn('Reminder', block)
+        self.assertIn('DESCRIPTION:First line \r\n continued', block)
+        self.assertIn('SUMMARY:Lecture', block)
+
+    def test_custom_timezones_are_applied(self):
+        """Events use the VTIMEZONE definitions that come before them in the file"""
+        ics = build_ics([
+            "BEGIN:VTIMEZONE\n"
+            "TZID:Custom Plus Two\n"
+            "BEGIN:STANDARD\n"
+            "DTSTART:19700101T000000\n"
+            "TZOFFSETFROM:+0200\n"
+            "TZOFFSETTO:+0200\n"
+            "END:STANDARD\n"
+            "END:VTIMEZONE\n",
+            "BEGIN:VEVENT\n"
+            "DTSTART;TZID=Custom Plus Two:20250106T090000\n"
+            "DTEND;TZID=Custom Plus Two:20250106T100000\n"
+            "SUMMARY:Lecture\n"
+            "END:VEVENT\n"
+        ])
+        user = CustomUser.objects.create_user(username='tzuser', password='testpass123')
+        calendar = Calendar.objects.create(user=user, name='Timezones')
+        parse_ics(io.BytesIO(ics), calendar)
+
+        event = Event.objects.get(calendar=calendar)
+        self.assertEqual(event.start, datetime(2025, 1, 6, 7, 0, tzinfo=dt_timezone.utc))
+
+
+class ParallelParseTests(TestCase):
+    def test_parallel_rows_match_sequential_rows(self):
+        """Parsing in worker processes gives the same rows, in the same order, as parsing in one"""
+        with open('calendarTest.ics', 'rb') as ics_file:
+            ics = ics_file.read()
+        ics = ics.replace(b'END:VCALENDAR', b'BEGIN:VEVENT\r\nSUMMARY:No Start\r\nEND:VEVENT\r\nEND:VCALENDAR')
+
+        expected = ImportResult()
+        expected_rows = list(parse_rows(iter_vevent_blocks(io.BytesIO(ics)), expected))
+
+        result = ImportResult()
+        timezones = []
+        blocks = iter_vevent_blocks(io.BytesIO(ics), timezones=timezones)
+        rows = list(parse_rows_parallel(blocks, result, workers=2, timezones=timezones, chunk_size=10))
+
+        self.assertEqual(rows, expected_rows)
+        self.assertEqual(result.skipped, 1)
+        self.assertEqual(result.errors, expected.errors)
+        self.assertEqual(result.errors[0]['index'], 73)
+
+    def test_chunk_registers_timezones(self):
+        """A parse worker applies the timezones it is sent before parsing its chunk"""
+        timezone = (
+            "BEGIN:VTIMEZONE\r\n"
+            "TZID:Worker Plus Three\r\n"
+            "BEGIN:STANDARD\r\n"
+            "DTSTART:19700101T000000\r\n"
+            "TZOFFSETFROM:+0300\r\n"
+            "TZOFFSETTO:+0300\r\n"
+            "END:STANDARD\r\n"
+            "END:VTIMEZONE\r\n"
+        )
+        block = "BEGIN:VEVENT\r\nDTSTART;TZID=Worker Plus Three:20250106T090000\r\nSUMMARY:Lecture\r\nEND:VEVENT\r\n"
+        rows, result = parse_chunk(5, [block], [timezone])
+
+        self.assertEqual(rows[0][0], 5)
+        self.assertEqual(rows[0][1]['start'], '2025-01-06T09:00:00+03:00')
+        self.assertEqual(result.skipped, 0)
+
+    def test_parallel_rows_use_feed_timezones(self):
+        """Workers are sent the feed's VTIMEZONEs, so their times match parsing in one process"""
+        ics = build_ics([
+            "BEGIN:VTIMEZONE\n"
+            "TZID:Custom Zone Plus Five\n"
+            "BEGIN:STANDARD\n"
+            "DTSTART:19700101T000000\n"
+            "TZOFFSETFROM:+0500\n"
+            "TZOFFSETTO:+0500\n"
+            "END:STANDARD\n"
+            "END:VTIMEZONE\n",
+            *(
+                f"BEGIN:VEVENT\nUID:tz{index}@example.com\nDTSTART;TZID=Custom Zone Plus Five:20250101T090000\n"
+                f"SUMMARY:Lecture {index}\nEND:VEVENT\n"
+                for index in range(3)
+            ),
+        ])
+        # The parallel parse runs first, so this process hasn't registered the zone before the workers start
+        parallel = list(iter_rows(io.BytesIO(ics), ImportResult(), workers=2))
+        sequential = list(iter_rows(io.BytesIO(ics), ImportResult(), workers=1))
+
+        self.assertEqual(sequential[0][1]['start'], '2025-01-01T09:00:00+05:00')
+        self.assertEqual(parallel, sequential)
+
+    def test_multiple_files(self):
+        """Several files are imported into one calendar, with error indexes counting across them"""
+        user = CustomUser.objects.create_user(username='filesuser', password='testpass123')
+        calendar = Calendar.objects.create(user=user, name='Modules')
+        files = [
+            io.BytesIO(build_ics([VEVENT.format(index=i, hour=9, end_hour=10) for i in range(3)])),
+            io.BytesIO(build_ics([VEVENT.format(index=3, hour=12, end_hour=11)])),
+        ]
+        result = parse_ics(files, calendar)
+
+        self.assertEqual(result.created, 3)
+        self.assertEqual(result.errors[0]['index'], 3)
+        self.assertEqual(Event.objects.filter(calendar=calendar).count(), 3)
+
+
+class ReimportIcsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        self.events = [VEVENT.format(index=i, hour=9 + i, end_hour=10 + i) for i in range(3)]
+        parse_ics(SimpleUploadedFile("test.ics", build_ics(self.events)), self.calendar)
+
+    def reimport(self, events):
+        return reimport_ics(SimpleUploadedFile("test.ics", build_ics(events)), self.calendar)
+
+    def test_imported_events_store_uid_and_hash(self):
+        """Imported events remember the UID, SEQUENCE and a hash of their content"""
+        event = Event.objects.get(title='Lecture 0')
+        self.assertEqual(event.uid, 'uid0@example.com')
+        self.assertEqual(event.sequence, 0)
+        self.assertEqual(len(event.content_hash), 64)
+
+    def test_unchanged_feed_writes_nothing(self):
+        """Re-importing an identical feed makes no writes"""
+        with CaptureQueriesContext(connection) as queries:
+            result = self.reimport(self.events)
+
+        self.assertEqual(result.unchanged, 3)
+        self.assertEqual((result.created, result.updated, result.deleted), (0, 0, 0))
+        writes = [q for q in queries.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(writes, [])
+
+    def test_events_imported_before_uids_are_taken_over(self):
+        """Events imported without a UID or hash are matched on their values rather than imported twice"""
+        Event.objects.update(uid='', content_hash='')
+        Event.objects.create(
+            calendar=self.calendar, title='Lecture 0', start=datetime(2025, 1, 6, 9, tzinfo=dt_timezone.utc)
+        )
+        legacy_ids = set(Event.objects.filter(title__startswith='Lecture 1').values_list('id', flat=True))
+        result = self.reimport(self.events[1:])
+
+        self.assertEqual((result.created, result.updated, result.deleted), (0, 2, 0))
+        self.assertEqual(Event.objects.count(), 4)
+        self.assertEqual(Event.objects.get(uid='uid1@example.com').id, legacy_ids.pop())
+        # Nothing is known about the events left over, so they are kept
+        self.assertEqual(Event.objects.filter(title='Lecture 0').count(), 2)
+        self.assertEqual(self.reimport(self.events[1:]).unchanged, 2)
+
+    def test_changes_are_applied(self):
+        """Changed events are updated, new ones added and missing ones removed"""
+        original_ids = dict(Event.objects.values_list('uid', 'id'))
+        changed = self.events[0].replace('SUMMARY:Lecture 0', 'SUMMARY:Moved Lecture').replace('T090000Z', 'T080000Z')
+        result = self.reimport([changed, self.events[1], VEVENT.format(index=7, hour=15, end_hour=16)])
+
+        self.assertEqual((result.created, result.updated, result.deleted, result.unchanged), (1, 1, 1, 1))
+
+        moved = Event.objects.get(uid='uid0@example.com')
+        self.assertEqual(moved.id, original_ids['uid0@example.com'])
+        self.assertEqual(moved.title, 'Moved Lecture')
+        self.assertEqual(moved.start.hour, 8)
+        self.assertEqual(moved.duration.total_seconds(), 7200)
+        self.assertEqual(
+            sorted(Event.objects.values_list('uid', flat=True)),
+            ['uid0@example.com', 'uid1@example.com', 'uid7@example.com']
+        )
+
+    def test_removed_events_are_deleted_in_batches(self):
+        """Events missing from the feed are deleted with a few statements however many there are"""
+        events = [VEVENT.format(index=i, hour=9, end_hour=10) for i in range(50)]
+        events.append(VEVENT.format(index=99, hour=9, end_hour=10).replace('SUMMARY:', 'RRULE:FREQ=WEEKLY\nSUMMARY:'))
+        self.reimport(events)
+        self.assertTrue(EventOccurrence.objects.exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.reimport(self.events)
+
+        self.assertEqual(result.deleted, 48)
+        self.assertEqual(Event.objects.filter(calendar=self.calendar).count(), 3)
+        self.assertFalse(EventOccurrence.objects.exists())
+        self.assertLess(len(queries), 15)
+
+    def test_older_sequence_is_ignored(self):
+        """A change with a lower SEQUENCE than the stored event does not overwrite it"""
+        Event.objects.filter(uid='uid0@example.com').update(sequence=2)
+        stale = self.events[0].replace('SUMMARY:Lecture 0', 'SUMMARY:Stale').replace('UID:', 'SEQUENCE:1\nUID:')
+        result = self.reimport([stale] + self.events[1:])
+
+        self.assertEqual(result.updated, 0)
+        self.assertEqual(Event.objects.get(uid='uid0@example.com').title, 'Lecture 0')
+
+    def test_manual_events_are_kept(self):
+        """Events the user created themselves are not removed by a re-import"""
+        Event.objects.create(
+            calendar=self.calendar,
+            title='My own event',
+            start=datetime(2025, 1, 7, 9, 0, tzinfo=dt_timezone.utc),
+        )
+        result = self.reimport(self.events[:1])
+
+        self.assertEqual(result.deleted, 2)
+        self.assertTrue(Event.objects.filter(title='My own event').exists())
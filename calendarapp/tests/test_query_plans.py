@@ -0,0 +1,97 @@
+import re
+from unittest import skipUnless
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils.timezone import make_aware
+
+from datetime import datetime, timedelta
+
+from calendarapp.models import Calendar, Event, EventOccurrence
+from calendarapp.views import event_feed_queryset
+from util.occurrences import materialize
+
+CustomUser = get_user_model()
+
+# How a full table scan shows up in EXPLAIN output. On SQLite a SCAN of an index is a full scan too,
+# while lookups that use an index are reported as SEARCH.
+SEQUENTIAL_SCANS = {
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    "sqlite": re.compile(r"\bSCAN (?!CONSTANT ROW)(\w+)"),
+}
+
+
+@skipUnless(connection.vendor in SEQUENTIAL_SCANS, "EXPLAIN output is only checked on PostgreSQL and SQLite")
+class QueryPlanTestCase(TestCase):
+    """
+    Base class for tests that check hot queries are answered from an index. Subclasses seed enough
+    rows in setUpTestData for the planner to prefer an index, then call analyze().
+    """
+
+    @classmethod
+    def analyze(cls):
+        # Give the planner statistics for the seeded rows
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertNoSequentialScan(self, queryset):
+        plan = queryset.explain()
+        scans = SEQUENTIAL_SCANS[connection.vendor].findall(plan)
+        self.assertEqual(scans, [], f"Query falls back to a sequential scan:\n{queryset.query}\n\n{plan}")
+
+
+class EventQueryPlanTests(QueryPlanTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start = make_aware(datetime(2024, 9, 30, 9))
+        events = []
+        for u in range(40):
+            user = CustomUser.objects.create_user(username=f'user{u}', password='testpass123')
+            calendar = Calendar.objects.create(user=user, name='Timetable')
+            for i in range(250):
+                event_start = start + timedelta(days=i, hours=u % 8)
+                events.append(Event(
+                    calendar=calendar,
+                    title=f'Lecture {i}',
+                    start=event_start,
+                    end=event_start + timedelta(hours=1),
+                    duration=timedelta(hours=1),
+                    rrule='FREQ=WEEKLY;COUNT=10' if i % 10 == 0 else None,
+                    uid=f'{u}-{i}@example.com',
+                    content_hash=f'{u}-{i}',
+                ))
+        Event.objects.bulk_create(events)
+        materialize([event for event in events if event.rrule])
+        cls.user = user
+        cls.calendar = calendar
+        cls.analyze()
+
+    def test_feed_window(self):
+        """The windowed calendar feed uses the (calendar, start) index"""
+        window = (make_aware(datetime(2025, 1, 6)), make_aware(datetime(2025, 1, 13)))
+        self.assertNoSequentialScan(event_feed_queryset(self.user, window))
+
+    def test_feed_without_window(self):
+        """The full calendar feed looks events up by calendar"""
+        self.assertNoSequentialScan(event_feed_queryset(self.user, None))
+
+    def test_events_ending_in_range(self):
+        """Events are found by calendar and end time"""
+        self.assertNoSequentialScan(Event.objects.filter(
+            calendar=self.calendar, end__gte=make_aware(datetime(2025, 1, 6)), end__lt=make_aware(datetime(2025, 1, 13))
+        ))
+
+    def test_recurring_events(self):
+        """A user's recurring events come from the partial index"""
+        self.assertNoSequentialScan(Event.objects.filter(calendar__user=self.user, rrule__isnull=False))
+
+    def test_reimport_lookup(self):
+        """A re-import finds the calendar's imported events by calendar"""
+        self.assertNoSequentialScan(Event.objects.filter(calendar=self.calendar).exclude(uid='', content_hash=''))
+
+    def test_occurrences_in_range(self):
+        """Search finds occurrences by start time"""
+        self.assertNoSequentialScan(EventOccurrence.objects.filter(
+            occurrence_start__gte=make_aware(datetime(2025, 1, 6)), occurrence_start__lt=make_aware(datetime(2025, 1, 13))
+        ))
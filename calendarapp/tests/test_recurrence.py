@@ -0,0 +1,150 @@
+import random
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.timezone import make_aware
+
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from calendarapp.models import Calendar
+from study_sessions.models import StudySession, RecurringStudySession
+from util.recurrence import clear_rule_caches, event_rule, expand_rule, parse_rule, rule_cache_stats
+from util.vector_recurrence import day_pattern, expand_rules, to_datetimes
+
+CustomUser = get_user_model()
+
+WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+
+def random_rule(randomizer, aware=True):
+    """
+    Builds a random DAILY or WEEKLY rule text and start, with starts often put in the hour the
+    clocks change so daylight saving edge cases come up.
+    """
+    parts = [f"FREQ={randomizer.choice(['DAILY', 'WEEKLY'])}"]
+    if randomizer.random() < 0.4:
+        parts.append(f"INTERVAL={randomizer.randint(1, 5)}")
+    if randomizer.random() < 0.5:
+        parts.append("BYDAY=" + ",".join(randomizer.sample(WEEKDAYS, randomizer.randint(1, 4))))
+    if randomizer.random() < 0.2:
+        parts.append(f"WKST={randomizer.choice(WEEKDAYS)}")
+    limit = randomizer.random()
+    if limit < 0.4:
+        parts.append(f"COUNT={randomizer.randint(1, 80)}")
+    elif limit < 0.8:
+        until = datetime(2025, 1, 1, tzinfo=dt_timezone.utc) + timedelta(seconds=randomizer.randrange(400 * 86400))
+        parts.append("UNTIL=" + until.strftime("%Y%m%dT%H%M%SZ" if aware else "%Y%m%dT%H%M%S"))
+
+    start = datetime(2025, 1, 1) + timedelta(minutes=randomizer.randrange(365 * 1440))
+    if randomizer.random() < 0.2:
+        start = start.replace(hour=1, minute=randomizer.choice([0, 30]))
+    return ";".join(parts), make_aware(start) if aware else start
+
+
+class RuleCacheTests(TestCase):
+    def setUp(self):
+        clear_rule_caches()
+        self.start = make_aware(datetime(2025, 1, 6, 9))
+
+    def test_rules_parsed_once(self):
+        """The same rule text and start share one parsed rule"""
+        first = event_rule('FREQ=WEEKLY;COUNT=4', self.start)
+        second = event_rule('FREQ=WEEKLY;COUNT=4', self.start)
+
+        self.assertIs(first, second)
+        self.assertIsNot(event_rule('FREQ=WEEKLY;COUNT=4', make_aware(datetime(2025, 1, 7, 9))), first)
+        stats = rule_cache_stats()['rules']
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 2, 2))
+        self.assertEqual(stats['hit_rate'], 1 / 3)
+
+    def test_expansion_cached_by_window(self):
+        """Expansions are cached for each rule and window, and match dateutil"""
+        window = (make_aware(datetime(2025, 1, 1)), make_aware(datetime(2025, 2, 1)))
+        occurrences = expand_rule('FREQ=WEEKLY;COUNT=10', self.start, *window)
+
+        self.assertEqual(occurrences, tuple(parse_rule('FREQ=WEEKLY;COUNT=10', self.start).between(*window, inc=True)))
+        self.assertIs(expand_rule('FREQ=WEEKLY;COUNT=10', self.start, *window), occurrences)
+        self.assertEqual(len(expand_rule('FREQ=WEEKLY;COUNT=10', self.start)), 10)
+        self.assertEqual(rule_cache_stats()['expansions']['hits'], 1)
+
+    def test_search_parses_each_rule_once(self):
+        """A search expands each distinct session rule once, however many sessions share it"""
+        user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        calendar = Calendar.objects.create(user=user, name='Timetable')
+        for _ in range(3):
+            session = StudySession.objects.create(
+                title='Revision', date=date(2025, 1, 8), start_time=time(14), end_time=time(16),
+                is_recurring=True, host=user, calendar_id=calendar
+            )
+            RecurringStudySession.objects.create(session_id=session, recurrence_amount=4)
+        self.client.login(username='testuser', password='testpass123')
+
+        response = self.client.get(reverse('search_results'), {'q': 'Revision'})
+
+        self.assertEqual(len(response.context['session_results']), 3 * 4 + 3)
+        self.assertEqual(rule_cache_stats()['rules']['misses'], 1)
+        self.assertEqual(rule_cache_stats()['expansions']['hits'], 2)
+
+    def test_stats_are_staff_only(self):
+        """The rule cache counters are shown to staff only"""
+        user = CustomUser.objects.create_user(username='testuser', password='testpass123', is_staff=True)
+        url = reverse('rule_cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertEqual(set(response.json()), {'rules', 'expansions'})
+
+
+class VectorRecurrenceTests(TestCase):
+    def assertMatchesDateutil(self, rules, after, before, inc=True):
+        afters = after if isinstance(after, list) else [after] * len(rules)
+        for rule, walls, rule_after in zip(rules, expand_rules(rules, after, before, inc), afters):
+            expected = rule.between(rule_after, before, inc=inc)
+            occurrences = to_datetimes(walls, rule._tzinfo)
+            self.assertEqual(occurrences, expected, str(rule))
+            self.assertEqual([o.utcoffset() for o in occurrences], [o.utcoffset() for o in expected], str(rule))
+
+    def test_matches_dateutil(self):
+        """Random simple rules expand to exactly what dateutil gives, for random windows"""
+        randomizer = random.Random(0)
+        rules = [parse_rule(*random_rule(randomizer)) for _ in range(300)]
+        for _ in range(10):
+            after = make_aware(datetime(2025, 3, 1)) + timedelta(minutes=randomizer.randrange(-120000, 480000))
+            if randomizer.random() < 0.5:
+                after = after.astimezone(dt_timezone.utc)
+            before = after + timedelta(minutes=randomizer.randrange(540000))
+            self.assertMatchesDateutil(rules, after, before, inc=randomizer.random() < 0.5)
+
+    def test_matches_dateutil_naive(self):
+        """Rules with a naive start, like study sessions, match dateutil too"""
+        randomizer = random.Random(1)
+        rules = [parse_rule(*random_rule(randomizer, aware=False)) for _ in range(300)]
+        self.assertMatchesDateutil(rules, datetime(2025, 2, 1), datetime(2026, 2, 1))
+
+    def test_bounds_for_each_rule(self):
+        """Each rule can be given its own lower bound"""
+        randomizer = random.Random(2)
+        rules = [parse_rule(*random_rule(randomizer)) for _ in range(100)]
+        afters = [make_aware(datetime(2025, 1, 1)) + timedelta(hours=randomizer.randrange(8000)) for _ in rules]
+        self.assertMatchesDateutil(rules, afters, make_aware(datetime(2026, 6, 1)))
+
+    def test_daylight_saving(self):
+        """A weekly 9am rule stays at 9am local time across the clock change"""
+        rule = event_rule('FREQ=WEEKLY;COUNT=3', make_aware(datetime(2025, 3, 24, 9)))
+        walls, = expand_rules([rule], make_aware(datetime(2025, 3, 1)), make_aware(datetime(2025, 5, 1)))
+        occurrences = [timezone.localtime(o) for o in to_datetimes(walls, rule._tzinfo)]
+        self.assertEqual([o.hour for o in occurrences], [9, 9, 9])
+        self.assertNotEqual(occurrences[0].utcoffset(), occurrences[1].utcoffset())
+
+    def test_complex_rules_fall_back(self):
+        """Rules outside the simple shapes are expanded by dateutil"""
+        start = make_aware(datetime(2025, 1, 6, 9))
+        monthly = event_rule('FREQ=MONTHLY;BYDAY=1MO;COUNT=6', start)
+        hourly = event_rule('FREQ=DAILY;BYHOUR=9,14;COUNT=6', start)
+        self.assertIsNone(day_pattern(monthly))
+        self.assertIsNone(day_pattern(hourly))
+        self.assertIsNotNone(day_pattern(event_rule('FREQ=WEEKLY;BYDAY=MO,WE', start)))
+        self.assertMatchesDateutil([monthly, hourly], start, make_aware(datetime(2026, 1, 1)))
@@ -0,0 +1,179 @@
+import re
+from unittest import skipUnless
+
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import QuerySet
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.timezone import make_aware
+
+from datetime import datetime, timedelta
+
+from calendarapp.models import Calendar, Event
+from calendarapp.views import SEARCH_PAGE_SIZE
+from study_sessions.models import StudySession, RecurringStudySession
+from util.search import SearchIndex, clear_search_indexes, matching_ids, prefix_query
+
+CustomUser = get_user_model()
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.index = SearchIndex([
+            (1, 'Software Engineering Lecture', 'Design patterns'),
+            (2, 'Maths Tutorial', 'Linear algebra for software engineers'),
+            (3, 'Football', ''),
+        ])
+
+    def test_prefix_matching(self):
+        """Each word of the query matches as a prefix"""
+        self.assertEqual(self.index.search('foot'), [3])
+        self.assertEqual(self.index.search('engineer'), [1, 2])
+
+    def test_every_word_must_match(self):
+        """Rows have to match all of the query's words"""
+        self.assertEqual(self.index.search('software algebra'), [2])
+        self.assertEqual(self.index.search('software football'), [])
+
+    def test_title_matches_rank_first(self):
+        """A match in the title ranks above one in the description"""
+        self.assertEqual(self.index.search('software'), [1, 2])
+        self.assertEqual(self.index.search('lin'), [2])
+
+    def test_query_without_words(self):
+        """Punctuation alone matches nothing"""
+        self.assertEqual(self.index.search('!?'), [])
+        self.assertIsNone(prefix_query('!?'))
+
+
+class SearchResultsTests(TestCase):
+    def setUp(self):
+        clear_search_indexes()
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        other = CustomUser.objects.create_user(username='otheruser', password='testpass123')
+        other_calendar = Calendar.objects.create(user=other, name='Timetable')
+        start = make_aware(datetime(2025, 5, 15, 10))
+        Event.objects.create(calendar=self.calendar, title='Databases Lecture', start=start)
+        Event.objects.create(calendar=self.calendar, title='Lab', description='Databases practical', start=start)
+        Event.objects.create(calendar=other_calendar, title='Databases Lecture', start=start)
+        StudySession.objects.create(
+            title='Databases revision', date='2025-05-16', start_time='14:00', end_time='16:00',
+            host=other, calendar_id=other_calendar
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def search(self, query):
+        return self.client.get(reverse('search_results'), {'q': query}).context
+
+    def test_results_are_scoped(self):
+        """Only the user's events and sessions are searched"""
+        context = self.search('datab')
+        self.assertEqual(sorted(e['title'] for e in context['event_results']), ['Databases Lecture', 'Lab'])
+        self.assertEqual(context['session_results'], [])
+
+    def test_index_follows_changes(self):
+        """Events saved after a search are found by the next one"""
+        self.assertEqual(self.search('seminar')['event_results_count'], 0)
+        Event.objects.create(calendar=self.calendar, title='Seminar', start=make_aware(datetime(2025, 5, 20, 10)))
+        self.assertEqual(self.search('seminar')['event_results_count'], 1)
+
+
+class SearchPaginationTests(TestCase):
+    def setUp(self):
+        clear_search_indexes()
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        self.start = make_aware(datetime(2025, 5, 5, 10))
+        now = timezone.now()
+        self.recurring_start = make_aware(datetime(now.year, now.month, now.day, 9))
+        for i in range(25):
+            Event.objects.create(calendar=self.calendar, title='Networks lab', start=self.start + timedelta(days=i))
+        # 30 weekly occurrences starting today
+        Event.objects.create(
+            calendar=self.calendar, title='Networks lecture', start=self.recurring_start,
+            end=self.recurring_start + timedelta(hours=1), rrule='FREQ=WEEKLY;COUNT=30'
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def search(self, **params):
+        return self.client.get(reverse('search_results'), {'q': 'networks', **params}).context
+
+    def test_pages_are_merged_newest_first(self):
+        """Occurrences and single events share pages, newest first, and every result is on exactly one page"""
+        pages = [self.search(page=page) for page in (1, 2, 3)]
+        self.assertEqual([len(p['event_results']) for p in pages], [SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE, 15])
+        self.assertEqual([p['event_has_next'] for p in pages], [True, True, False])
+        self.assertEqual(pages[0]['event_results_count'], 55)
+
+        starts = [e['start'] for p in pages for e in p['event_results']]
+        self.assertEqual(starts, sorted(starts, reverse=True))
+        self.assertEqual(len(set(starts)), 55)
+
+    def test_only_the_page_is_read(self):
+        """Each source is read no further than the requested page"""
+        with CaptureQueriesContext(connection) as queries:
+            self.search()
+        reads = [q['sql'] for q in queries.captured_queries if 'ORDER BY' in q['sql'] and 'calendarapp_event' in q['sql']]
+        self.assertEqual(len(reads), 2, reads)
+        for sql in reads:
+            self.assertIn(f'LIMIT {SEARCH_PAGE_SIZE + 1}', sql)
+
+    def test_bad_page_numbers(self):
+        """Missing or invalid page numbers show the first page"""
+        for page in ('', 'abc', '-3', '0'):
+            context = self.search(page=page)
+            self.assertEqual(context['event_page'], 1)
+            self.assertEqual(len(context['event_results']), SEARCH_PAGE_SIZE)
+
+    def test_recurring_sessions_are_paged(self):
+        """The occurrences of recurring study sessions are paged along with single sessions"""
+        session = StudySession.objects.create(
+            title='Networks revision', date='2025-05-06', start_time='14:00', end_time='16:00',
+            is_recurring=True, host=self.user, calendar_id=self.calendar
+        )
+        RecurringStudySession.objects.create(session_id=session, recurrence_amount=30)
+
+        first, second = self.search(), self.search(session_page=2)
+        self.assertEqual(first['session_results_count'], 31)
+        self.assertTrue(first['session_has_next'])
+        self.assertEqual(len(first['session_results']), SEARCH_PAGE_SIZE)
+        self.assertEqual(len(second['session_results']), 11)
+        self.assertFalse(second['session_has_next'])
+        # The session itself is the oldest result
+        self.assertEqual(second['session_results'][-1], session)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Full-text search columns are only filled on PostgreSQL')
+class PostgresSearchTests(TestCase):
+    def test_trigger_fills_search_vector(self):
+        """The trigger fills search_vector on insert and update, including for saves that don't know about it"""
+        user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        calendar = Calendar.objects.create(user=user, name='Timetable')
+        event = Event.objects.create(calendar=calendar, title='Networks', start=make_aware(datetime(2025, 5, 15, 10)))
+
+        self.assertTrue(Event.objects.filter(search_vector=prefix_query('netw')).exists())
+        event.description = 'Routing'
+        event.save()
+        self.assertTrue(Event.objects.filter(search_vector=prefix_query('networks rout')).exists())
+        event.start = make_aware(datetime(2025, 5, 16, 10))
+        event.save()
+        self.assertTrue(Event.objects.filter(search_vector=prefix_query('rout')).exists())
+
+    def test_matches_are_a_subquery(self):
+        """Matching ids are read by the database as a subquery, not sent back to it as a list"""
+        user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        calendar = Calendar.objects.create(user=user, name='Timetable')
+        start = make_aware(datetime(2025, 5, 15, 10))
+        Event.objects.bulk_create([Event(calendar=calendar, title=f'Networks {i}', start=start) for i in range(50)])
+        events = Event.objects.filter(calendar__user=user)
+        self.assertIsInstance(matching_ids(events, 'netw', ('events', user.id), 1), QuerySet)
+
+        self.client.login(username='testuser', password='testpass123')
+        with CaptureQueriesContext(connection) as queries:
+            context = self.client.get(reverse('search_results'), {'q': 'netw'}).context
+        self.assertEqual(context['event_results_count'], 50)
+        self.assertFalse(any(re.search(r'IN \(\d+, \d+', query['sql']) for query in queries.captured_queries))
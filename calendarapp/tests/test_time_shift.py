@@ -0,0 +1,259 @@
+import io
+import json
+
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.urls import reverse
+from django.utils.timezone import localtime, make_aware
+
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from unittest.mock import patch
+
+from calendarapp.models import Calendar, Event
+from calendarapp.tests.test_occurrences import PAST_EVENTS
+from study_sessions.models import StudySession, StudySessionParticipant
+from util import occurrences
+from util.feed_cache import feed_version
+from util.recurrence import shift_rule
+from util.time_shift import parse_shift, shift_calendar
+
+CustomUser = get_user_model()
+
+
+def version_of(user):
+    request = RequestFactory().get('/')
+    request.user = user
+    return feed_version(request).version
+
+
+class ShiftRuleTests(TestCase):
+    def test_utc_until(self):
+        self.assertEqual(
+            shift_rule('FREQ=WEEKLY;UNTIL=20250301T090000Z;BYDAY=MO', timedelta(days=7, hours=1)),
+            'FREQ=WEEKLY;UNTIL=20250308T100000Z;BYDAY=MO'
+        )
+
+    def test_imported_rule(self):
+        """Naive DTSTARTs and UNTILs and date-only UNTILs keep their form, and rules without one are unchanged"""
+        rule = 'DTSTART:20250106T090000\nRRULE:FREQ=WEEKLY;UNTIL=20250331T090000'
+        # 10:00 in London either side of the clock change, which is an hour later in UTC before it
+        self.assertEqual(
+            shift_rule(rule, timedelta(days=-7)),
+            'DTSTART:20241230T090000\nRRULE:FREQ=WEEKLY;UNTIL=20250324T100000'
+        )
+        self.assertEqual(shift_rule('FREQ=DAILY;UNTIL=20250301', timedelta(days=2)), 'FREQ=DAILY;UNTIL=20250303')
+        self.assertEqual(
+            shift_rule('FREQ=DAILY;UNTIL=20250301', timedelta(hours=2)), 'FREQ=DAILY;UNTIL=20250302T015959'
+        )
+        self.assertEqual(shift_rule('FREQ=WEEKLY;COUNT=5', timedelta(days=7)), 'FREQ=WEEKLY;COUNT=5')
+
+
+class ShiftCalendarTests(TestCase):
+    def setUp(self):
+        PAST_EVENTS.start()
+        self.addCleanup(PAST_EVENTS.stop)
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        self.event = Event.objects.create(
+            calendar=self.calendar, title='Lecture',
+            start=make_aware(datetime(2025, 1, 6, 9)), end=make_aware(datetime(2025, 1, 6, 10))
+        )
+        self.recurring = Event.objects.create(
+            calendar=self.calendar, title='Lab',
+            start=make_aware(datetime(2025, 1, 7, 14)), end=make_aware(datetime(2025, 1, 7, 16)),
+            rrule='FREQ=WEEKLY;UNTIL=20250121T140000Z'
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_events_move_together(self):
+        """Starts and ends move by the shift, keeping each event's duration"""
+        self.assertEqual(shift_calendar(self.calendar, timedelta(days=7)), 2)
+
+        self.event.refresh_from_db()
+        self.assertEqual((self.event.start, self.event.end), (
+            make_aware(datetime(2025, 1, 13, 9)), make_aware(datetime(2025, 1, 13, 10))
+        ))
+        self.assertEqual(self.event.duration, timedelta(hours=1))
+
+    def test_recurring_events_keep_their_occurrences(self):
+        """A recurring event keeps the same number of occurrences, all moved by the shift"""
+        shift_calendar(self.calendar, timedelta(days=7))
+
+        self.recurring.refresh_from_db()
+        self.assertEqual(self.recurring.rrule, 'FREQ=WEEKLY;UNTIL=20250128T140000Z')
+        self.assertEqual(self.recurring.last_occurrence, make_aware(datetime(2025, 1, 28, 16)))
+        self.assertEqual(
+            list(self.recurring.occurrences.order_by('occurrence_start').values_list('occurrence_start', flat=True)),
+            [make_aware(datetime(2025, 1, day, 14)) for day in (14, 21, 28)]
+        )
+
+    def test_across_clock_change(self):
+        """Occurrences keep their local time when the shift moves the start across a clock change"""
+        event = Event.objects.create(
+            calendar=self.calendar, title='Seminar',
+            start=make_aware(datetime(2025, 3, 31, 9)), end=make_aware(datetime(2025, 3, 31, 10)),
+            rrule='FREQ=WEEKLY;UNTIL=20250414T080000Z'
+        )
+        shift_calendar(self.calendar, timedelta(days=-7))
+
+        event.refresh_from_db()
+        self.assertEqual((event.start, event.end), (
+            make_aware(datetime(2025, 3, 24, 9)), make_aware(datetime(2025, 3, 24, 10))
+        ))
+        self.assertEqual(event.rrule, 'FREQ=WEEKLY;UNTIL=20250407T080000Z')
+        self.assertEqual(
+            list(event.occurrences.order_by('occurrence_start').values_list('occurrence_start', flat=True)),
+            [make_aware(datetime(2025, month, day, 9)) for month, day in ((3, 24), (3, 31), (4, 7))]
+        )
+        self.assertEqual(event.last_occurrence, make_aware(datetime(2025, 4, 7, 10)))
+
+    def test_statements_do_not_grow_with_events(self):
+        """Events, recurring or not, and their occurrences are moved with the same statements however many there are"""
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                shift_calendar(self.calendar, timedelta(days=1))
+            return len(queries)
+
+        before = count_queries()
+        Event.objects.bulk_create([
+            Event(calendar=self.calendar, title=f'Event {i}', start=make_aware(datetime(2025, 2, 1, 9)))
+            for i in range(50)
+        ])
+        for i in range(20):
+            Event.objects.create(
+                calendar=self.calendar, title=f'Seminar {i}', start=make_aware(datetime(2025, 2, 3, 9)),
+                end=make_aware(datetime(2025, 2, 3, 10)),
+                rrule='FREQ=WEEKLY;COUNT=5' if i % 2 else 'DTSTART:20250203T090000\nRRULE:FREQ=WEEKLY;UNTIL=20250303T090000Z'
+            )
+        self.assertEqual(count_queries(), before)
+
+    def test_rule_text_moves(self):
+        """The DTSTART the calendar starts an imported rule from moves with the event"""
+        event = Event.objects.create(
+            calendar=self.calendar, title='Seminar',
+            start=make_aware(datetime(2024, 9, 30, 9)), end=make_aware(datetime(2024, 9, 30, 10)),
+            rrule='DTSTART:20240930T090000\nRRULE:FREQ=WEEKLY;UNTIL=20241216T090000Z'
+        )
+        shift_calendar(self.calendar, timedelta(days=763))
+
+        event.refresh_from_db()
+        self.assertEqual(event.rrule, 'DTSTART:20261102T090000\nRRULE:FREQ=WEEKLY;UNTIL=20270118T090000Z')
+        self.assertEqual(event.start, make_aware(datetime(2026, 11, 2, 9)))
+
+    def test_single_events_across_clock_change(self):
+        """Single events keep their local time across a clock change, as recurring events do"""
+        event = Event.objects.create(
+            calendar=self.calendar, title='Exam',
+            start=make_aware(datetime(2025, 3, 31, 9)), end=make_aware(datetime(2025, 3, 31, 11))
+        )
+        shift_calendar(self.calendar, timedelta(days=-7))
+
+        event.refresh_from_db()
+        self.assertEqual((event.start, event.end), (
+            make_aware(datetime(2025, 3, 24, 9)), make_aware(datetime(2025, 3, 24, 11))
+        ))
+
+    def test_forward_shift_rewrites_history(self):
+        """Events written from OCCURRENCE_HISTORY ago are written again after a forward shift, so none go missing"""
+        with patch.object(occurrences, 'OCCURRENCE_HISTORY', timedelta(days=30)):
+            start = make_aware(datetime.now().replace(microsecond=0)) - timedelta(days=60)
+            event = Event.objects.create(calendar=self.calendar, title='Check', start=start, rrule='FREQ=DAILY')
+            shift_calendar(self.calendar, timedelta(days=7))
+
+            event.refresh_from_db()
+            self.assertIsNone(event.occurrences_until)
+            self.assertFalse(event.occurrences.exists())
+            occurrences.roll()
+            first = event.occurrences.order_by('occurrence_start').first().occurrence_start
+            self.assertLess(first, occurrences.history_start() + timedelta(days=1))
+
+    def test_matches_local_arithmetic(self):
+        """Every time around both clock changes moves as adding the shift to its local time does"""
+        Event.objects.all().delete()
+        starts = [
+            datetime(year, month, day, tzinfo=dt_timezone.utc) + timedelta(minutes=20 * step)
+            for year, month, day in ((2025, 3, 29), (2025, 10, 25)) for step in range(3 * 24 * 3)
+        ]
+        Event.objects.bulk_create([Event(calendar=self.calendar, title='Slot', start=start) for start in starts])
+        for delta in (timedelta(hours=2), timedelta(minutes=-90), timedelta(days=1), timedelta(days=-7)):
+            before = dict(Event.objects.values_list('id', 'start'))
+            shift_calendar(self.calendar, delta)
+            for event_id, start in Event.objects.values_list('id', 'start'):
+                # Times in the gap the clocks skip only compare equal once they are in UTC
+                expected = (localtime(before[event_id]) + delta).astimezone(dt_timezone.utc)
+                self.assertEqual(start, expected, (before[event_id], delta))
+
+    def test_endpoint(self):
+        """The endpoint moves the user's own calendars, and refreshes their feeds"""
+        version = version_of(self.user)
+        response = self.client.post(
+            reverse('shift_calendar', args=[self.calendar.id]),
+            data=json.dumps({'days': -1, 'hours': '2'}), content_type='application/json'
+        )
+        self.assertEqual(response.json()['moved'], 2)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.start, make_aware(datetime(2025, 1, 5, 11)))
+        self.assertGreater(version_of(self.user), version)
+
+        other = CustomUser.objects.create_user(username='otheruser', password='testpass123')
+        other_calendar = Calendar.objects.create(user=other, name='Other')
+        response = self.client.post(reverse('shift_calendar', args=[other_calendar.id]), {'days': 1})
+        self.assertEqual(response.status_code, 404)
+
+    def test_bad_shifts(self):
+        """A missing, zero or non-numeric shift is rejected"""
+        url = reverse('shift_calendar', args=[self.calendar.id])
+        for data in ({}, {'days': 0}, {'days': 'next week'}):
+            self.assertEqual(self.client.post(url, data).status_code, 400)
+        with self.assertRaises(ValueError):
+            parse_shift({'minutes': 1.5})
+
+
+class ShiftSessionsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.participant = CustomUser.objects.create_user(username='otheruser', password='testpass123')
+        calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        self.session = StudySession.objects.create(
+            title='Revision', date='2025-01-08', start_time='14:00', end_time='16:00',
+            host=self.user, calendar_id=calendar
+        )
+        StudySessionParticipant.objects.create(study_session=self.session, participant=self.participant)
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_sessions_move_by_days(self):
+        """Sessions move to a new date and keep their times, and participants see the change"""
+        version = version_of(self.participant)
+        response = self.client.post(reverse('study_sessions:shift_sessions'), {'days': 7})
+        self.assertEqual(response.json(), {'status': 'success', 'moved': 1, 'shift_days': 7})
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.date, date(2025, 1, 15))
+        self.assertEqual((self.session.start_time, self.session.end_time), (time(14), time(16)))
+        self.assertGreater(version_of(self.participant), version)
+
+    def test_sessions_need_whole_days(self):
+        response = self.client.post(reverse('study_sessions:shift_sessions'), {'hours': 2})
+        self.assertEqual(response.status_code, 400)
+
+
+class ShiftCalendarCommandTests(TestCase):
+    def test_command(self):
+        user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        calendar = Calendar.objects.create(user=user, name='Timetable')
+        event = Event.objects.create(calendar=calendar, title='Lecture', start=make_aware(datetime(2025, 1, 6, 9)))
+
+        out = io.StringIO()
+        call_command('shift_calendar', calendar=calendar.id, days=7, stdout=out)
+        self.assertIn('Moved 1 event(s)', out.getvalue())
+        event.refresh_from_db()
+        self.assertEqual(event.start, make_aware(datetime(2025, 1, 13, 9)))
+
+        with self.assertRaises(CommandError):
+            call_command('shift_calendar', sessions_of='testuser', hours=3, stdout=out)
+        with self.assertRaises(CommandError):
+            call_command('shift_calendar', calendar=calendar.id, stdout=out)
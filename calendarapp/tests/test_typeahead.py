@@ -0,0 +1,120 @@
+from unittest import skipUnless
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from django.utils.timezone import make_aware
+
+from datetime import datetime, timedelta
+
+from calendarapp.models import Calendar, Event
+from modules.models import Module
+from study_sessions.models import StudySession, StudySessionParticipant
+from util.typeahead import TitleTrie, clear_typeahead_tries
+
+CustomUser = get_user_model()
+
+
+class TitleTrieTests(TestCase):
+    def setUp(self):
+        self.trie = TitleTrie({
+            ('event', 'Software Engineering Lecture'): 10,
+            ('event', 'Maths Tutorial'): 4,
+            ('session', 'Engineering maths revision'): 1,
+            ('event', 'Football'): 1,
+        })
+
+    def test_prefix_of_any_word(self):
+        """A prefix matches titles with any word starting with it"""
+        self.assertEqual(self.trie.search('foo'), [('event', 'Football', 1)])
+        self.assertEqual(
+            [title for _, title, _ in self.trie.search('math')], ['Maths Tutorial', 'Engineering maths revision']
+        )
+
+    def test_leading_words_first(self):
+        """Titles starting with the prefix come before more frequent ones that only contain it"""
+        self.assertEqual(
+            [title for _, title, _ in self.trie.search('eng')],
+            ['Engineering maths revision', 'Software Engineering Lecture'],
+        )
+
+    def test_every_word_must_match(self):
+        """Each word of the query has to start a word of the title"""
+        self.assertEqual([title for _, title, _ in self.trie.search('eng rev')], ['Engineering maths revision'])
+        self.assertEqual(self.trie.search('eng foot'), [])
+        self.assertEqual(self.trie.search('xyz'), [])
+
+    def test_limit(self):
+        """No more than limit suggestions are returned"""
+        self.assertEqual(len(self.trie.search('e', limit=1)), 1)
+
+
+class TypeaheadViewTests(TestCase):
+    def setUp(self):
+        clear_typeahead_tries()
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        start = make_aware(datetime(2025, 5, 12, 10))
+        for week in range(3):
+            Event.objects.create(calendar=self.calendar, title='Operating Systems', start=start + timedelta(weeks=week))
+        Module.objects.create(user=self.user, name='Operations Research')
+
+        other = CustomUser.objects.create_user(username='otheruser', password='testpass123')
+        other_calendar = Calendar.objects.create(user=other, name='Timetable')
+        Event.objects.create(calendar=other_calendar, title='Operas', start=start)
+        session = StudySession.objects.create(
+            title='Operating systems revision', date='2025-05-16', start_time='14:00', end_time='16:00',
+            host=other, calendar_id=other_calendar
+        )
+        StudySessionParticipant.objects.create(study_session=session, participant=self.user)
+        self.client.login(username='testuser', password='testpass123')
+
+    def suggest(self, query, **params):
+        return self.client.get(reverse('typeahead'), {'q': query, **params}).json()['results']
+
+    def test_suggestions(self):
+        """Modules, then the user's own and joined titles, with how often each appears"""
+        self.assertEqual(self.suggest('oper'), [
+            {'kind': 'module', 'title': 'Operations Research', 'count': 1},
+            {'kind': 'event', 'title': 'Operating Systems', 'count': 3},
+            {'kind': 'session', 'title': 'Operating systems revision', 'count': 1},
+        ])
+
+    def test_limit_and_empty_query(self):
+        """limit caps the suggestions, and an empty query gets none"""
+        self.assertEqual(len(self.suggest('oper', limit='1')), 1)
+        self.assertEqual(len(self.suggest('oper', limit='abc')), 3)
+        self.assertEqual(self.suggest('  '), [])
+
+    def test_new_titles_are_suggested(self):
+        """Events saved after a keystroke are suggested on the next one"""
+        self.assertEqual(self.suggest('netw'), [])
+        Event.objects.create(calendar=self.calendar, title='Networks', start=make_aware(datetime(2025, 5, 13, 10)))
+        self.assertEqual(self.suggest('netw'), [{'kind': 'event', 'title': 'Networks', 'count': 1}])
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('typeahead'), {'q': 'oper'}).status_code, 302)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Trigram suggestions are only used on PostgreSQL')
+class PostgresTypeaheadTests(TestCase):
+    def test_trigram_suggestions(self):
+        """The endpoint matches misspelt words through pg_trgm, and only in the user's own titles"""
+        user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        calendar = Calendar.objects.create(user=user, name='Timetable')
+        Event.objects.create(calendar=calendar, title='Operating Systems', start=make_aware(datetime(2025, 5, 12, 10)))
+        Module.objects.create(user=user, name='Operations Research')
+        other = CustomUser.objects.create_user(username='otheruser', password='testpass123')
+        Event.objects.create(
+            calendar=Calendar.objects.create(user=other, name='Timetable'), title='Operating Theatre',
+            start=make_aware(datetime(2025, 5, 12, 10))
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+        response = self.client.get(reverse('typeahead'), {'q': 'operatng'})
+        self.assertEqual(response.status_code, 200)
+        titles = [result['title'] for result in response.json()['results']]
+        self.assertIn('Operating Systems', titles)
+        self.assertNotIn('Operating Theatre', titles)
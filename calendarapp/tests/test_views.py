@@ -1,6 +1,8 @@
 import json
 
 from django.test import TestCase, RequestFactory, Client
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.messages.storage.fallback import FallbackStorage
@@ -12,9 +14,11 @@ from django.utils.timezone import make_aware
 from datetime import timedelta, datetime
 from rest_framework.test import APIRequestFactory
 
-from calendarapp.views import delete_calendar
-from calendarapp.models import Calendar, Event
-from study_sessions.models import StudySession
+from calendarapp.views import delete_calendar, event_feed_queryset
+from calendarapp.models import Calendar, DeletionJob, Event, ImportJob
+from calendarapp.tests.test_occurrences import PAST_EVENTS
+from study_sessions.models import StudySession, RecurringStudySession, StudySessionParticipant
+from util.feed_cache import feed_version
 
 CustomUser = get_user_model()
 
@@ -41,6 +45,11 @@ END:VCALENDAR
         """
         self.invalid_file_content = "This is not an ICS file"
 
+    def tearDown(self):
+        # Remove uploaded files that are waiting to be imported
+        for job in ImportJob.objects.all():
+            job.ics_file.delete(save=False)
+
     def test_upload_calendar_requires_login(self):
         """
         Test that the view requires authentication
@@ -93,6 +102,83 @@ END:VCALENDAR
         calendar = Calendar.objects.get(name='User Calendar')
         self.assertEqual(calendar.user, self.user)
 
+    def test_upload_queues_import_job(self):
+        """
+        Test that uploading stores the file and queues an import instead of importing in the request
+        """
+        self.client.login(username='testuser', password='testpass123')
+        
+        ics_file = SimpleUploadedFile(
+            "test.ics",
+            self.valid_ics_content.encode('utf-8'),
+            content_type="text/calendar"
+        )
+        
+        response = self.client.post(
+            reverse('upload_calendar'),
+            {'name': 'Queued Calendar', 'ics_file': ics_file},
+            format='multipart'
+        )
+        
+        job = ImportJob.objects.get(calendar__name='Queued Calendar')
+        self.assertRedirects(response, f"{reverse('upload_calendar')}?job={job.id}")
+        self.assertEqual(job.user, self.user)
+        self.assertEqual(job.state, ImportJob.States.QUEUED)
+        self.assertEqual(job.bytes_total, len(self.valid_ics_content.encode('utf-8')))
+        self.assertTrue(job.ics_file.name.endswith('.ics'))
+        self.assertFalse(Event.objects.filter(calendar=job.calendar).exists())
+
+        # The upload page shows the job's progress
+        response = self.client.get(response.url)
+        self.assertContains(response, reverse('import_job_status', args=[job.id]))
+
+    def test_upload_into_existing_calendar_queues_reimport(self):
+        """
+        Test that picking an existing calendar re-imports into it instead of creating a new one
+        """
+        self.client.login(username='testuser', password='testpass123')
+        calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        
+        ics_file = SimpleUploadedFile(
+            "test.ics",
+            self.valid_ics_content.encode('utf-8'),
+            content_type="text/calendar"
+        )
+        
+        self.client.post(
+            reverse('upload_calendar'),
+            {'calendar': calendar.id, 'ics_file': ics_file},
+            format='multipart'
+        )
+        
+        job = ImportJob.objects.get()
+        self.assertEqual(job.calendar, calendar)
+        self.assertTrue(job.reimport)
+        self.assertEqual(Calendar.objects.filter(user=self.user).count(), 1)
+
+    def test_cannot_reimport_into_other_users_calendar(self):
+        """
+        Test that only the user's own calendars can be picked for a re-import
+        """
+        self.client.login(username='testuser', password='testpass123')
+        other_user = CustomUser.objects.create_user(username='otheruser', password='testpass456')
+        calendar = Calendar.objects.create(user=other_user, name='Not Mine')
+        
+        ics_file = SimpleUploadedFile(
+            "test.ics",
+            self.valid_ics_content.encode('utf-8'),
+            content_type="text/calendar"
+        )
+        
+        response = self.client.post(
+            reverse('upload_calendar'),
+            {'calendar': calendar.id, 'ics_file': ics_file},
+            format='multipart'
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(ImportJob.objects.exists())
+
     def test_invalid_post_returns_form(self):
         """
         Test that invalid POST returns form with 200 status to allow for server validation response
@@ -114,6 +200,113 @@ END:VCALENDAR
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, 'form')
 
+class ImportJobStatusViewTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.other_user = CustomUser.objects.create_user(username='otheruser', password='testpass456')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        self.job = ImportJob.objects.create(
+            user=self.user,
+            calendar=self.calendar,
+            state=ImportJob.States.PARSING,
+            bytes_total=1000,
+            bytes_read=500,
+            events_parsed=20,
+        )
+        self.url = reverse('import_job_status', args=[self.job.id])
+
+    def test_requires_login(self):
+        """Test that anonymous users are redirected to login"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_returns_progress(self):
+        """Test that the job's state and progress are returned as JSON"""
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['state'], 'parsing')
+        self.assertEqual(data['calendar'], 'Timetable')
+        self.assertEqual(data['events_parsed'], 20)
+        self.assertEqual(data['progress'], 45)
+
+    def test_other_users_job_not_found(self):
+        """Test that users can't see other users' imports"""
+        self.client.login(username='otheruser', password='testpass456')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+class CalendarFeedViewTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        Event.objects.create(
+            calendar=self.calendar, title='Lecture',
+            start=make_aware(datetime(2025, 1, 6, 9)), end=make_aware(datetime(2025, 1, 6, 10)),
+        )
+        StudySession.objects.create(
+            title='Revision', date='2025-01-08', start_time='14:00', end_time='16:00',
+            host=self.user, calendar_id=self.calendar
+        )
+        recurring = StudySession.objects.create(
+            title='Weekly Revision', date='2024-12-02', start_time='10:00', end_time='11:00',
+            is_recurring=True, host=self.user, calendar_id=self.calendar
+        )
+        RecurringStudySession.objects.create(session_id=recurring, recurrence_amount=3)
+        self.client.login(username='testuser', password='testpassword')
+
+    def get_feed(self, start, end):
+        response = self.client.get(reverse('calendar_feed'), {'start': start, 'end': end})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.getvalue())
+
+    def test_login_required(self):
+        """The feed requires login"""
+        self.client.logout()
+        response = self.client.get(reverse('calendar_feed'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_events_and_sessions_in_one_feed(self):
+        """Events and sessions in the window come back together, in the shared format"""
+        feed = self.get_feed('2025-01-06', '2025-01-13')
+
+        self.assertEqual(sorted(item['title'] for item in feed), ['Lecture', 'Revision'])
+        for item in feed:
+            self.assertLessEqual({'id', 'title', 'type', 'start', 'end', 'description', 'model'}, set(item))
+        self.assertEqual({item['model'] for item in feed}, {'Event', 'StudySession'})
+
+    def test_recurring_sessions_in_window(self):
+        """A recurring session is included while it still has occurrences"""
+        # The third and last occurrence is on 16 December
+        self.assertEqual([item['title'] for item in self.get_feed('2024-12-16', '2024-12-23')], ['Weekly Revision'])
+        self.assertEqual(self.get_feed('2024-12-23', '2024-12-30'), [])
+
+    def test_queries_do_not_grow(self):
+        """The feed takes the same number of queries however many events and sessions there are"""
+        self.get_feed('2025-01-06', '2025-01-13')
+        with CaptureQueriesContext(connection) as before:
+            self.get_feed('2025-01-06', '2025-01-20')
+
+        for day in range(7, 12):
+            Event.objects.create(
+                calendar=self.calendar, title=f'Event {day}',
+                start=make_aware(datetime(2025, 1, day, 9)), end=make_aware(datetime(2025, 1, day, 10)),
+            )
+            session = StudySession.objects.create(
+                title=f'Session {day}', date=f'2025-01-{day:02d}', start_time='14:00', end_time='15:00',
+                is_recurring=True, host=self.user, calendar_id=self.calendar
+            )
+            RecurringStudySession.objects.create(session_id=session, recurrence_amount=2)
+
+        with CaptureQueriesContext(connection) as after:
+            feed = self.get_feed('2025-01-06', '2025-01-20')
+
+        self.assertEqual(len(feed), 12)
+        self.assertEqual(len(after), len(before))
+
+
 class PrepEventsViewTests(TestCase):
     def setUp(self):
         """Set up test data before each test method runs."""
@@ -178,7 +371,7 @@ class PrepEventsViewTests(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
         
-        events = json.loads(response.content)
+        events = json.loads(response.getvalue())
         self.assertEqual(len(events), 3)
         
         event_ids = [e['id'] for e in events]
@@ -191,7 +384,7 @@ class PrepEventsViewTests(TestCase):
         self.client.login(username='testuser', password='testpassword')
         url = reverse('prep_events')
         response = self.client.get(url)
-        events = json.loads(response.content)
+        events = json.loads(response.getvalue())
         
         event1_data = next((e for e in events if e['id'] == self.event1.id), None)
         self.assertIsNotNone(event1_data)
@@ -208,7 +401,7 @@ class PrepEventsViewTests(TestCase):
         self.client.login(username='testuser', password='testpassword')
         url = reverse('prep_events')
         response = self.client.get(url)
-        events = json.loads(response.content)
+        events = json.loads(response.getvalue())
         
         event2_data = next((e for e in events if e['id'] == self.event2.id), None)
         self.assertIsNotNone(event2_data)
@@ -220,7 +413,7 @@ class PrepEventsViewTests(TestCase):
         self.client.login(username='testuser', password='testpassword')
         url = reverse('prep_events')
         response = self.client.get(url)
-        events = json.loads(response.content)
+        events = json.loads(response.getvalue())
         
         event3_data = next((e for e in events if e['id'] == self.event3.id), None)
         self.assertIsNotNone(event3_data)
@@ -252,7 +445,7 @@ class PrepEventsViewTests(TestCase):
         self.client.login(username='testuser', password='testpassword')
         url = reverse('prep_events')
         response = self.client.get(url)
-        events = json.loads(response.content)
+        events = json.loads(response.getvalue())
         self.assertEqual(len(events), 3)
         event_ids = [e['id'] for e in events]
         self.assertNotIn(other_event.id, event_ids)
@@ -260,10 +453,19 @@ class PrepEventsViewTests(TestCase):
         # Test with other user
         self.client.login(username='otheruser', password='otherpassword')
         response = self.client.get(url)
-        events = json.loads(response.content)
+        events = json.loads(response.getvalue())
         self.assertEqual(len(events), 1)
         self.assertEqual(events[0]['id'], other_event.id)
     
+    def test_feed_is_streamed(self):
+        """The feed is streamed as a JSON array rather than built in memory"""
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.get(reverse('prep_events'))
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(len(json.loads(response.getvalue())), 3)
+
     def test_duration_field(self):
         """Test that duration field is included for events with end times."""
         self.event2.duration = timedelta(hours=2)
@@ -272,7 +474,7 @@ class PrepEventsViewTests(TestCase):
         self.client.login(username='testuser', password='testpassword')
         url = reverse('prep_events')
         response = self.client.get(url)
-        events = json.loads(response.content)
+        events = json.loads(response.getvalue())
         
         event2_data = next((e for e in events if e['id'] == self.event2.id), None)
         self.assertIsNotNone(event2_data)
@@ -332,6 +534,88 @@ class PrepEventsViewTests(TestCase):
         self.assertIn('Calendar not found or access denied', response.json()['message'])
 
 
+class PrepEventsWindowTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        self.client.login(username='testuser', password='testpassword')
+
+    def create_event(self, title, start, end=None, rrule=None):
+        return Event.objects.create(calendar=self.calendar, title=title, start=start, end=end, rrule=rrule)
+
+    def get_titles(self, start, end):
+        response = self.client.get(reverse('prep_events'), {'start': start, 'end': end})
+        self.assertEqual(response.status_code, 200)
+        return sorted(e['title'] for e in json.loads(response.getvalue()))
+
+    def test_only_events_in_window_are_returned(self):
+        """Events that overlap the window are returned and the rest are left out"""
+        self.create_event('Before', make_aware(datetime(2025, 1, 1, 9)), make_aware(datetime(2025, 1, 1, 10)))
+        self.create_event('Overlapping', make_aware(datetime(2025, 1, 5, 23)), make_aware(datetime(2025, 1, 6, 1)))
+        self.create_event('Inside', make_aware(datetime(2025, 1, 8, 9)), make_aware(datetime(2025, 1, 8, 10)))
+        self.create_event('No end', make_aware(datetime(2025, 1, 9, 9)))
+        self.create_event('After', make_aware(datetime(2025, 1, 13, 9)), make_aware(datetime(2025, 1, 13, 10)))
+
+        titles = self.get_titles('2025-01-06T00:00:00Z', '2025-01-13T00:00:00Z')
+        self.assertEqual(titles, ['Inside', 'No end', 'Overlapping'])
+
+    def test_recurring_events_need_an_occurrence_in_window(self):
+        """Recurring events are only returned if one of their occurrences falls in the window"""
+        self.create_event(
+            'Mondays', make_aware(datetime(2024, 9, 30, 9)), make_aware(datetime(2024, 9, 30, 10)),
+            'DTSTART:20240930T090000\nRRULE:FREQ=WEEKLY;COUNT=20;BYDAY=MO',
+        )
+        self.create_event(
+            'Finished', make_aware(datetime(2024, 9, 30, 11)), make_aware(datetime(2024, 9, 30, 12)),
+            'DTSTART:20240930T110000\nRRULE:FREQ=WEEKLY;COUNT=4;BYDAY=MO',
+        )
+        self.create_event(
+            'Until', make_aware(datetime(2024, 9, 30, 13)), make_aware(datetime(2024, 9, 30, 14)),
+            'FREQ=WEEKLY;UNTIL=20241101T000000',
+        )
+
+        self.assertEqual(self.get_titles('2024-11-04', '2024-11-11'), ['Mondays'])
+        self.assertEqual(self.get_titles('2024-10-28', '2024-11-04'), ['Mondays', 'Until'])
+        # No Monday in the window
+        self.assertEqual(self.get_titles('2024-11-05', '2024-11-10'), [])
+
+    def test_finished_recurring_events_are_left_out_in_sql(self):
+        """Recurring events whose last occurrence ends before the window are not even read"""
+        self.create_event('Endless', make_aware(datetime(2024, 9, 30, 9)), rrule='FREQ=WEEKLY')
+        self.create_event('Finished', make_aware(datetime(2024, 9, 30, 9)), rrule='FREQ=WEEKLY;COUNT=4')
+
+        window = (make_aware(datetime(2040, 1, 2)), make_aware(datetime(2040, 1, 9)))
+        events = event_feed_queryset(self.user, window)
+        self.assertEqual([event.title for event in events], ['Endless'])
+
+    def test_recurring_events_keep_local_time_across_clock_change(self):
+        """A weekly 9am event is still at 9am local time after the clocks go back"""
+        self.create_event(
+            'Lecture', make_aware(datetime(2024, 10, 21, 9)), make_aware(datetime(2024, 10, 21, 10)),
+            'DTSTART:20241021T090000\nRRULE:FREQ=WEEKLY;COUNT=3;BYDAY=MO',
+        )
+
+        # 9am on 4 November is 09:00 UTC, not 08:00 UTC as it was before the change
+        self.assertEqual(self.get_titles('2024-11-04T08:15:00Z', '2024-11-04T08:45:00Z'), [])
+        self.assertEqual(self.get_titles('2024-11-04T09:15:00Z', '2024-11-04T09:45:00Z'), ['Lecture'])
+
+    def test_without_window_all_events_are_returned(self):
+        """Requests without a window still get every event"""
+        self.create_event('Old', make_aware(datetime(2020, 1, 1, 9)), make_aware(datetime(2020, 1, 1, 10)))
+        self.create_event('New', make_aware(datetime(2030, 1, 1, 9)), make_aware(datetime(2030, 1, 1, 10)))
+
+        response = self.client.get(reverse('prep_events'))
+        self.assertEqual(len(json.loads(response.getvalue())), 2)
+
+    def test_invalid_window(self):
+        """An unreadable or backwards window is rejected"""
+        response = self.client.get(reverse('prep_events'), {'start': 'soon', 'end': '2025-01-13'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(reverse('prep_events'), {'start': '2025-01-13', 'end': '2025-01-06'})
+        self.assertEqual(response.status_code, 400)
+
+
 class UpdateEventViewTests(TestCase):
     def setUp(self):
         self.user = CustomUser.objects.create_user(
@@ -538,6 +822,135 @@ class UpdateEventViewTests(TestCase):
             'message': 'Missing required fields'
         })
 
+@PAST_EVENTS
+class BatchUpdateEventsViewTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.other_user = CustomUser.objects.create_user(username='otheruser', password='testpass456')
+        self.calendar = Calendar.objects.create(user=self.user, name='Test Calendar')
+        other_calendar = Calendar.objects.create(user=self.other_user, name='Other Calendar')
+        self.event = Event.objects.create(
+            calendar=self.calendar,
+            title='Lecture',
+            start=make_aware(datetime(2025, 1, 6, 10, 0)),
+            end=make_aware(datetime(2025, 1, 6, 11, 0))
+        )
+        self.recurring = Event.objects.create(
+            calendar=self.calendar,
+            title='Weekly Lab',
+            start=make_aware(datetime(2025, 1, 7, 14, 0)),
+            end=make_aware(datetime(2025, 1, 7, 16, 0)),
+            rrule='FREQ=WEEKLY;COUNT=3'
+        )
+        self.other_event = Event.objects.create(
+            calendar=other_calendar,
+            title='Not Mine',
+            start=make_aware(datetime(2025, 1, 6, 10, 0)),
+            end=make_aware(datetime(2025, 1, 6, 11, 0))
+        )
+        self.session = StudySession.objects.create(
+            title='Revision', date='2025-01-08', start_time='14:00', end_time='16:00',
+            host=self.user, calendar_id=self.calendar
+        )
+        self.url = reverse('batch_update_events')
+        self.client.login(username='testuser', password='testpass123')
+
+    def post(self, changes):
+        return self.client.post(self.url, data=json.dumps({'changes': changes}), content_type='application/json')
+
+    def test_moves_events_and_sessions(self):
+        """Every change is applied, keeping durations when no end is given"""
+        response = self.post([
+            {'model': 'event', 'id': self.event.id, 'start': '2025-01-13T10:00:00Z', 'end': '2025-01-13T12:00:00Z'},
+            {'model': 'event', 'id': self.recurring.id, 'start': '2025-01-14T14:00:00Z'},
+            {'model': 'studysession', 'id': self.session.id, 'start': '2025-01-15T09:00:00'},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertEqual(response.json()['updated'], 3)
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.end, make_aware(datetime(2025, 1, 13, 12, 0)))
+        self.assertEqual(self.event.duration, timedelta(hours=2))
+
+        self.recurring.refresh_from_db()
+        self.assertEqual(self.recurring.end, make_aware(datetime(2025, 1, 14, 16, 0)))
+        self.assertEqual(self.recurring.last_occurrence, make_aware(datetime(2025, 1, 28, 16, 0)))
+        self.assertEqual(
+            list(self.recurring.occurrences.order_by('occurrence_start').values_list('occurrence_start', flat=True)),
+            [make_aware(datetime(2025, 1, d, 14, 0)) for d in (14, 21, 28)]
+        )
+
+        self.session.refresh_from_db()
+        self.assertEqual(str(self.session.date), '2025-01-15')
+        self.assertEqual((str(self.session.start_time), str(self.session.end_time)), ('09:00:00', '11:00:00'))
+
+    def test_per_item_results(self):
+        """Failed changes are reported on their own while the others are applied"""
+        response = self.post([
+            {'model': 'event', 'id': self.event.id, 'start': '2025-01-13T10:00:00Z'},
+            {'model': 'event', 'id': self.other_event.id, 'start': '2025-01-13T10:00:00Z'},
+            {'model': 'event', 'id': 99999, 'start': '2025-01-13T10:00:00Z'},
+            {'model': 'event', 'id': self.event.id, 'start': 'not a date'},
+            {'model': 'event', 'id': self.event.id, 'start': '2025-01-13T10:00:00Z', 'end': '2025-01-13T09:00:00Z'},
+            {'model': 'studysession', 'id': self.session.id, 'start': '2025-01-15T23:00:00'},
+            {'model': 'calendar', 'id': self.calendar.id, 'start': '2025-01-13T10:00:00Z'},
+            {'id': self.event.id},
+        ])
+
+        data = response.json()
+        self.assertEqual(data['status'], 'partial')
+        self.assertEqual((data['updated'], data['failed']), (1, 7))
+        self.assertEqual(
+            [(r['status'], r.get('status_code')) for r in data['results']],
+            [('success', None), ('error', 403), ('error', 404)] + [('error', 400)] * 5
+        )
+        self.event.refresh_from_db()
+        self.other_event.refresh_from_db()
+        self.assertEqual(self.event.start, make_aware(datetime(2025, 1, 13, 10, 0)))
+        self.assertEqual(self.other_event.start, make_aware(datetime(2025, 1, 6, 10, 0)))
+
+    def test_query_count_does_not_grow(self):
+        """Ownership is checked and changes written with the same number of queries however many there are"""
+        events = [
+            Event.objects.create(
+                calendar=self.calendar, title=f'Event {i}',
+                start=make_aware(datetime(2025, 2, 1 + i, 10, 0)), end=make_aware(datetime(2025, 2, 1 + i, 11, 0))
+            )
+            for i in range(10)
+        ]
+
+        def count_queries(batch):
+            with CaptureQueriesContext(connection) as queries:
+                self.post([
+                    {'model': 'event', 'id': event.id, 'start': event.start.replace(hour=12).isoformat()}
+                    for event in batch
+                ])
+            return len(queries)
+
+        self.assertEqual(count_queries(events[:2]), count_queries(events))
+
+    def test_feeds_are_refreshed(self):
+        """Participants of a moved session see the change"""
+        StudySessionParticipant.objects.create(study_session=self.session, participant=self.other_user)
+        request = RequestFactory().get('/')
+        request.user = self.other_user
+        before = feed_version(request).version
+
+        self.post([{'model': 'studysession', 'id': self.session.id, 'start': '2025-01-15T09:00:00'}])
+        request = RequestFactory().get('/')
+        request.user = self.other_user
+        self.assertEqual(feed_version(request).version, before + 1)
+
+    def test_bad_requests(self):
+        """A missing or oversized list of changes is rejected"""
+        self.assertEqual(self.client.post(self.url, data='{}', content_type='application/json').status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+        changes = [{'model': 'event', 'id': self.event.id, 'start': '2025-01-13T10:00:00Z'}] * 501
+        self.assertEqual(self.post(changes).status_code, 400)
+
+
 class DeleteCalendarViewTests(TestCase):
     def setUp(self):
         self.factory = APIRequestFactory()
@@ -567,9 +980,9 @@ class DeleteCalendarViewTests(TestCase):
         
         response = delete_calendar(request, self.calendar.id)
         
-        # Check calendar was deleted
-        with self.assertRaises(Calendar.DoesNotExist):
-            Calendar.objects.get(id=self.calendar.id)
+        # Check calendar was hidden and queued for deletion
+        self.assertTrue(Calendar.objects.get(id=self.calendar.id).pending_delete)
+        self.assertEqual(DeletionJob.objects.get(calendar_id=self.calendar.id).state, DeletionJob.States.QUEUED)
         
         # Check response redirects to profile
         self.assertEqual(response.status_code, 302)
@@ -578,7 +991,7 @@ class DeleteCalendarViewTests(TestCase):
         # Check success message
         messages = list(messages)
         self.assertEqual(len(messages), 1)
-        self.assertEqual(str(messages[0]), "Calendar deleted successfully.")
+        self.assertEqual(str(messages[0]), "Calendar is being deleted.")
 
     def test_delete_calendar_not_found(self):
         """Test deleting non-existent calendar"""
@@ -6,9 +6,17 @@ from . import views
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("feed/", views.calendar_feed, name="calendar_feed"),
     path("get-calendar/", views.prep_events, name="prep_events"),
+    path("feed-cache-stats/", views.feed_cache_stats, name="feed_cache_stats"),
+    path("rule-cache-stats/", views.rule_cache_stats, name="rule_cache_stats"),
     path("upload-calendar/", views.upload_calendar, name="upload_calendar"),
+    path("import-jobs/<int:job_id>/", views.import_job_status, name="import_job_status"),
     path("delete-calendar/<int:calendar_id>/", views.delete_calendar, name="delete_calendar"),
+    path("deletion-jobs/<int:job_id>/", views.deletion_job_status, name="deletion_job_status"),
+    path("shift-calendar/<int:calendar_id>/", views.shift_calendar, name="shift_calendar"),
     path('update-event/', views.update_event, name='update_event'),
-    path('search-results/', views.search_results, name='search_results')
+    path('update-events/', views.batch_update_events, name='batch_update_events'),
+    path('search-results/', views.search_results, name='search_results'),
+    path('typeahead/', views.typeahead, name='typeahead'),
 ] 
\ No newline at end of file
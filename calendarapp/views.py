@@ -1,29 +1,42 @@
-import json
+from itertools import chain
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.http import condition
 from django.contrib import messages
-from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from django.core.exceptions import ValidationError
 from django.utils.timezone import datetime
-from django.db.models import Q
+from django.db.models import Q, Sum
 
 from .forms import CalendarUploadForm
-from .models import Calendar, Event
+from .models import Calendar, DeletionJob, Event, EventOccurrence, ImportJob
 
 from study_sessions.models import StudySession, RecurringStudySession
-
-from util.parse_ics import parse_ics
+from study_sessions.views import session_feed_items
 
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 
-from dateutil.rrule import rrulestr
 from datetime import timedelta
 
+from util.batch_update import MAX_BATCH_CHANGES, apply_changes
+from util.busy_intervals import event_feed_queryset, occurs_in_window, session_feed_queryset
+from util.deletion_jobs import request_calendar_deletion
+from util.feed_window import parse_window
+from util.feed_cache import cache_stats, cached_feed_response, feed_etag, feed_last_modified
+from util.json_stream import ITERATOR_CHUNK_SIZE
+from util.occurrences import OCCURRENCE_HISTORY, materialized_for
+from util import recurrence, time_shift
+from util.recurrence import expand_rule
+from util.search import matching_ids, merged_page, parse_search_date
+from util.typeahead import MAX_TYPEAHEAD_LIMIT, TYPEAHEAD_LIMIT, suggestions
+
 # Create your views here.
 def index(request):
     return render(request, "calendarapp/calendar.html")
@@ -31,12 +44,22 @@ def index(request):
 @login_required
 def upload_calendar(request):
     """
-    This view is called when you upload a calendar through the upload form. It will store the calendar ICS file.
-    It then processes this file to its events, and stores them in the database using the Event model.
+    This view is called when you upload a calendar through the upload form. It will store the calendar ICS file
+    and queue an ImportJob for it. The run_import_jobs worker then processes this file to its events, and stores
+    them in the database using the Event model. The upload page polls the job's progress.
     """ 
-    form = CalendarUploadForm(request.POST, request.FILES)
+    job = None
+    if request.GET.get("job", "").isdigit():
+        job = ImportJob.objects.filter(id=request.GET["job"], user=request.user).first()
+
+    if request.method != "POST":
+        form = CalendarUploadForm(user=request.user)
+        return render(request, "calendarapp/upload_calendar.html", {"form": form, "job": job})
+
+    form = CalendarUploadForm(request.POST, request.FILES, user=request.user)
     if form.is_valid():
         name = form.cleaned_data["name"]
+        calendar = form.cleaned_data["calendar"]
         ics_file = request.FILES["ics_file"]
 
         # Check file extension and return form with errors if invalid
@@ -44,37 +67,137 @@ def upload_calendar(request):
             form.add_error("ics_file", "File must have .ics extension")
             return render(request, "calendarapp/upload_calendar.html", {"form": form})
 
-        # Create calendar entry
-        calendar = Calendar.objects.create(user=request.user, name=name)
-        parse_ics(ics_file, calendar)
-        return redirect("/")
+        # Create calendar entry, unless an existing calendar is being updated, and queue its events to be imported
+        reimport = calendar is not None
+        if not reimport:
+            calendar = Calendar.objects.create(user=request.user, name=name)
+        job = ImportJob.objects.create(
+            user=request.user,
+            calendar=calendar,
+            ics_file=ics_file,
+            bytes_total=ics_file.size,
+            reimport=reimport,
+        )
+        return redirect(f"{reverse('upload_calendar')}?job={job.id}")
     
     return render(request, "calendarapp/upload_calendar.html", {"form": form})
 
+@login_required
+def import_job_status(request, job_id):
+    """
+    Returns the progress of one of the user's calendar imports as JSON, for the upload page to poll.
+    """
+    job = get_object_or_404(ImportJob, id=job_id, user=request.user)
+    return JsonResponse({
+        "id": job.id,
+        "calendar": job.calendar.name,
+        "state": job.state,
+        "progress": job.progress(),
+        "events_parsed": job.events_parsed,
+        "events_created": job.events_created,
+        "events_updated": job.events_updated,
+        "events_deleted": job.events_deleted,
+        "events_skipped": job.events_skipped,
+        "errors": job.errors,
+        "message": job.message,
+    })
+
+# Event values the calendar feed is built from
+EVENT_FEED_FIELDS = ("id", "title", "type", "start", "end", "duration", "description", "rrule")
+
+
+def event_feed_item(row):
+    """
+    Converts an event's EVENT_FEED_FIELDS values to the dict the calendar feed returns for it.
+    """
+    event_data = {
+        "id": row["id"],
+        "title": row["title"],
+        "type": row["type"],
+        "start": row["start"].isoformat(),
+        "end": row["end"].isoformat() if row["end"] else None,
+        "description": row["description"],
+        "model": "Event",
+    }
+    if row["rrule"]:
+        event_data["rrule"] = row["rrule"]
+    if row["end"]:
+        event_data["duration"] = str(row["duration"]) if row["duration"] else None
+    return event_data
+
+
+def event_feed_items(user, window):
+    """
+    Returns the feed items of the user's events, streamed from the database. With a window, only the events that
+    overlap it are returned, and recurring events only if one of their occurrences falls in it.
+    """
+    # Rows are streamed out as they are read, so large feeds are never held in memory
+    rows = event_feed_queryset(user, window).values(*EVENT_FEED_FIELDS, "occurrences_until")
+    rows = rows.iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    if window:
+        # Events materialized past the window were already matched against their occurrences
+        covered = materialized_for(window[0])
+        rows = (
+            row for row in rows
+            if not row["rrule"] or (covered and row["occurrences_until"] and row["occurrences_until"] >= window[1])
+            or occurs_in_window(row, *window)
+        )
+    return map(event_feed_item, rows)
+
+
+@staff_member_required
+def feed_cache_stats(request):
+    """
+    Returns the hit and miss counts of the calendar feed cache, for staff to check it is working.
+    """
+    return JsonResponse(cache_stats())
+
+@staff_member_required
+def rule_cache_stats(request):
+    """
+    Returns the hit rates of the recurrence rule caches of the process that serves the request.
+    """
+    return JsonResponse(recurrence.rule_cache_stats())
+
+@login_required
+@condition(etag_func=feed_etag, last_modified_func=feed_last_modified)
+def calendar_feed(request):
+    """
+    Returns the user's events and study sessions together in one feed, in the same format as get-calendar/ and
+    study_sessions/sessions/, so the calendar page needs one request per window instead of two. It is cached and
+    answers conditional requests like those feeds.
+    """
+    try:
+        window = parse_window(request.GET)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    def items():
+        return chain(event_feed_items(request.user, window), session_feed_items(request.user, window))
+
+    return cached_feed_response("calendar", request, window, items)
+
+@condition(etag_func=feed_etag, last_modified_func=feed_last_modified)
+def event_feed(request):
+    """
+    Handles GET requests to prep_events. When FullCalendar sends the start and end of the visible window, only the
+    events that overlap it are returned. The feed is cached per user and window until one of the user's events
+    changes, and a request whose If-None-Match matches the user's feed version gets a 304 without any of this running.
+    """
+    user = request.user
+    try:
+        window = parse_window(request.GET)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    return cached_feed_response("events", request, window, lambda: event_feed_items(user, window))
+
 @login_required
 @api_view(['GET', 'POST'])  # Add POST to allowed methods
 def prep_events(request):
     if request.method == 'GET':
-        """Handle GET requests (existing code)"""
-        user = request.user
-        events = Event.objects.filter(calendar__user=user)
-        event_list = []
-        for e in events:
-            event_data = {
-                "id": e.id,
-                "title": e.title,
-                "type": e.type,
-                "start": e.start.isoformat(),
-                "end": e.end.isoformat() if e.end else None,
-                "description": e.description,
-                "model": "Event",
-            }
-            if e.rrule:
-                event_data["rrule"] = e.rrule
-            if e.end:
-                event_data["duration"] = str(e.duration) if e.duration else None
-            event_list.append(event_data)
-        return JsonResponse(event_list, safe=False, encoder=DjangoJSONEncoder)
+        # Only reads of the feed answer conditional requests, so creating an event is never held to them
+        return event_feed(request)
     
     elif request.method == 'POST':
         """Handle POST requests to create new events"""
@@ -91,7 +214,7 @@ def prep_events(request):
             # Get calendar and verify ownership
             calendar_id = request.data['calendar']
             try:
-                calendar = Calendar.objects.get(id=calendar_id, user=request.user)
+                calendar = Calendar.objects.get(id=calendar_id, user=request.user, pending_delete=False)
             except Calendar.DoesNotExist:
                 return JsonResponse(
                     {'status': 'error', 'message': 'Calendar not found or access denied'},
@@ -240,92 +363,220 @@ def update_event(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+@api_view(['POST'])
+@login_required
+def batch_update_events(request):
+    """
+    Moves or resizes several events and study sessions at once, as for a multi-select drag. Takes
+    {"changes": [{"model", "id", "start", "end"}, ...]} and returns a result for each change.
+    """
+    changes = request.data.get('changes') if isinstance(request.data, dict) else None
+    if not isinstance(changes, list) or not changes:
+        return Response(
+            {'status': 'error', 'message': 'Missing required fields'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(changes) > MAX_BATCH_CHANGES:
+        return Response(
+            {'status': 'error', 'message': f'At most {MAX_BATCH_CHANGES} changes can be made at once'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    results = apply_changes(request.user, changes)
+    failed = sum(1 for result in results if result['status'] == 'error')
+    return Response({
+        'status': 'success' if not failed else 'partial' if failed < len(results) else 'error',
+        'updated': len(results) - failed,
+        'failed': failed,
+        'results': results,
+    })
+
+@api_view(['POST'])
+@login_required
+def shift_calendar(request, calendar_id):
+    """
+    Moves every event in one of the user's calendars by the given days, hours and minutes.
+    """
+    calendar = get_object_or_404(Calendar, id=calendar_id, user=request.user, pending_delete=False)
+    try:
+        delta = time_shift.parse_shift(request.data)
+    except ValueError as e:
+        return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    moved = time_shift.shift_calendar(calendar, delta)
+    return Response({'status': 'success', 'moved': moved, 'shift_seconds': delta.total_seconds()})
+
 @login_required
 @api_view(['POST'])
 def delete_calendar(request, calendar_id):
     """
-    When a user deletes a calendar from their profile, this view is caleld to handle the deletion of the calendar file and its events.
+    When a user deletes a calendar from their profile, this view hides it and queues it to be deleted by the
+    run_deletion_jobs worker.
     """
-    calendar = get_object_or_404(Calendar, id=calendar_id, user=request.user)
+    calendar = get_object_or_404(Calendar, id=calendar_id, user=request.user, pending_delete=False)
 
-    calendar.delete()
-    messages.success(request, "Calendar deleted successfully.")
+    request_calendar_deletion(calendar)
+    messages.success(request, "Calendar is being deleted.")
 
     return redirect("profile")
 
+
+@login_required
+def deletion_job_status(request, job_id):
+    """
+    Returns the progress of one of the user's calendar deletions as JSON.
+    """
+    job = get_object_or_404(DeletionJob, id=job_id, user_id=request.user.id)
+    return JsonResponse({
+        "id": job.id,
+        "kind": job.kind,
+        "name": job.name,
+        "state": job.state,
+        "progress": job.progress(),
+        "rows_total": job.rows_total,
+        "rows_deleted": job.rows_deleted,
+        "message": job.message,
+    })
+
+# Number of events, and of study sessions, shown on each page of search results
+SEARCH_PAGE_SIZE = 20
+
+
+def page_number(value):
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 1
+
+
+def occurrence_result(occurrence):
+    return {
+        'id': occurrence.event.id,
+        'title': occurrence.event.title,
+        'start': occurrence.occurrence_start,
+        'end': occurrence.occurrence_end,
+        'description': occurrence.event.description
+    }
+
+
+def recurring_session_results(recurring_session):
+    """
+    Yields the occurrences of a recurring study session as search results, newest first.
+    """
+    session = recurring_session.session_id
+    length = datetime.combine(session.date, session.end_time) - datetime.combine(session.date, session.start_time)
+    occurrences = expand_rule(
+        f"FREQ=WEEKLY;COUNT={recurring_session.recurrence_amount}",
+        datetime.combine(session.date, session.start_time)
+    )
+    for occurrence in reversed(occurrences):
+        yield {
+            'id': session.id,
+            'title': session.title,
+            'start_time': occurrence,
+            'end_time': occurrence + length,
+            'description': session.description,
+            'host': session.host
+        }
+
+
+def session_result_start(result):
+    if isinstance(result, dict):
+        return result['start_time']
+    return datetime.combine(result.date, result.start_time)
+
+
 @login_required
 def search_results(request):
     query = request.GET.get('q')
-    recurring_events = []
-    single_events = []
+    event_page = page_number(request.GET.get('page'))
+    session_page = page_number(request.GET.get('session_page'))
+    event_results = []
     session_results = []
-    recurring_sessions = []
+    event_results_count = 0
+    session_results_count = 0
+    event_has_next = False
+    session_has_next = False
 
     if query:
-        # Search for recurring events
-        now_time = datetime.now() - timedelta(days=365)
-        oneYear = datetime.now() + timedelta(days=365)
-
-        for event in Event.objects.exclude(rrule=None):
-            rule = rrulestr(event.rrule, dtstart=event.start)
-            occurrences = list(rule.between(now_time, oneYear, inc=True))
-
-            for occurrence in occurrences:
-                if query.lower() in event.title.lower() or query.lower() in event.description.lower() or query.lower() in str(occurrence).lower():
-                    recurring_events.append({
-                        'id': event.id,
-                        'title': event.title,
-                        'start': occurrence,
-                        'end': occurrence + (event.end - event.start),
-                        'description': event.description
-                    })
-
-        # Search for single events
-        single_events = Event.objects.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(start__icontains=query),
-            rrule=None
-        ).values('id', 'title', 'start', 'end', 'description')
-
-        recurring_events = sorted(recurring_events, key=lambda x: x['start'], reverse=True)
-        single_events = sorted(single_events, key=lambda x: x['start'], reverse=True)
-
-        # Rest of your code for sessions...
-        recurring_sessions = [] 
-
-        for recurring_session in RecurringStudySession.objects.select_related('session_id'):
-            session = recurring_session.session_id
-            if query.lower() in session.title.lower():
-                rule = rrulestr(
-                    f"FREQ=WEEKLY;COUNT={recurring_session.recurrence_amount}",
-                    dtstart=datetime.combine(session.date, session.start_time)
-                )
-                occurrences = list(rule)
-
-                for occurrence in occurrences:
-                        recurring_sessions.append({
-                            'id': session.id,
-                            'title': session.title,
-                            'start_time': occurrence,
-                            'end_time': occurrence + (datetime.combine(session.date, session.end_time) - datetime.combine(session.date, session.start_time)),
-                            'description': session.description,
-                            'host': session.host  
-                        })
-
-        recurring_sessions = sorted(recurring_sessions, key=lambda x: x['start_time'], reverse=True)
+        # Match the text first, over the user's own events, so nothing is expanded that doesn't match
+        version = feed_etag(request)
+        events = Event.objects.filter(calendar__user=request.user, calendar__pending_delete=False)
+        event_ids = matching_ids(events, query, ('events', request.user.id), version)
+        matches = Q(event_id__in=event_ids)
+        single_matches = Q(id__in=event_ids)
+
+        # A date matches the events on that day
+        day = parse_search_date(query)
+        if day:
+            day_start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+            day_end = day_start + timedelta(days=1)
+            matches |= Q(occurrence_start__gte=day_start, occurrence_start__lt=day_end)
+            single_matches |= Q(start__gte=day_start, start__lt=day_end)
+
+        # Materialized occurrences of recurring events within a year either side of now
+        now_time = timezone.now() - OCCURRENCE_HISTORY
+        oneYear = timezone.now() + timedelta(days=365)
+        occurrences = EventOccurrence.objects.filter(
+            matches,
+            event__calendar__user=request.user,
+            event__calendar__pending_delete=False,
+            occurrence_start__gte=now_time,
+            occurrence_start__lte=oneYear,
+        )
+        single_events = events.filter(single_matches, rrule=None)
+        event_results_count = occurrences.count() + single_events.count()
+
+        # Each source is read newest first, and only as far as the requested page
+        limit = event_page * SEARCH_PAGE_SIZE + 1
+        occurrence_rows = occurrences.select_related('event').order_by('-occurrence_start')[:limit]
+        single_rows = single_events.order_by('-start').values('id', 'title', 'start', 'end', 'description')[:limit]
+        event_results, event_has_next = merged_page(
+            [map(occurrence_result, occurrence_rows), single_rows],
+            key=lambda x: x['start'], page=event_page, page_size=SEARCH_PAGE_SIZE,
+        )
 
-        session_results = StudySession.objects.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query)
-        ).distinct().order_by('start_time')
+        # Sessions the user hosts or has joined
+        session_ids = matching_ids(session_feed_queryset(request.user), query, ('sessions', request.user.id), version)
+        recurring = RecurringStudySession.objects.filter(session_id__in=session_ids)
+        sessions = StudySession.objects.filter(id__in=session_ids)
+        session_results_count = (recurring.aggregate(total=Sum('recurrence_amount'))['total'] or 0) + sessions.count()
+
+        limit = session_page * SEARCH_PAGE_SIZE + 1
+        session_rows = sessions.select_related('host').order_by('-date', '-start_time')[:limit]
+        session_results, session_has_next = merged_page(
+            [
+                *(recurring_session_results(r) for r in recurring.select_related('session_id', 'session_id__host')),
+                session_rows,
+            ],
+            key=session_result_start, page=session_page, page_size=SEARCH_PAGE_SIZE,
+        )
 
     combined_results = {
         'query': query,
-        'event_results': list(recurring_events) + list(single_events),
-        'session_results': list(recurring_sessions) + list(session_results),
-        'event_results_count': len(recurring_events) + len(single_events),
-        'session_results_count': len(recurring_sessions) + len(session_results)
+        'event_results': event_results,
+        'session_results': session_results,
+        'event_results_count': event_results_count,
+        'session_results_count': session_results_count,
+        'event_page': event_page,
+        'event_has_next': event_has_next,
+        'session_page': session_page,
+        'session_has_next': session_has_next,
     }
 
-    return render(request, 'search_results.html', combined_results)
\ No newline at end of file
+    return render(request, 'search_results.html', combined_results)
+
+
+@login_required
+def typeahead(request):
+    """
+    Suggests module names and event and session titles for the search box as the user types.
+    """
+    try:
+        limit = min(max(1, int(request.GET.get('limit', TYPEAHEAD_LIMIT))), MAX_TYPEAHEAD_LIMIT)
+    except ValueError:
+        limit = TYPEAHEAD_LIMIT
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'results': []})
+    return JsonResponse({'results': suggestions(request.user, query, feed_etag(request), limit)})
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:14
+
+from django.db import migrations
+
+
+def install_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute("CREATE INDEX modules_module_name_trgm_idx ON modules_module USING gin (name gin_trgm_ops)")
+
+
+def remove_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS modules_module_name_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modules', '0003_alter_grade_mark_alter_grade_weight'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_index, remove_index),
+    ]
@@ -4,7 +4,7 @@ from users.models import CustomUser
 
 class AutoStudySessionForm(forms.ModelForm):
     participants = forms.ModelMultipleChoiceField(
-        queryset=CustomUser.objects.all(),
+        queryset=CustomUser.objects.none(),
         widget=forms.CheckboxSelectMultiple,
         required=False,
         label="Participants"
@@ -15,6 +15,12 @@ class AutoStudySessionForm(forms.ModelForm):
         fields = ['participants','title', 'description', 'is_recurring', 'calendar_id']
         exclude = ['host', 'start_time', 'end_time', 'date']
 
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Participants' calendars are read to place the session, so only the host's friends can be picked
+        if user is not None:
+            self.fields['participants'].queryset = user.friends.filter(is_active=True)
+
 
 class ManualStudySessionForm(forms.ModelForm):
     participants = forms.ModelMultipleChoiceField(
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0009_query_indexes'),
+        ('study_sessions', '0002_alter_recurringstudysession_recurrence_amount_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['host', 'date'], name='session_host_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studysessionparticipant',
+            index=models.Index(fields=['participant', 'study_session'], name='participant_session_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:08
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Frozen copy of the trigger SQL as it stood when this migration was written
+INSTALL_TRIGGER = [
+    """
+    CREATE FUNCTION study_sessions_studysession_search_vector() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND NEW.title IS NOT DISTINCT FROM OLD.title
+                AND NEW.description IS NOT DISTINCT FROM OLD.description THEN
+            -- Django writes every column on save(), so keep the vector it doesn't know about
+            NEW.search_vector := OLD.search_vector;
+        ELSE
+            NEW.search_vector :=
+                setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER study_sessions_studysession_search_vector_update BEFORE INSERT OR UPDATE ON study_sessions_studysession
+    FOR EACH ROW EXECUTE FUNCTION study_sessions_studysession_search_vector()
+    """,
+    """
+    UPDATE study_sessions_studysession SET search_vector =
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    """,
+    "CREATE INDEX study_sessions_studysession_search_idx ON study_sessions_studysession USING gin (search_vector)",
+]
+
+REMOVE_TRIGGER = [
+    "DROP INDEX IF EXISTS study_sessions_studysession_search_idx",
+    "DROP TRIGGER IF EXISTS study_sessions_studysession_search_vector_update ON study_sessions_studysession",
+    "DROP FUNCTION IF EXISTS study_sessions_studysession_search_vector()",
+]
+
+
+def install_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for sql in INSTALL_TRIGGER:
+        schema_editor.execute(sql)
+
+
+def remove_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for sql in REMOVE_TRIGGER:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study_sessions', '0003_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studysession',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(install_trigger, remove_trigger),
+    ]
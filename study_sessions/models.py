@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.utils import timezone
@@ -15,6 +16,14 @@ class StudySession(models.Model):
     is_recurring = models.BooleanField(default=False)
     calendar_id = models.ForeignKey(Calendar, on_delete=models.CASCADE, related_name="study_sessions")
 
+    # Filled from the title and description by a trigger on PostgreSQL, and unused elsewhere (see util.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["host", "date"], name="session_host_date_idx"),
+        ]
+
     def __str__(self):
         return f"{self.host.username} - {self.title}"  # Fixed: changed self.user to self.host
 
@@ -68,6 +77,9 @@ class StudySessionParticipant(models.Model):
                 name='unique_participation'
             )
         ]
+        indexes = [
+            models.Index(fields=['participant', 'study_session'], name='participant_session_idx'),
+        ]
 
     def __str__(self):
         return f"{self.participant.username} - {self.study_session.title}"
@@ -1,12 +1,35 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from .models import StudySession
-from notifications.models import Notification
-
-@receiver(post_save, sender=StudySession)
-def notify_user_on_study_session_create(sender, instance, created, **kwargs):
-    if created:
-        Notification.objects.create(
-            user=instance.host,  # Assuming created_by is the user who created the session
-            message=f"Your study session, {instance.title}, was created successfully!"
-        )
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import StudySession, RecurringStudySession, StudySessionParticipant
+from notifications.models import Notification
+from util.feed_cache import invalidate_feeds
+
+@receiver(post_save, sender=StudySession)
+def notify_user_on_study_session_create(sender, instance, created, **kwargs):
+    if created:
+        Notification.objects.create(
+            user=instance.host,  # Assuming created_by is the user who created the session
+            message=f"Your study session, {instance.title}, was created successfully!"
+        )
+
+
+def session_user_ids(session_id):
+    """Returns the ids of the host and participants of a session, whose feeds show it"""
+    session = StudySession.objects.filter(id=session_id).values_list('host_id', flat=True).first()
+    participants = StudySessionParticipant.objects.filter(study_session_id=session_id)
+    return [session, *participants.values_list('participant_id', flat=True)]
+
+@receiver(post_save, sender=StudySession)
+@receiver(post_delete, sender=StudySession)
+def invalidate_session_feeds(sender, instance, **kwargs):
+    invalidate_feeds([instance.host_id, *session_user_ids(instance.id)])
+
+@receiver(post_save, sender=RecurringStudySession)
+@receiver(post_delete, sender=RecurringStudySession)
+def invalidate_recurring_session_feeds(sender, instance, **kwargs):
+    invalidate_feeds(session_user_ids(instance.session_id_id))
+
+@receiver(post_save, sender=StudySessionParticipant)
+@receiver(post_delete, sender=StudySessionParticipant)
+def invalidate_participant_feeds(sender, instance, **kwargs):
+    invalidate_feeds([instance.participant_id, *session_user_ids(instance.study_session_id)])
@@ -0,0 +1,151 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from django.utils.timezone import make_aware
+
+from datetime import datetime, timedelta
+
+from calendarapp.models import Calendar, Event
+from study_sessions.models import StudySession, RecurringStudySession, StudySessionParticipant
+from util.busy_intervals import EVENT, SESSION, BusyInterval, busy_intervals, group_busy_intervals
+
+CustomUser = get_user_model()
+
+
+def at(day, hour, minute=0):
+    return make_aware(datetime(2025, 3, day, hour, minute))
+
+
+class BusyIntervalsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.friend = CustomUser.objects.create_user(username='friend', password='testpass123')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        # The window is the week of Monday 24 March 2025, which the clocks change at the end of
+        self.window = (at(24, 0), at(31, 0))
+
+    def test_single_events(self):
+        """Events overlapping the window are returned, those outside it or without an end are not"""
+        lecture = Event.objects.create(calendar=self.calendar, title='Lecture', start=at(25, 9), end=at(25, 11))
+        Event.objects.create(calendar=self.calendar, title='Earlier', start=at(20, 9), end=at(20, 10))
+        Event.objects.create(calendar=self.calendar, title='Reminder', start=at(26, 9))
+        overnight = Event.objects.create(calendar=self.calendar, title='Shift', start=at(23, 22), end=at(24, 6))
+
+        self.assertEqual(busy_intervals(self.user, *self.window), [
+            BusyInterval(at(23, 22), at(24, 6), EVENT, overnight.id, 'Shift'),
+            BusyInterval(at(25, 9), at(25, 11), EVENT, lecture.id, 'Lecture'),
+        ])
+
+    def test_recurring_events_are_expanded(self):
+        """Every occurrence in the window is returned, at the same local time after the clocks change"""
+        lab = Event.objects.create(
+            calendar=self.calendar, title='Lab', start=at(3, 14), end=at(3, 16), rrule='FREQ=DAILY;INTERVAL=2'
+        )
+        intervals = busy_intervals(self.user, *self.window)
+
+        self.assertEqual([i.start for i in intervals], [at(day, 14) for day in (25, 27, 29)])
+        self.assertTrue(all(i.end - i.start == timedelta(hours=2) for i in intervals))
+        self.assertEqual({(i.kind, i.id) for i in intervals}, {(EVENT, lab.id)})
+        self.assertEqual([i.start for i in busy_intervals(self.user, at(31, 0), at(31, 23))], [at(31, 14)])
+
+    def test_sessions(self):
+        """Recurring sessions repeat weekly, and participants are busy for them too"""
+        session = StudySession.objects.create(
+            title='Revision', date='2025-03-10', start_time='14:00', end_time='16:00',
+            is_recurring=True, host=self.user, calendar_id=self.calendar
+        )
+        RecurringStudySession.objects.create(session_id=session, recurrence_amount=3)
+        StudySessionParticipant.objects.create(study_session=session, participant=self.friend)
+        expected = [BusyInterval(at(24, 14), at(24, 16), SESSION, session.id, 'Revision')]
+
+        self.assertEqual(busy_intervals(self.user, *self.window), expected)
+        self.assertEqual(busy_intervals(self.friend, *self.window), expected)
+        self.assertEqual(busy_intervals(self.user, at(31, 0), at(31, 23)), [])
+
+    def test_pending_calendars_are_left_out(self):
+        Event.objects.create(calendar=self.calendar, title='Lecture', start=at(25, 9), end=at(25, 11))
+        Calendar.objects.filter(id=self.calendar.id).update(pending_delete=True)
+        self.assertEqual(busy_intervals(self.user, *self.window), [])
+
+    def test_one_query_per_kind(self):
+        """Events and sessions are each read with one query, however many there are"""
+        Event.objects.bulk_create([
+            Event(calendar=self.calendar, title=f'Lecture {i}', start=at(25, 9), end=at(25, 10)) for i in range(20)
+        ])
+        Event.objects.create(calendar=self.calendar, title='Lab', start=at(3, 14), end=at(3, 16), rrule='FREQ=DAILY')
+        StudySession.objects.create(
+            title='Revision', date='2025-03-26', start_time='14:00', end_time='16:00',
+            host=self.user, calendar_id=self.calendar
+        )
+        with CaptureQueriesContext(connection) as queries:
+            intervals = busy_intervals(self.user, *self.window)
+
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(len(intervals), 28)
+        self.assertEqual(intervals, sorted(intervals))
+
+
+class GroupBusyIntervalsTests(TestCase):
+    def setUp(self):
+        self.window = (at(24, 0), at(31, 0))
+        self.users = [CustomUser.objects.create_user(username=f'user{i}', password='testpass123') for i in range(30)]
+        for i, user in enumerate(self.users):
+            calendar = Calendar.objects.create(user=user, name='Timetable')
+            Event.objects.bulk_create([
+                Event(calendar=calendar, title=f'Lecture {day}', start=at(day, 9 + i % 8), end=at(day, 10 + i % 8))
+                for day in range(20, 30)
+            ])
+            Event.objects.create(
+                calendar=calendar, title='Lab', start=at(3, 14), end=at(3, 16), rrule='FREQ=WEEKLY;BYDAY=MO,TH'
+            )
+            session = StudySession.objects.create(
+                title=f'Revision {i}', date='2025-03-17', start_time='11:00', end_time='12:00',
+                is_recurring=True, host=user, calendar_id=calendar
+            )
+            RecurringStudySession.objects.create(session_id=session, recurrence_amount=2)
+            StudySessionParticipant.objects.create(study_session=session, participant=self.users[i - 1])
+
+    def test_matches_each_user_on_their_own(self):
+        """The group is read with one query for events and one for sessions, and everyone gets their own"""
+        with CaptureQueriesContext(connection) as queries:
+            busy = group_busy_intervals(self.users, *self.window)
+        self.assertEqual(len(queries), 2)
+
+        self.assertEqual(list(busy), [user.id for user in self.users])
+        for user in self.users:
+            self.assertEqual(busy[user.id], busy_intervals(user, *self.window))
+        # Six lectures, two labs and two sessions, their own and the one they were invited to
+        self.assertEqual(len(busy[self.users[0].id]), 10)
+
+    def test_pending_calendars_and_shared_sessions(self):
+        """A session shared by two of the group counts for both, and calendars being deleted for neither"""
+        busy = group_busy_intervals(self.users[:2], *self.window)
+        session = StudySession.objects.get(title='Revision 1')
+        shared = BusyInterval(at(24, 11), at(24, 12), SESSION, session.id, 'Revision 1')
+        self.assertIn(shared, busy[self.users[0].id])
+        self.assertIn(shared, busy[self.users[1].id])
+
+        Calendar.objects.filter(user=self.users[1]).update(pending_delete=True)
+        busy = group_busy_intervals(self.users[:2], *self.window)
+        # Only the session they were invited to from someone else's calendar is left
+        self.assertEqual([interval.title for interval in busy[self.users[1].id]], ['Revision 2'])
+        self.assertNotIn(shared, busy[self.users[0].id])
+
+
+class AutomatedCreateTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_places_session_without_fetching_feeds(self):
+        """The scheduler reads the user's calendar in process, so it works with no server to call back to"""
+        response = self.client.post(reverse('study_sessions:create', args=[1]), {
+            'title': 'Revision', 'description': '', 'calendar_id': self.calendar.id,
+        })
+        self.assertEqual(response.status_code, 302)
+        session = StudySession.objects.get()
+        self.assertEqual(session.host, self.user)
+        self.assertIsNotNone(session.start_time)
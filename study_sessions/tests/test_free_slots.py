@@ -0,0 +1,200 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils.timezone import localtime, make_aware
+
+from datetime import datetime, time, timedelta
+from unittest.mock import patch
+
+from calendarapp.models import Calendar, Event
+from study_sessions.models import StudySession, StudySessionParticipant
+from util.free_slots import FreeSlot, find_group_slots, find_slots, merge_intervals, round_up, sweep
+
+CustomUser = get_user_model()
+
+
+def at(day, hour, minute=0):
+    """A time in the week of Monday 24 March 2025, on the Sunday of which the clocks change"""
+    return make_aware(datetime(2025, 3, day, hour, minute))
+
+
+class MergeIntervalsTests(TestCase):
+    def test_overlapping_and_touching_intervals_join(self):
+        intervals = [(at(24, 13), at(24, 14)), (at(24, 9), at(24, 11)), (at(24, 10), at(24, 12)), (at(24, 12), at(24, 13))]
+        self.assertEqual(merge_intervals(intervals), [(at(24, 9), at(24, 14))])
+
+    def test_padding_joins_close_intervals(self):
+        intervals = [(at(24, 9), at(24, 10)), (at(24, 11), at(24, 12)), (at(24, 15), at(24, 16))]
+        self.assertEqual(merge_intervals(intervals, timedelta(minutes=30)), [
+            (at(24, 8, 30), at(24, 12, 30)), (at(24, 14, 30), at(24, 16, 30)),
+        ])
+
+    def test_sweep_joins_everyone(self):
+        first = [(at(24, 9), at(24, 10)), (at(24, 14), at(24, 15))]
+        second = [(at(24, 9, 30), at(24, 11)), (at(24, 16), at(24, 17))]
+        self.assertEqual(sweep([first, second]), [
+            (at(24, 9), at(24, 11)), (at(24, 14), at(24, 15)), (at(24, 16), at(24, 17)),
+        ])
+
+
+class FindSlotsTests(TestCase):
+    def setUp(self):
+        self.window = (at(24, 0), at(29, 0))
+
+    def test_slots_keep_a_break_from_busy_time(self):
+        """A slot starts a break after the busy time before it, and ends a break before the next"""
+        busy = [(at(24, 9), at(24, 11)), (at(24, 16), at(24, 18))]
+        slots = find_slots(busy, at(24, 0), at(25, 0))
+        self.assertEqual(slots, [FreeSlot(at(24, 12), at(24, 14), timedelta(hours=4))])
+
+        # Three hours between them leave no room for two hours with an hour's break either side
+        busy = [(at(24, 9), at(24, 11)), (at(24, 14), at(24, 18))]
+        self.assertEqual(find_slots(busy, at(24, 0), at(25, 0)), [])
+        self.assertEqual(find_slots(busy, at(24, 0), at(25, 0), duration=timedelta(hours=1))[0].start, at(24, 12))
+
+    def test_lightest_busy_day_first_and_free_days_last(self):
+        busy = [
+            (at(24, 9), at(24, 13)),
+            (at(25, 9), at(25, 10)),
+            (at(26, 9), at(26, 11)),
+        ]
+        slots = find_slots(busy, *self.window, limit=10)
+        self.assertEqual([slot.start for slot in slots], [at(25, 11), at(26, 12), at(24, 14), at(27, 9), at(28, 9)])
+        self.assertEqual(slots[0].day_busy, timedelta(hours=1))
+
+    def test_working_hours_days_and_window(self):
+        """Slots stay in working hours on working days, and in the window"""
+        slots = find_slots([], at(29, 0), at(31, 23), limit=10)
+        self.assertEqual([slot.start for slot in slots], [at(29, 9), at(31, 9)])
+        self.assertEqual(localtime(slots[1].start).time(), time(9))
+
+        slots = find_slots([], at(24, 15, 30), at(24, 23), working_hours=(time(8), time(20)))
+        self.assertEqual(slots, [FreeSlot(at(24, 15, 30), at(24, 17, 30), timedelta(0))])
+
+    def test_busy_time_across_midnight(self):
+        """An interval running overnight takes up the start of the next day"""
+        busy = [(at(24, 20), at(25, 12))]
+        slots = find_slots(busy, at(25, 0), at(26, 0))
+        self.assertEqual(slots, [FreeSlot(at(25, 13), at(25, 15), timedelta(hours=3))])
+
+    def test_long_horizon(self):
+        """A year of dense busy time is handled in one pass"""
+        start = make_aware(datetime(2025, 1, 6))
+        busy = [
+            (start + timedelta(hours=hour), start + timedelta(hours=hour, minutes=50))
+            for hour in range(0, 24 * 365)
+            if hour % 24 not in (13, 14, 15, 16)
+        ]
+        slots = find_slots(busy, start, start + timedelta(days=365), duration=timedelta(hours=1),
+                           min_break=timedelta(minutes=5))
+        self.assertEqual(len(slots), 5)
+        self.assertTrue(all(localtime(slot.start).time() == time(12, 55) for slot in slots))
+
+    def test_round_up(self):
+        self.assertEqual(round_up(make_aware(datetime(2025, 3, 24, 10, 7, 31))), at(24, 10, 15))
+        self.assertEqual(round_up(at(24, 10, 45)), at(24, 10, 45))
+        self.assertEqual(round_up(make_aware(datetime(2025, 3, 24, 23, 50))), at(25, 0))
+
+
+class FindGroupSlotsTests(TestCase):
+    def test_only_when_everyone_is_free(self):
+        host = [(at(24, 9), at(24, 11))]
+        participant = [(at(24, 12), at(24, 13))]
+        slots = find_group_slots([host, participant], at(24, 0), at(25, 0), duration=timedelta(hours=1))
+        self.assertEqual([slot.start for slot in slots], [at(24, 14)])
+        self.assertEqual(slots[0].day_busy, timedelta(hours=3))
+
+    def test_ranked_by_the_whole_group(self):
+        """The day that is lightest for the group as a whole comes first, even if it isn't for the host"""
+        host = [(at(24, 9), at(24, 10)), (at(25, 9), at(25, 11))]
+        participants = [[(at(24, 9), at(24, 12))], [(at(24, 16), at(24, 18))], [(at(25, 16), at(25, 17))]]
+        slots = find_group_slots([host, *participants], at(24, 0), at(26, 0), limit=2)
+        self.assertEqual([(slot.start, slot.day_busy) for slot in slots], [
+            (at(25, 12), timedelta(hours=3)), (at(24, 13), timedelta(hours=6)),
+        ])
+
+    def test_single_person_matches_find_slots(self):
+        busy = [(at(24, 9), at(24, 11)), (at(25, 9), at(25, 10))]
+        self.assertEqual(find_group_slots([busy], at(24, 0), at(29, 0)), find_slots(busy, at(24, 0), at(29, 0)))
+
+
+class AutomatedPlacementTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpass123')
+        self.calendar = Calendar.objects.create(user=self.user, name='Timetable')
+        self.client.login(username='testuser', password='testpass123')
+        self.url = reverse('study_sessions:create', args=[1])
+        self.data = {'title': 'Revision', 'description': '', 'calendar_id': self.calendar.id}
+
+    def test_session_avoids_busy_time(self):
+        now = localtime()
+        for day in range(8):
+            day_start = make_aware(datetime.combine(now.date() + timedelta(days=day), time(9)))
+            Event.objects.create(
+                calendar=self.calendar, title=f'Lecture {day}', start=day_start, end=day_start + timedelta(hours=3)
+            )
+        response = self.client.post(self.url, self.data)
+        self.assertEqual(response.status_code, 302)
+
+        session = StudySession.objects.get()
+        start = make_aware(datetime.combine(session.date, session.start_time))
+        end = make_aware(datetime.combine(session.date, session.end_time))
+        self.assertEqual(end - start, timedelta(hours=2))
+        self.assertGreaterEqual(start, now)
+        self.assertGreaterEqual(session.start_time, time(13))
+
+    def test_starts_on_a_quarter_hour(self):
+        """With nothing on, the session starts at the next quarter hour rather than the current second"""
+        now = make_aware(datetime(2025, 3, 24, 10, 7, 31))
+        with patch('study_sessions.views.localtime', return_value=now):
+            response = self.client.post(self.url, self.data)
+        self.assertEqual(response.status_code, 302)
+
+        session = StudySession.objects.get()
+        self.assertEqual((session.date, session.start_time, session.end_time), (now.date(), time(10, 15), time(12, 15)))
+
+    def test_no_free_time(self):
+        """With the whole week taken, the form says so rather than double booking"""
+        now = localtime()
+        Event.objects.create(
+            calendar=self.calendar, title='Field trip', start=now - timedelta(days=1), end=now + timedelta(days=9)
+        )
+        response = self.client.post(self.url, self.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'There is no free time')
+        self.assertFalse(StudySession.objects.exists())
+
+    def test_participants_are_free_too(self):
+        """The session goes where the host and every participant are free"""
+        now = localtime()
+        friend = CustomUser.objects.create_user(username='friend', password='testpass123')
+        friend_calendar = Calendar.objects.create(user=friend, name='Timetable')
+        self.user.friends.add(friend)
+        for day in range(8):
+            day_start = make_aware(datetime.combine(now.date() + timedelta(days=day), time(9)))
+            Event.objects.create(
+                calendar=self.calendar, title=f'Lecture {day}', start=day_start, end=day_start + timedelta(hours=3)
+            )
+            Event.objects.create(
+                calendar=friend_calendar, title=f"Shift {day}", start=day_start + timedelta(hours=4),
+                end=day_start + timedelta(hours=6)
+            )
+        response = self.client.post(self.url, {**self.data, 'participants': [friend.id]})
+        self.assertEqual(response.status_code, 302)
+
+        session = StudySession.objects.get()
+        self.assertGreaterEqual(session.start_time, time(16))
+        self.assertTrue(StudySessionParticipant.objects.filter(study_session=session, participant=friend).exists())
+
+    def test_only_friends_can_take_part(self):
+        """Only the host's active friends can be picked, so nobody else's calendar is read"""
+        stranger = CustomUser.objects.create_user(username='stranger', password='testpass123')
+        leaving = CustomUser.objects.create_user(username='leaving', password='testpass123', is_active=False)
+        self.user.friends.add(leaving)
+        for user in (stranger, leaving):
+            with patch('study_sessions.views.group_busy_intervals') as group_busy_intervals:
+                response = self.client.post(self.url, {**self.data, 'participants': [user.id]})
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('participants', response.context['form'].errors)
+            group_busy_intervals.assert_not_called()
+        self.assertFalse(StudySession.objects.exists())
@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.utils.timezone import make_aware
+
+from datetime import date, datetime, timedelta
+
+from calendarapp.models import Calendar
+from calendarapp.tests.test_query_plans import QueryPlanTestCase
+from study_sessions.models import StudySession, StudySessionParticipant
+from study_sessions.views import session_feed_queryset
+
+CustomUser = get_user_model()
+
+
+class StudySessionQueryPlanTests(QueryPlanTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = [CustomUser.objects.create_user(username=f'user{u}', password='testpass123') for u in range(40)]
+        sessions = []
+        for u, user in enumerate(users):
+            calendar = Calendar.objects.create(user=user, name='Sessions')
+            for i in range(100):
+                sessions.append(StudySession(
+                    host=user,
+                    title=f'Revision {i}',
+                    date=date(2024, 9, 30) + timedelta(days=i),
+                    start_time='14:00',
+                    end_time='15:00',
+                    calendar_id=calendar,
+                ))
+        sessions = StudySession.objects.bulk_create(sessions)
+
+        # Everyone joins a few of the next user's sessions
+        StudySessionParticipant.objects.bulk_create(
+            StudySessionParticipant(study_session=sessions[(u + 1) % 40 * 100 + i], participant=user)
+            for u, user in enumerate(users) for i in range(0, 100, 10)
+        )
+        cls.user = users[0]
+        cls.analyze()
+
+    def test_feed_window(self):
+        """The windowed session feed finds hosted and joined sessions through indexes"""
+        window = (make_aware(datetime(2024, 11, 4)), make_aware(datetime(2024, 11, 11)))
+        self.assertNoSequentialScan(session_feed_queryset(self.user, window))
+
+    def test_feed_without_window(self):
+        """The full session feed finds hosted and joined sessions through indexes"""
+        self.assertNoSequentialScan(session_feed_queryset(self.user))
+
+    def test_hosted_sessions_by_date(self):
+        """A host's sessions on a range of days use the (host, date) index"""
+        self.assertNoSequentialScan(StudySession.objects.filter(
+            host=self.user, date__range=(date(2024, 11, 4), date(2024, 11, 10))
+        ))
@@ -1,6 +1,9 @@
 import json
 
 from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.cache import cache
 from django.urls import reverse
 from django.utils import timezone
 
@@ -287,7 +290,7 @@ class GetSessionsViewTests(TestCase):
         response = self.client.get(self.url)
         
         self.assertEqual(response.status_code, 200)
-        sessions = response.json()
+        sessions = json.loads(response.getvalue())
         self.assertEqual(len(sessions), 2)  # Both sessions
         
         # Verify session data
@@ -308,7 +311,7 @@ class GetSessionsViewTests(TestCase):
         response = self.client.get(self.url)
         
         self.assertEqual(response.status_code, 200)
-        sessions = response.json()
+        sessions = json.loads(response.getvalue())
         self.assertEqual(len(sessions), 2)  # Both sessions from earlier
         self.assertEqual(sessions[0]['title'], 'Math Study')
 
@@ -321,7 +324,7 @@ class GetSessionsViewTests(TestCase):
         """Test datetime fields are properly formatted"""
         self.client.force_login(self.user)
         response = self.client.get(self.url)
-        sessions = response.json()
+        sessions = json.loads(response.getvalue())
         
         # Verify datetime formatting
         math_session = next(s for s in sessions if s['title'] == 'Math Study')
@@ -336,7 +339,7 @@ class GetSessionsViewTests(TestCase):
         """Test non-recurring sessions have COUNT=1 in rrule"""
         self.client.force_login(self.user)
         response = self.client.get(self.url)
-        sessions = response.json()
+        sessions = json.loads(response.getvalue())
         
         math_session = next(s for s in sessions if s['title'] == 'Math Study')
         self.assertIn('rrule', math_session)
@@ -346,12 +349,37 @@ class GetSessionsViewTests(TestCase):
         """Test recurring sessions have correct recurrence count"""
         self.client.force_login(self.user)
         response = self.client.get(self.url)
-        sessions = response.json()
+        sessions = json.loads(response.getvalue())
         
         physics_session = next(s for s in sessions if s['title'] == 'Physics Study')
         self.assertIn('rrule', physics_session)
         self.assertIn('COUNT=3', physics_session['rrule'])
 
+    def test_sessions_are_streamed_in_one_query(self):
+        """The feed is streamed, and recurring sessions don't each need their own query"""
+        self.client.force_login(self.user)
+        # The first request also creates the user's feed version
+        self.client.get(self.url).getvalue()
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url).getvalue()
+        base_queries = len(queries)
+
+        for i in range(5):
+            session = StudySession.objects.create(
+                title=f'Extra {i}', date=timezone.now().date(), start_time='09:00', end_time='10:00',
+                is_recurring=True, host=self.user, calendar_id=self.calendar
+            )
+            RecurringStudySession.objects.create(session_id=session, recurrence_amount=2)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+            sessions = json.loads(response.getvalue())
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(sessions), 7)
+        self.assertEqual(len(queries), base_queries)
+
 class GetRecurringSessionsViewTests(TestCase):
     def setUp(self):
         self.client = APIClient()
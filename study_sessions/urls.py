@@ -1,5 +1,5 @@
 from django.urls import path, include
-from .views import get_sessions, create, create_recurring, get_recurring_sessions, method_of_creation
+from .views import get_sessions, create, create_recurring, get_recurring_sessions, method_of_creation, shift_sessions
 
 app_name = 'study_sessions'
 
@@ -9,5 +9,6 @@ urlpatterns = [
     path('create_recurring/<int:session_id>/', create_recurring, name='create_recurring'),
     path('sessions/', get_sessions, name='get_sessions'),
     path('recurring_sessions/', get_recurring_sessions, name='get_recurring_sessions'),
+    path('shift/', shift_sessions, name='shift_sessions'),
 ]
 
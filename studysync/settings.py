@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "users.apps.UsersConfig",
     "calendarapp.apps.CalendarappConfig",
     "rest_framework",
@@ -176,6 +177,10 @@ STATICFILES_DIRS = [
 MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_URL = "/media/"
 
+# Uploads bigger than this (e.g. large calendar exports) are spooled to a temporary file
+# on disk instead of being held in memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
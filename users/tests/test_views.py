@@ -1,4 +1,7 @@
+import io
+
 from django.test import TestCase, RequestFactory, Client
+from django.core.management import call_command
 from django.urls import reverse
 from django.contrib.sessions.middleware import SessionMiddleware
 from django.contrib.auth import get_user_model
@@ -6,6 +9,7 @@ from django.conf import settings
 
 from users.forms import RegisterForm, LoginForm, FriendRequest
 from users.views import CustomLoginView
+from calendarapp.models import DeletionJob
 
 CustomUser = get_user_model()
 
@@ -121,7 +125,15 @@ class DeleteAccountViewTests(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertEqual(response.url, '/')
         
-        # Verify user is deleted
+        # Verify user is deactivated, logged out and queued for deletion
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertNotIn('_auth_user_id', self.client.session)
+        job = DeletionJob.objects.get(user_id=self.user.pk)
+        self.assertEqual(job.kind, DeletionJob.Kinds.ACCOUNT)
+
+        # Verify the worker deletes the user
+        call_command('run_deletion_jobs', once=True, stdout=io.StringIO())
         self.assertFalse(CustomUser.objects.filter(pk=self.user.pk).exists())
         
         # Verify session flag is cleared
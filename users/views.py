@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LoginView
 from django.urls import reverse
@@ -6,6 +7,7 @@ from django.views import View
 
 from .models import CustomUser, FriendRequest
 from .forms import RegisterForm, LoginForm, ProfilePictureForm, ProfileInfoForm
+from util.deletion_jobs import request_account_deletion
 
 @login_required
 def profile_view(request):
@@ -55,7 +57,9 @@ def delete_account(request):
     if request.method == "POST":
         request.session["can_delete_account"] = False 
         user = request.user
-        user.delete()
+        # The account is deactivated now and its data deleted in the background by run_deletion_jobs
+        request_account_deletion(user)
+        logout(request)
 
         return redirect(to="/")
     
@@ -149,7 +153,7 @@ def friend_requests(request):
 
 @login_required
 def friends_list(request):
-    friends = request.user.friends.all()
+    friends = request.user.friends.filter(is_active=True)
     return render(request, 'users/friends.html', {'friends': friends})
 
 @login_required
@@ -159,7 +163,7 @@ def user_list(request):
     sent_requests = FriendRequest.objects.filter(from_user=current_user).values_list('to_user', flat=True)
     received_requests = FriendRequest.objects.filter(to_user=current_user).values_list('from_user', flat=True)
 
-    users = CustomUser.objects.exclude(id=current_user.id).exclude(id__in=friends).exclude(id__in=sent_requests).exclude(id__in=received_requests)
+    users = CustomUser.objects.filter(is_active=True).exclude(id=current_user.id).exclude(id__in=friends).exclude(id__in=sent_requests).exclude(id__in=received_requests)
     
     return render(request, 'users/user_list.html', {'users': users})
  
\ No newline at end of file
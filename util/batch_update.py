@@ -0,0 +1,189 @@
+"""
+Moves and resizes many events and study sessions at once, as when several are dragged together on
+the calendar.
+
+The owner of every item is read with one joined query per model, the valid changes are written
+with bulk_update in one transaction, and each item gets its own result. bulk_update skips save()
+and the model signals, so the recurrence columns are derived here with Event.normalize(), recurring
+events have their occurrences rewritten, and the feeds of everyone who sees the items are refreshed.
+"""
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from calendarapp.models import Event
+from study_sessions.models import StudySession, StudySessionParticipant
+from util.feed_cache import invalidate_feeds
+from util.occurrences import materialize
+
+# The most changes accepted in one request
+MAX_BATCH_CHANGES = 500
+
+# Columns written for a moved event: its times and everything normalize() derives from them
+EVENT_FIELDS = [
+    "start", "end", "duration", "rrule_freq", "rrule_interval", "rrule_count", "rrule_until", "rrule_byday",
+    "last_occurrence",
+]
+SESSION_FIELDS = ["date", "start_time", "end_time"]
+
+MODELS = {"event": Event, "studysession": StudySession}
+
+
+class BatchChange:
+    """
+    One requested change, and what became of it.
+    """
+
+    def __init__(self, index, item):
+        self.index = index
+        self.item = item if isinstance(item, dict) else {}
+        self.model = str(self.item.get("model") or "").lower()
+        self.id = self.item.get("id")
+        self.start = None
+        self.end = None
+        self.error = None
+        self.status_code = 200
+
+    def fail(self, message, status_code=400):
+        self.error = message
+        self.status_code = status_code
+
+    def result(self):
+        if self.error:
+            return {
+                "index": self.index, "id": self.id, "model": self.model, "status": "error",
+                "status_code": self.status_code, "message": self.error,
+            }
+        return {
+            "index": self.index, "id": self.id, "model": self.model, "status": "success",
+            "start": self.start, "end": self.end,
+        }
+
+
+def parse_time(value):
+    """
+    Parses a datetime sent by the calendar, which sends local times without an offset.
+    """
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_changes(items):
+    """
+    Returns a BatchChange for each item, with its times parsed or its error set.
+    """
+    changes = []
+    for index, item in enumerate(items):
+        change = BatchChange(index, item)
+        changes.append(change)
+        if not change.id or not change.item.get("start") or not change.model:
+            change.fail("Missing required fields")
+        elif not str(change.id).isdigit():
+            change.fail("Invalid id")
+        elif change.model not in MODELS:
+            change.fail("Invalid model type")
+        else:
+            change.id = int(change.id)
+            change.start = parse_time(change.item["start"])
+            change.end = parse_time(change.item["end"]) if change.item.get("end") else None
+            if change.start is None or (change.item.get("end") and change.end is None):
+                change.fail("Invalid datetime format")
+            elif change.end is not None and change.end <= change.start:
+                change.fail("End time must be after start time")
+    return changes
+
+
+def owned_rows(user, model, changes):
+    """
+    Returns {id: row} for the rows the changes refer to, failing the changes whose row is missing
+    or belongs to someone else. Owners are read in the same query as the rows.
+    """
+    ids = {change.id for change in changes}
+    if model is Event:
+        rows = Event.objects.filter(id__in=ids).annotate(
+            owner_id=F("calendar__user_id"), pending_delete=F("calendar__pending_delete")
+        )
+    else:
+        rows = StudySession.objects.filter(id__in=ids).annotate(
+            owner_id=F("host_id"), pending_delete=F("calendar_id__pending_delete")
+        )
+    rows = {row.id: row for row in rows}
+
+    for change in changes:
+        row = rows.get(change.id)
+        # Rows of a calendar being deleted are already gone as far as the user is concerned
+        if row is None or row.pending_delete:
+            change.fail("Event not found", 404)
+        elif row.owner_id != user.id:
+            change.fail("Permission denied", 403)
+    return rows
+
+
+def move_event(event, change):
+    """
+    Moves an event the way update_event does: a missing end keeps the event's duration.
+    """
+    original_duration = event.duration or (event.end - event.start if event.end else None)
+    event.start = change.start
+    if change.end is not None:
+        event.end = change.end
+        event.duration = None
+    elif original_duration:
+        event.end = change.start + original_duration
+        event.duration = original_duration
+    event.normalize()
+    change.end = event.end
+
+
+def move_session(session, change):
+    """
+    Moves a study session to the day and times of the change. A missing end keeps its length.
+    """
+    start = timezone.localtime(change.start)
+    if change.end is None:
+        length = datetime.combine(session.date, session.end_time) - datetime.combine(session.date, session.start_time)
+        change.end = change.start + length
+    end = timezone.localtime(change.end)
+    if end.date() != start.date():
+        change.fail("A study session must end on the day it starts")
+        return
+    session.date = start.date()
+    session.start_time = start.time()
+    session.end_time = end.time()
+
+
+def apply_changes(user, items):
+    """
+    Applies a list of {"model", "id", "start", "end"} changes for user, and returns a result for each.
+    Changes that fail are reported and skipped; the rest are written together.
+    """
+    changes = parse_changes(items)
+    events, sessions = [], []
+    for model, moved, move in ((Event, events, move_event), (StudySession, sessions, move_session)):
+        model_changes = [c for c in changes if not c.error and MODELS[c.model] is model]
+        if not model_changes:
+            continue
+        rows = owned_rows(user, model, model_changes)
+        for change in model_changes:
+            if not change.error:
+                move(rows[change.id], change)
+            if not change.error:
+                moved.append(rows[change.id])
+
+    # A row changed twice in one batch keeps its last change
+    events = list({event.id: event for event in events}.values())
+    sessions = list({session.id: session for session in sessions}.values())
+    with transaction.atomic():
+        Event.objects.bulk_update(events, EVENT_FIELDS)
+        StudySession.objects.bulk_update(sessions, SESSION_FIELDS)
+        materialize([event for event in events if event.rrule])
+
+        if events or sessions:
+            participants = StudySessionParticipant.objects.filter(study_session__in=sessions)
+            invalidate_feeds([user.id, *participants.values_list("participant_id", flat=True)])
+    return [change.result() for change in changes]
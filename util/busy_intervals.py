@@ -0,0 +1,222 @@
+"""
+Reads the events and study sessions a user has straight from the database.
+
+The calendar and session feeds and the automatic study session scheduler all start from the
+querysets here, so they agree on what a user has, calendars being deleted included. The feeds send
+each recurring item's rule for the calendar to expand; busy_intervals() expands the rules itself,
+into BusyIntervals in the site's time zone, so the scheduler never has to fetch the feeds over HTTP
+and parse their JSON back. group_busy_intervals() does the same for a whole study group, with the
+same two queries however many people are in it.
+"""
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from django.db.models import Exists, F, OuterRef, Q, Subquery
+from django.utils.timezone import localtime, make_aware
+
+from calendarapp.models import Event, EventOccurrence
+from study_sessions.models import RecurringStudySession, StudySession, StudySessionParticipant
+from util.occurrences import materialized_for
+from util.recurrence import event_rule, first_occurrence_between
+from util.vector_recurrence import expand_rules, to_datetimes
+
+EVENT = "event"
+SESSION = "session"
+
+
+class BusyInterval(NamedTuple):
+    """
+    One occurrence of an event or study session, from start up to end. Intervals sort by start.
+    """
+    start: datetime
+    end: datetime
+    kind: str
+    id: int
+    title: str
+
+
+def event_feed_queryset(user, window):
+    """
+    Returns the user's events that can appear in the window, as window_events() finds them.
+    """
+    return window_events(Event.objects.filter(calendar__user=user, calendar__pending_delete=False), window)
+
+
+def window_events(events, window):
+    """
+    Returns the events that can appear in the window: single events overlapping it, recurring events with a
+    materialized occurrence overlapping it, and recurring events not materialized as far as the window that
+    start before it ends and haven't stopped recurring before it starts. Windows starting before the
+    occurrences are written from check every recurring event's rule instead.
+    """
+    if window:
+        window_start, window_end = window
+        recurring = (
+            Q(rrule__isnull=False) & ~Q(rrule="")
+            & (Q(last_occurrence__isnull=True) | Q(last_occurrence__gte=window_start))
+        )
+        if materialized_for(window_start):
+            materialized = Q(occurrences_until__gte=window_end)
+            occurrences = EventOccurrence.objects.filter(
+                Q(occurrence_end__gt=window_start) | Q(occurrence_start__gte=window_start),
+                event=OuterRef("pk"),
+                occurrence_start__lt=window_end,
+            )
+            recurring = (recurring & materialized & Exists(occurrences)) | (recurring & ~materialized)
+        events = events.filter(
+            recurring
+            | Q(end__gt=window_start)
+            | Q(end__isnull=True, start__gte=window_start),
+            start__lt=window_end,
+        )
+    return events
+
+
+def occurs_in_window(row, window_start, window_end):
+    """
+    Checks whether a recurring event has an occurrence overlapping the window. Events whose rule can't be read
+    are kept, so the calendar can still try to show them.
+    """
+    try:
+        duration = row["duration"] or (row["end"] - row["start"] if row["end"] else None)
+        return first_occurrence_between(row["rrule"], row["start"], duration, window_start, window_end) is not None
+    except (TypeError, ValueError):
+        return True
+
+
+def session_feed_queryset(user, window=None):
+    """
+    Returns the sessions the user hosts or takes part in, annotated with their recurrence_amount. The two kinds
+    are found with a UNION of indexed lookups, which unlike an OR across the participants join needs no scan.
+    With a window, sessions starting after it are left out.
+    """
+    hosted = StudySession.objects.filter(host=user)
+    joined = StudySessionParticipant.objects.filter(participant=user)
+    if window:
+        last_day = localtime(window[1]).date()
+        hosted = hosted.filter(date__lte=last_day)
+        joined = joined.filter(study_session__date__lte=last_day)
+
+    sessions = StudySession.objects.filter(id__in=hosted.values("id").union(joined.values("study_session_id")))
+    # Sessions in a calendar being deleted are hidden until they are purged
+    sessions = sessions.filter(calendar_id__pending_delete=False)
+    recurrence = RecurringStudySession.objects.filter(session_id=OuterRef("pk")).order_by("pk")
+    return sessions.annotate(recurrence_amount=Subquery(recurrence.values("recurrence_amount")[:1]))
+
+
+def session_weeks(row):
+    """Returns the number of weeks a session takes place in, as it repeats weekly if it is recurring"""
+    return row["recurrence_amount"] if row["is_recurring"] and row["recurrence_amount"] else 1
+
+
+def session_last_date(row):
+    """Returns the date of the last occurrence of a session"""
+    return row["date"] + timedelta(weeks=session_weeks(row) - 1)
+
+
+# Values of events and sessions their intervals are built from
+EVENT_INTERVAL_FIELDS = ("id", "title", "start", "end", "duration", "rrule")
+SESSION_INTERVAL_FIELDS = ("id", "title", "date", "start_time", "end_time", "is_recurring", "recurrence_amount")
+
+
+def event_intervals(rows, window_start, window_end):
+    """
+    Returns a (row, BusyInterval) pair for each occurrence of the events in rows, values with at least
+    EVENT_INTERVAL_FIELDS, that overlaps the window. Events without an end take up no time, and recurring
+    events whose rule can't be read are left out. The rules of all the events are expanded together.
+    """
+    intervals = []
+    recurring = []
+    for row in rows:
+        duration = row["duration"] or (row["end"] - row["start"] if row["end"] else None)
+        if not duration or duration < timedelta(0):
+            continue
+        if not row["rrule"]:
+            start = localtime(row["start"])
+            intervals.append((row, BusyInterval(start, start + duration, EVENT, row["id"], row["title"])))
+            continue
+        try:
+            rule = event_rule(row["rrule"], row["start"])
+        except (TypeError, ValueError):
+            continue
+        recurring.append((row, duration, rule))
+
+    # Starting a duration before the window also finds the occurrences already under way when it starts
+    rules = [rule for _, _, rule in recurring]
+    afters = [window_start - duration for _, duration, _ in recurring]
+    for (row, duration, rule), walls in zip(recurring, expand_rules(rules, afters, window_end)):
+        for start in to_datetimes(walls, rule._tzinfo):
+            if window_start < start + duration and start < window_end:
+                intervals.append((row, BusyInterval(start, start + duration, EVENT, row["id"], row["title"])))
+    return intervals
+
+
+def session_intervals(rows, window_start, window_end):
+    """
+    Returns a (row, BusyInterval) pair for each occurrence of the sessions in rows, values with at least
+    SESSION_INTERVAL_FIELDS, that overlaps the window. Recurring sessions repeat on the same weekday for their
+    recurrence_amount weeks.
+    """
+    first_day = localtime(window_start).date()
+    last_day = localtime(window_end).date()
+    intervals = []
+    for row in rows:
+        # Weeks before the window's first day can't overlap it
+        first_week = max((first_day - row["date"]).days // 7, 0)
+        for week in range(first_week, session_weeks(row)):
+            day = row["date"] + timedelta(weeks=week)
+            if day > last_day:
+                break
+            start = make_aware(datetime.combine(day, row["start_time"]))
+            end = make_aware(datetime.combine(day, row["end_time"]))
+            if start < end and window_start < end and start < window_end:
+                intervals.append((row, BusyInterval(start, end, SESSION, row["id"], row["title"])))
+    return intervals
+
+
+def busy_intervals(user, window_start, window_end):
+    """
+    Returns the occurrences of the user's events and study sessions that overlap the window, as BusyIntervals
+    sorted by start. Each kind is read with a single query.
+    """
+    window = (window_start, window_end)
+    events = event_feed_queryset(user, window).values(*EVENT_INTERVAL_FIELDS)
+    sessions = session_feed_queryset(user, window).values(*SESSION_INTERVAL_FIELDS)
+    return sorted(
+        interval for _, interval in
+        event_intervals(events, *window) + session_intervals(sessions, *window)
+    )
+
+
+def group_busy_intervals(users, window_start, window_end):
+    """
+    Returns a dict of each user's id to what busy_intervals() would return for them. However many users there
+    are, their events are read with one query and their sessions with another, each row tagged with the user
+    it belongs to, so a session two of the users share is read once for each.
+    """
+    window = (window_start, window_end)
+    user_ids = [getattr(user, "pk", user) for user in users]
+    last_day = localtime(window_end).date()
+
+    events = window_events(Event.objects.filter(calendar__user_id__in=user_ids, calendar__pending_delete=False), window)
+    events = events.annotate(user_id=F("calendar__user_id")).values("user_id", *EVENT_INTERVAL_FIELDS)
+
+    recurrence = RecurringStudySession.objects.filter(session_id=OuterRef("pk")).order_by("pk")
+    sessions = StudySession.objects.filter(date__lte=last_day, calendar_id__pending_delete=False).annotate(
+        recurrence_amount=Subquery(recurrence.values("recurrence_amount")[:1])
+    )
+    # The participants join is only taken for the second half of the UNION, so neither half needs an OR
+    hosted = sessions.filter(host_id__in=user_ids).annotate(user_id=F("host_id"))
+    joined = sessions.filter(participants_set__participant_id__in=user_ids).annotate(
+        user_id=F("participants_set__participant_id")
+    )
+    sessions = hosted.values("user_id", *SESSION_INTERVAL_FIELDS).union(
+        joined.values("user_id", *SESSION_INTERVAL_FIELDS), all=True
+    )
+
+    busy = {user_id: [] for user_id in user_ids}
+    for row, interval in event_intervals(events, *window) + session_intervals(sessions, *window):
+        busy[row["user_id"]].append(interval)
+    for intervals in busy.values():
+        intervals.sort()
+    return busy
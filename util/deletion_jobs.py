@@ -0,0 +1,165 @@
+"""
+Deletes calendars and accounts in the background.
+
+Deleting a big calendar or account with .delete() has Django's collector load every related row
+into memory first, then delete them all in one long transaction. Instead, the calendar is marked
+pending_delete, or the account made inactive, which hides it straight away, and a DeletionJob is
+queued. The run_deletion_jobs worker then deletes the rows from the leaves of the foreign keys
+upwards, a chunk of ids at a time, each chunk in its own short transaction. Every chunk is looked
+up by an indexed foreign key, and deleted without loading its rows or sending signals, since
+nothing references them by then. Once the children are gone the calendar or user itself is
+deleted the normal way, which leaves the collector little to do.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from calendarapp.models import Calendar, DeletionJob, Event, EventOccurrence, FeedVersion, ImportJob
+from modules.models import Grade, Module
+from notifications.models import Notification
+from study_sessions.models import RecurringStudySession, StudySession, StudySessionParticipant
+from users.models import FriendRequest
+from util.feed_cache import invalidate_feeds
+
+# Number of rows deleted in each transaction
+PURGE_CHUNK_SIZE = 1000
+
+
+def request_calendar_deletion(calendar):
+    """
+    Hides a calendar and queues it to be deleted. Returns the DeletionJob.
+    """
+    with transaction.atomic():
+        Calendar.objects.filter(id=calendar.id).update(pending_delete=True)
+        calendar.pending_delete = True
+        job = DeletionJob.objects.create(
+            kind=DeletionJob.Kinds.CALENDAR, user_id=calendar.user_id, calendar_id=calendar.id, name=calendar.name
+        )
+        # Participants of the calendar's sessions stop seeing them too
+        participants = StudySessionParticipant.objects.filter(study_session__calendar_id=calendar)
+        invalidate_feeds([calendar.user_id, *participants.values_list("participant_id", flat=True)])
+    return job
+
+
+def request_account_deletion(user):
+    """
+    Deactivates a user, which stops them logging in and hides them from other users, hides all
+    their calendars and queues the account to be deleted. Returns the DeletionJob.
+    """
+    with transaction.atomic():
+        get_user_model().objects.filter(id=user.id).update(is_active=False)
+        user.is_active = False
+        Calendar.objects.filter(user=user).update(pending_delete=True)
+        job = DeletionJob.objects.create(kind=DeletionJob.Kinds.ACCOUNT, user_id=user.id, name=user.username)
+        participants = StudySessionParticipant.objects.filter(study_session__host=user)
+        invalidate_feeds([user.id, *participants.values_list("participant_id", flat=True)])
+    return job
+
+
+def calendar_plan(calendar_id):
+    """
+    Returns the querysets to purge, in order, before a calendar can be deleted.
+    """
+    return [
+        EventOccurrence.objects.filter(event__calendar_id=calendar_id),
+        Event.objects.filter(calendar_id=calendar_id),
+        StudySessionParticipant.objects.filter(study_session__calendar_id_id=calendar_id),
+        RecurringStudySession.objects.filter(session_id__calendar_id_id=calendar_id),
+        StudySession.objects.filter(calendar_id_id=calendar_id),
+    ]
+
+
+def account_plan(user_id):
+    """
+    Returns the querysets to purge, in order, before a user can be deleted. Their calendars are
+    purged first, one at a time.
+    """
+    friendships = get_user_model().friends.through.objects
+    return [
+        StudySessionParticipant.objects.filter(study_session__host_id=user_id),
+        RecurringStudySession.objects.filter(session_id__host_id=user_id),
+        StudySession.objects.filter(host_id=user_id),
+        StudySessionParticipant.objects.filter(participant_id=user_id),
+        Notification.objects.filter(user_id=user_id),
+        Grade.objects.filter(module__user_id=user_id),
+        Module.objects.filter(user_id=user_id),
+        FriendRequest.objects.filter(Q(from_user_id=user_id) | Q(to_user_id=user_id)),
+        friendships.filter(Q(from_customuser_id=user_id) | Q(to_customuser_id=user_id)),
+        FeedVersion.objects.filter(user_id=user_id),
+    ]
+
+
+def purge(queryset, job_id, chunk_size=PURGE_CHUNK_SIZE):
+    """
+    Deletes the rows of queryset a chunk at a time, adding each chunk to the job's rows_deleted.
+    The rows must have nothing left referencing them, as they are deleted without the collector.
+    """
+    model = queryset.model
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:chunk_size])
+            if not ids:
+                return
+            # _raw_delete issues a plain DELETE, without loading the rows or sending signals
+            model.objects.filter(pk__in=ids)._raw_delete(model.objects.db)
+            DeletionJob.objects.filter(id=job_id).update(rows_deleted=F("rows_deleted") + len(ids))
+
+
+def claim_jobs(limit):
+    """
+    Marks up to limit queued jobs as running and returns their ids, as util.import_jobs.claim_jobs does.
+    """
+    claimed = []
+    queued = DeletionJob.objects.filter(state=DeletionJob.States.QUEUED).order_by("created_at")
+    for job_id in queued.values_list("id", flat=True)[:limit]:
+        updated = DeletionJob.objects.filter(id=job_id, state=DeletionJob.States.QUEUED).update(
+            state=DeletionJob.States.RUNNING,
+            started_at=timezone.now(),
+        )
+        if updated:
+            claimed.append(job_id)
+    return claimed
+
+
+def run_deletion_job(job_id, chunk_size=PURGE_CHUNK_SIZE):
+    """
+    Deletes the calendar or account of a claimed job. A job that failed part way can be queued
+    again, as whatever it already deleted is simply not found the second time.
+    """
+    job = DeletionJob.objects.get(id=job_id)
+    if job.kind == DeletionJob.Kinds.CALENDAR:
+        calendar_ids = [job.calendar_id]
+        plan = []
+    else:
+        calendar_ids = list(Calendar.objects.filter(user_id=job.user_id).values_list("id", flat=True))
+        plan = account_plan(job.user_id)
+
+    try:
+        calendar_plans = [calendar_plan(calendar_id) for calendar_id in calendar_ids]
+        total = sum(queryset.count() for queryset in plan + [q for p in calendar_plans for q in p])
+        DeletionJob.objects.filter(id=job.id).update(rows_total=total)
+
+        for calendar_id, queryset_plan in zip(calendar_ids, calendar_plans):
+            for queryset in queryset_plan:
+                purge(queryset, job.id, chunk_size)
+            # Files of imports that never ran are removed with their jobs
+            for import_job in ImportJob.objects.filter(calendar_id=calendar_id).exclude(ics_file=""):
+                import_job.ics_file.delete(save=False)
+            Calendar.objects.filter(id=calendar_id).delete()
+
+        for queryset in plan:
+            purge(queryset, job.id, chunk_size)
+        if job.kind == DeletionJob.Kinds.ACCOUNT:
+            get_user_model().objects.filter(id=job.user_id).delete()
+    except Exception as e:
+        DeletionJob.objects.filter(id=job.id).update(
+            state=DeletionJob.States.FAILED, message=f"Deletion failed: {e}", finished_at=timezone.now()
+        )
+        return
+
+    DeletionJob.objects.filter(id=job.id).update(
+        state=DeletionJob.States.DONE, message=f"Deleted {total} row(s)", finished_at=timezone.now()
+    )
+    if job.kind == DeletionJob.Kinds.CALENDAR:
+        Notification.objects.create(user_id=job.user_id, message=f"Your calendar, {job.name}, was deleted.")
@@ -0,0 +1,138 @@
+"""
+Caches the serialized calendar and study session feeds of each user, and lets browsers revalidate them.
+
+Each user has a FeedVersion row whose version is bumped whenever a model that appears in their
+feeds changes (see the signals in calendarapp.signals and study_sessions.signals). Cached feeds are
+keyed by the feed, the user, the requested window and that version, so a change makes the old
+entries unreachable and they simply expire. The same version is sent as the feeds' ETag.
+"""
+from django.core.cache import cache
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from calendarapp.models import FeedVersion
+from util.json_stream import iter_json_array
+
+# How long a cached feed is kept if the user's data doesn't change
+FEED_CACHE_TIMEOUT = 60 * 60
+
+# Feeds bigger than this many characters are streamed without being cached
+FEED_CACHE_MAX_SIZE = 2 * 1024 * 1024
+
+HITS_KEY = "feed-cache:hits"
+MISSES_KEY = "feed-cache:misses"
+
+
+def feed_version(request):
+    """
+    Returns the FeedVersion of the requesting user, creating it on their first feed request. It is
+    only looked up once per request.
+    """
+    if not hasattr(request, "_feed_version"):
+        request._feed_version, _ = FeedVersion.objects.get_or_create(user_id=request.user.id)
+    return request._feed_version
+
+
+def invalidate_feeds(user_ids):
+    """
+    Bumps the feed version of the given users, which makes their cached feeds and ETags stale.
+    Being a database write, it only takes effect if the change that caused it is committed.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    FeedVersion.objects.filter(user_id__in=user_ids).update(version=F("version") + 1, updated_at=timezone.now())
+
+
+def feed_etag(request, *args, **kwargs):
+    """
+    ETag for the condition() decorator on the feed views.
+    """
+    if not request.user.is_authenticated:
+        return None
+    version = feed_version(request)
+    return f"{version.user_id}-{version.version}-{version.updated_at.timestamp():.6f}"
+
+
+def feed_last_modified(request, *args, **kwargs):
+    """
+    Last-Modified time for the condition() decorator on the feed views.
+    """
+    if not request.user.is_authenticated:
+        return None
+    return feed_version(request).updated_at
+
+
+def feed_key(feed, request, window):
+    bounds = ":".join(bound.isoformat() for bound in window) if window else "all"
+    return f"feed-cache:{feed}:{feed_etag(request)}:{bounds}"
+
+
+def cached_feed_response(feed, request, window, items):
+    """
+    Returns a user's feed from the cache if it is there. Otherwise calls items() and streams the
+    items it returns as a JSON array, caching the body as it goes.
+    """
+    key = feed_key(feed, request, window)
+    body = get_cached_feed(key)
+    if body is not None:
+        response = HttpResponse(body, content_type="application/json")
+    else:
+        response = StreamingHttpResponse(caching_stream(key, iter_json_array(items())), content_type="application/json")
+    # Browsers must check the ETag before reusing a feed, rather than guessing it is still fresh
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def get_cached_feed(key):
+    """
+    Returns the cached body for a feed key, or None, and counts the hit or miss.
+    """
+    body = cache.get(key)
+    _count(HITS_KEY if body is not None else MISSES_KEY)
+    return body
+
+
+def caching_stream(key, chunks):
+    """
+    Passes the chunks of a streamed feed through unchanged, and caches the whole body once it
+    has been sent, unless it grew past FEED_CACHE_MAX_SIZE.
+    """
+    body = []
+    size = 0
+    for chunk in chunks:
+        if body is not None:
+            body.append(chunk)
+            size += len(chunk)
+            if size > FEED_CACHE_MAX_SIZE:
+                body = None
+        yield chunk
+
+    if body is not None:
+        cache.set(key, "".join(body), FEED_CACHE_TIMEOUT)
+
+
+def cache_stats():
+    """
+    Returns the feed cache's hit and miss counts since they were last reset.
+    """
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else 0.0,
+    }
+
+
+def reset_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # incr() fails on a missing key
+        cache.add(key, 0, None)
+        cache.incr(key)
@@ -0,0 +1,37 @@
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def parse_window_bound(value):
+    """
+    Parses a start or end query parameter as sent by FullCalendar: an ISO 8601 datetime, with or
+    without an offset, or a plain date. Naive values are taken to be in the site's time zone.
+    """
+    # An unencoded "+" in an offset arrives as a space
+    value = value.strip().replace(" ", "+")
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_window(params):
+    """
+    Returns the (start, end) window a feed was requested for, or None if the request did not give
+    one. Raises ValueError if the parameters are invalid.
+    """
+    if not params.get("start") or not params.get("end"):
+        return None
+
+    start = parse_window_bound(params["start"])
+    end = parse_window_bound(params["end"])
+    if end <= start:
+        raise ValueError("The end of the window must be after its start")
+    return start, end
@@ -0,0 +1,187 @@
+"""
+Finds free time for a study session among the busy intervals of a user, or of everyone in a group.
+
+The busy intervals are sorted once and merged into disjoint blocks, each widened by the break to leave
+around it. For a group, each person's blocks are swept together into the blocks when anyone is busy,
+a k-way merge that takes O(n log k) for k people. Everything else is a single pass: each day's working
+hours are walked alongside the blocks, the gaps between them long enough for the session become
+candidate slots, and the best are kept with a bounded heap. That is O(n log n) in the number of intervals plus O(d) in the number of
+days, whatever the horizon. Times are handled in the site's time zone, so working hours stay the
+same local hours when the clocks change.
+"""
+import heapq
+from datetime import datetime, time, timedelta
+from typing import NamedTuple
+
+from django.utils.timezone import localtime, make_aware
+
+# Hours of the day sessions can be placed in
+WORKING_HOURS = (time(9), time(18))
+
+# Days of the week sessions can be placed on, Monday being 0. Sundays are left free
+WORKING_DAYS = frozenset(range(6))
+
+# Time left free before and after everything else in the calendar
+MIN_BREAK = timedelta(hours=1)
+
+# Length of an automatically placed session
+SESSION_DURATION = timedelta(hours=2)
+
+# Number of slots returned by default
+SLOT_LIMIT = 5
+
+# How far ahead automatically placed sessions are looked for
+SCHEDULING_HORIZON = timedelta(days=7)
+
+# Automatically placed sessions can start no sooner than the next multiple of this past the hour
+SLOT_STEP = timedelta(minutes=15)
+
+
+class FreeSlot(NamedTuple):
+    """
+    A time a session could be placed, and how much of that day's working hours is already taken, added up over
+    everyone the session is for.
+    """
+    start: datetime
+    end: datetime
+    day_busy: timedelta
+
+
+def merge_intervals(intervals, padding=timedelta(0)):
+    """
+    Returns the (start, end) blocks covered by intervals, each widened by padding on both sides, sorted and
+    with overlapping or touching ones joined. Intervals are anything starting with a start and an end.
+    """
+    return sweep([sorted(intervals)], padding)
+
+
+def sweep(sorted_lists, padding=timedelta(0)):
+    """
+    Returns the (start, end) blocks covered by any of the lists of intervals, as merge_intervals() does. Each
+    list must be sorted already, and the lists are swept in start order together with a heap.
+    """
+    merged = []
+    for start, end, *_ in heapq.merge(*sorted_lists):
+        start, end = start - padding, end + padding
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def working_periods(window_start, window_end, working_hours=WORKING_HOURS, working_days=WORKING_DAYS):
+    """
+    Yields the (start, end) of the working hours of each working day, cut to the window.
+    """
+    day = localtime(window_start).date()
+    last_day = localtime(window_end).date()
+    while day <= last_day:
+        if day.weekday() in working_days:
+            start = max(make_aware(datetime.combine(day, working_hours[0])), window_start)
+            end = min(make_aware(datetime.combine(day, working_hours[1])), window_end)
+            if start < end:
+                yield start, end
+        day += timedelta(days=1)
+
+
+def round_up(value, step=SLOT_STEP):
+    """
+    Returns value in the site's time zone, moved forward to the next multiple of step past the hour, which
+    step must divide. Values already on one are returned unchanged.
+    """
+    value = localtime(value)
+    past = timedelta(minutes=value.minute, seconds=value.second, microseconds=value.microsecond) % step
+    return value + (step - past) if past else value
+
+
+def skip_before(blocks, index, start):
+    """
+    Returns the index of the first block from index on that ends after start. Merged blocks end in order.
+    """
+    while index < len(blocks) and blocks[index][1] <= start:
+        index += 1
+    return index
+
+
+def iter_from(blocks, index):
+    """Yields the blocks from index on, without copying the list as a slice would"""
+    for position in range(index, len(blocks)):
+        yield blocks[position]
+
+
+def covered(blocks, index, start, end):
+    """
+    Returns how much of [start, end) the blocks from index on cover.
+    """
+    total = timedelta(0)
+    for block_start, block_end in iter_from(blocks, index):
+        if block_start >= end:
+            break
+        total += min(block_end, end) - max(block_start, start)
+    return total
+
+
+def gaps(blocks, index, start, end):
+    """
+    Yields the (start, end) of the stretches of [start, end) that the blocks from index on leave free.
+    """
+    cursor = start
+    for block_start, block_end in iter_from(blocks, index):
+        if block_start >= end:
+            break
+        if block_start > cursor:
+            yield cursor, block_start
+        cursor = max(cursor, block_end)
+    if cursor < end:
+        yield cursor, end
+
+
+def slot_rank(slot):
+    """
+    Orders slots by how busy their day is, so sessions go on the lightest days, but with days that have nothing
+    on them last, so the user keeps their free days. Ties go to the earliest slot.
+    """
+    return (not slot.day_busy, slot.day_busy, slot.start)
+
+
+def find_slots(busy, window_start, window_end, duration=SESSION_DURATION, working_hours=WORKING_HOURS,
+               min_break=MIN_BREAK, limit=SLOT_LIMIT, working_days=WORKING_DAYS):
+    """
+    Returns up to limit FreeSlots of the given duration in the window, best first. Each slot is in working hours
+    on a working day and at least min_break away from every busy interval. Each gap long enough for a session
+    gives one slot, at its start.
+    """
+    return find_group_slots([busy], window_start, window_end, duration, working_hours, min_break, limit, working_days)
+
+
+def find_group_slots(busy_lists, window_start, window_end, duration=SESSION_DURATION, working_hours=WORKING_HOURS,
+                     min_break=MIN_BREAK, limit=SLOT_LIMIT, working_days=WORKING_DAYS):
+    """
+    Does what find_slots() does for a group, given a list of busy intervals for each person in it. Slots are
+    only where everyone is free, and are ranked by how busy the day is for the group as a whole.
+    """
+    people = [merge_intervals(busy) for busy in busy_lists]
+    padded = sweep(people, min_break)
+
+    candidates = []
+    indexes = [0] * len(people)
+    padded_index = 0
+    for period_start, period_end in working_periods(window_start, window_end, working_hours, working_days):
+        # Every list is sorted, so each pointer only moves forward across the whole horizon
+        padded_index = skip_before(padded, padded_index, period_start)
+        starts = [
+            gap_start for gap_start, gap_end in gaps(padded, padded_index, period_start, period_end)
+            if gap_end - gap_start >= duration
+        ]
+        if not starts:
+            continue
+        day_busy = timedelta(0)
+        for person, blocks in enumerate(people):
+            indexes[person] = skip_before(blocks, indexes[person], period_start)
+            day_busy += covered(blocks, indexes[person], period_start, period_end)
+        for gap_start in starts:
+            start = localtime(gap_start)
+            candidates.append(FreeSlot(start, start + duration, day_busy))
+    return heapq.nsmallest(limit, candidates, key=slot_rank)
@@ -0,0 +1,134 @@
+import json
+import tempfile
+
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from calendarapp.models import ImportJob, ParsedFeed
+from notifications.models import Notification
+from util.parse_ics import BATCH_SIZE, ImportResult, file_sha256, iter_rows, sync_rows, write_rows
+
+
+def claim_jobs(limit):
+    """
+    Marks up to limit queued jobs as parsing and returns their ids. A job is only claimed if it
+    is still queued when it is updated, so several workers can safely share the queue.
+    """
+    claimed = []
+    queued = ImportJob.objects.filter(state=ImportJob.States.QUEUED).order_by("created_at")
+    for job_id in queued.values_list("id", flat=True)[:limit]:
+        updated = ImportJob.objects.filter(id=job_id, state=ImportJob.States.QUEUED).update(
+            state=ImportJob.States.PARSING,
+            started_at=timezone.now(),
+        )
+        if updated:
+            claimed.append(job_id)
+    return claimed
+
+
+def run_import_job(job_id, parse_workers=1):
+    """
+    Imports the ICS file of a claimed job into its calendar.
+
+    The file is parsed first, with the parsed rows spooled to a temporary file and progress saved
+    as it goes. With parse_workers > 1 the events are parsed in a pool of that many processes.
+    The spooled rows are kept as a ParsedFeed, so a later upload of the same file skips
+    parsing and reads them instead. The rows are then written in a single transaction,
+    so the calendar's events either all appear at once or not at all.
+    """
+    job = ImportJob.objects.select_related("calendar", "user").get(id=job_id)
+    result = ImportResult()
+
+    try:
+        with job.ics_file.open("rb") as ics_file:
+            sha256 = file_sha256(ics_file)
+            feed = ParsedFeed.objects.filter(sha256=sha256).first()
+            if feed is None:
+                feed = _parse_feed(job, ics_file, sha256, parse_workers)
+            else:
+                ParsedFeed.objects.filter(id=feed.id).update(uses=F("uses") + 1, last_used_at=timezone.now())
+
+        result.skipped = feed.skipped
+        result.errors = list(feed.errors)
+        ImportJob.objects.filter(id=job.id).update(
+            state=ImportJob.States.WRITING,
+            events_parsed=feed.events,
+            bytes_read=job.bytes_total,
+        )
+
+        with feed.rows.open("r") as rows_file:
+            rows = (json.loads(line) for line in rows_file)
+            if job.reimport:
+                sync_rows(rows, job.calendar, result)
+            else:
+                write_rows(rows, job.calendar, result)
+    except Exception as e:
+        # Nothing from a failed import is kept
+        result.created = result.updated = result.deleted = 0
+        _finish(job, result, ImportJob.States.FAILED, f"Import failed: {e}")
+        Notification.objects.create(
+            user=job.user,
+            message=f"Your calendar, {job.calendar.name}, could not be imported."
+        )
+    else:
+        _finish(job, result, ImportJob.States.DONE, str(result))
+        Notification.objects.create(
+            user=job.user,
+            message=f"Your calendar, {job.calendar.name}, was imported: {result}."
+        )
+
+
+def _parse_feed(job, ics_file, sha256, parse_workers):
+    """
+    Parses an ICS file into a spool of JSON rows, saving the job's progress as it goes, and
+    stores the spool as the ParsedFeed for the file's hash.
+    """
+    result = ImportResult()
+    parsed = 0
+
+    with tempfile.TemporaryFile(mode="w+b") as spool:
+        for row in iter_rows(ics_file, result, parse_workers):
+            spool.write(json.dumps(row).encode("utf-8") + b"\n")
+            parsed += 1
+            if parsed % BATCH_SIZE == 0:
+                ImportJob.objects.filter(id=job.id).update(
+                    events_parsed=parsed,
+                    bytes_read=ics_file.tell(),
+                )
+
+        feed = ParsedFeed(sha256=sha256, events=parsed, skipped=result.skipped, errors=result.errors)
+        feed.rows.save(f"{sha256}.jsonl", File(spool), save=False)
+        try:
+            with transaction.atomic():
+                feed.save()
+        except IntegrityError:
+            # Another job parsed the same file at the same time, use its copy
+            feed.rows.delete(save=False)
+            feed = ParsedFeed.objects.get(sha256=sha256)
+    return feed
+
+
+def _finish(job, result, state, message):
+    # The uploaded file is only needed until the import has run
+    job.ics_file.delete(save=False)
+    ImportJob.objects.filter(id=job.id).update(
+        ics_file="",
+        state=state,
+        events_created=result.created,
+        events_updated=result.updated,
+        events_deleted=result.deleted,
+        events_skipped=result.skipped,
+        errors=result.errors,
+        message=message,
+        finished_at=timezone.now(),
+    )
+
+
+def fail_job(job_id, message):
+    """
+    Marks a job as failed when its worker died before it could record the outcome itself.
+    """
+    job = ImportJob.objects.get(id=job_id)
+    _finish(job, ImportResult(), ImportJob.States.FAILED, message)
@@ -0,0 +1,38 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+# Number of rows fetched from the database at a time by feeds that stream their results
+ITERATOR_CHUNK_SIZE = 2000
+
+# Size in characters the JSON is buffered up to before it is sent
+BUFFER_SIZE = 64 * 1024
+
+
+def iter_json_array(items, encoder=DjangoJSONEncoder):
+    """
+    Encodes an iterable of JSON-serializable items as a JSON array, a piece at a time, so the
+    whole list never has to be held in memory.
+    """
+    buffer = ["["]
+    size = 1
+    separator = ""
+    for item in items:
+        text = separator + json.dumps(item, cls=encoder)
+        separator = ","
+        buffer.append(text)
+        size += len(text)
+        if size >= BUFFER_SIZE:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+    buffer.append("]")
+    yield "".join(buffer)
+
+
+def streaming_json_response(items, encoder=DjangoJSONEncoder, **kwargs):
+    """
+    Returns a StreamingHttpResponse that writes items out as a JSON array as they are produced.
+    """
+    return StreamingHttpResponse(iter_json_array(items, encoder), content_type="application/json", **kwargs)
@@ -0,0 +1,203 @@
+"""
+Keeps the EventOccurrence table in step with the recurring events it expands.
+
+Each recurring event has its occurrences written from its start, or from OCCURRENCE_HISTORY ago if
+that is later, up to its occurrences_until horizon. Windows starting before then, which nothing
+but the calendar asks for, check the rule directly. Saving an event rewrites its occurrences, bulk imports call materialize() for the events
+they write, and the roll_occurrences command extends every event as the horizon moves forward.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from calendarapp.models import Event, EventOccurrence
+from util.recurrence import event_rule
+from util.vector_recurrence import day_pattern, expand_rules, to_datetimes
+
+# How far ahead of now occurrences are written
+OCCURRENCE_HORIZON = timedelta(days=365)
+
+# How far back of now occurrences are written, which is as far back as search looks
+OCCURRENCE_HISTORY = timedelta(days=365)
+
+# The most occurrences written for one event at a time, so a rule like FREQ=MINUTELY can't flood the table
+MAX_OCCURRENCES = 2000
+
+MICROSECOND = timedelta(microseconds=1)
+
+# Number of events handled per batch by roll()
+ROLL_BATCH_SIZE = 500
+
+
+def horizon():
+    return timezone.now() + OCCURRENCE_HORIZON
+
+
+def history_start():
+    """
+    Returns the time from which every materialized event has its occurrences written. Events
+    materialized earlier were written from further back, so they are covered too.
+    """
+    return timezone.now() - OCCURRENCE_HISTORY
+
+
+def materialized_for(window_start):
+    """Checks whether the occurrences of materialized events are written as far back as window_start"""
+    return window_start >= history_start()
+
+
+def first_written(event):
+    return max(event.start, history_start())
+
+
+def event_duration(event):
+    if event.duration:
+        return event.duration
+    if event.end:
+        return event.end - event.start
+    return timedelta(0)
+
+
+def expand(event, after, until):
+    """
+    Returns unsaved EventOccurrences for the occurrences of a recurring event that start after
+    `after` (or from first_written() if it is None) and no later than `until`, and the time they
+    were written up to. That is until, unless MAX_OCCURRENCES was reached first.
+    """
+    rule = event_rule(event.rrule, event.start)
+    duration = event_duration(event)
+    starts = rule.xafter(after or first_written(event), count=MAX_OCCURRENCES, inc=after is None)
+
+    occurrences = []
+    for start in starts:
+        if start > until:
+            return occurrences, until
+        occurrences.append(EventOccurrence(event_id=event.id, occurrence_start=start, occurrence_end=start + duration))
+
+    if len(occurrences) == MAX_OCCURRENCES:
+        return occurrences, occurrences[-1].occurrence_start
+    return occurrences, until
+
+
+def expand_all(events, until, from_horizon=False):
+    """
+    Does what expand() does for each event, from first_written() or, with from_horizon, from its
+    occurrences_until. Returns (event, occurrences, horizon) for every event whose rule can be read.
+    Simple rules are expanded together by util.vector_recurrence, and any others one at a time.
+    """
+    expanded = []
+    simple = []
+    for event in events:
+        try:
+            rule = event_rule(event.rrule, event.start)
+        except (TypeError, ValueError):
+            continue
+        if day_pattern(rule) is not None:
+            simple.append((event, rule))
+            continue
+        try:
+            expanded.append((event, *expand(event, event.occurrences_until if from_horizon else None, until)))
+        except (TypeError, ValueError):
+            continue
+
+    # Occurrences fall on whole seconds, so starting a microsecond later skips the one at the horizon
+    afters = [event.occurrences_until + MICROSECOND if from_horizon else first_written(event) for event, _ in simple]
+    rules = [rule for _, rule in simple]
+    for (event, rule), walls in zip(simple, expand_rules(rules, afters, until)):
+        duration = event_duration(event)
+        occurrences = [
+            EventOccurrence(event_id=event.id, occurrence_start=start, occurrence_end=start + duration)
+            for start in to_datetimes(walls[:MAX_OCCURRENCES], rule._tzinfo)
+        ]
+        if len(occurrences) == MAX_OCCURRENCES:
+            expanded.append((event, occurrences, occurrences[-1].occurrence_start))
+        else:
+            expanded.append((event, occurrences, until))
+    return expanded
+
+
+def write(occurrences, horizons, clear=()):
+    """
+    Saves occurrences and sets each event's occurrences_until from horizons, a dict of event id
+    to horizon, in one transaction. Events in clear have their old occurrences deleted first.
+    """
+    by_horizon = {}
+    for event_id, event_horizon in horizons.items():
+        by_horizon.setdefault(event_horizon, []).append(event_id)
+
+    with transaction.atomic():
+        if clear:
+            EventOccurrence.objects.filter(event__in=clear).delete()
+            Event.objects.filter(id__in=clear).update(occurrences_until=None)
+        EventOccurrence.objects.bulk_create(occurrences, batch_size=ROLL_BATCH_SIZE)
+        for event_horizon, event_ids in by_horizon.items():
+            Event.objects.filter(id__in=event_ids).update(occurrences_until=event_horizon)
+    return len(occurrences)
+
+
+def materialize(events, until=None):
+    """
+    Rewrites the occurrences of the given saved events up to until (the horizon by default).
+    Events that don't recur, or whose rule can't be read, are left with no occurrences and no
+    occurrences_until, so window queries fall back to checking their rule directly. Returns the
+    number of occurrences written.
+    """
+    until = until or horizon()
+    events = [event for event in events if event.id is not None]
+    occurrences = []
+    horizons = {}
+    for event in events:
+        event.occurrences_until = None
+    for event, event_occurrences, event_horizon in expand_all([event for event in events if event.rrule], until):
+        event.occurrences_until = horizons[event.id] = event_horizon
+        occurrences.extend(event_occurrences)
+
+    return write(occurrences, horizons, clear=[event.id for event in events])
+
+
+def extend(events, until):
+    """
+    Adds the occurrences of already materialized events that fall between their occurrences_until and until.
+    Returns the number of occurrences written.
+    """
+    occurrences = []
+    horizons = {}
+    for event, event_occurrences, event_horizon in expand_all(events, until, from_horizon=True):
+        horizons[event.id] = event_horizon
+        occurrences.extend(event_occurrences)
+
+    return write(occurrences, horizons)
+
+
+def roll(until=None):
+    """
+    Moves the horizon of every recurring event forward to until (the horizon by default),
+    materializing events that have no occurrences yet. Returns the number of occurrences written.
+    """
+    until = until or horizon()
+    written = 0
+
+    behind = Event.objects.filter(rrule__isnull=False, occurrences_until__lt=until).exclude(rrule="")
+    # Events whose last occurrence is already written have nothing left to add
+    behind = behind.exclude(last_occurrence__lte=F("occurrences_until"))
+    batch = []
+    for event in behind.order_by("id").iterator(chunk_size=ROLL_BATCH_SIZE):
+        batch.append(event)
+        if len(batch) >= ROLL_BATCH_SIZE:
+            written += extend(batch, until)
+            batch = []
+    if batch:
+        written += extend(batch, until)
+
+    missing = Event.objects.filter(rrule__isnull=False, occurrences_until__isnull=True).exclude(rrule="")
+    batch = []
+    for event in missing.order_by("id").iterator(chunk_size=ROLL_BATCH_SIZE):
+        batch.append(event)
+        if len(batch) >= ROLL_BATCH_SIZE:
+            written += materialize(batch, until)
+            batch = []
+    if batch:
+        written += materialize(batch, until)
+    return written
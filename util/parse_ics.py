@@ -1,35 +1,482 @@
+import codecs
+import hashlib
+import itertools
+import json
+from collections import deque
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
 from calendarapp.models import Event
-from dateutil.rrule import rrulestr
-from icalendar import Calendar as ICalCalendar
-
-def parse_ics(file, user_calendar):
-    """
-    This function opens the uploaded ICS file, iterates through each event,
-    and creates an event object to store in the database.
-    """
-    calendar = ICalCalendar.from_ical(file.read())
-
-    for component in calendar.walk():
-        if component.name == "VEVENT":
-            title = str(component.get("SUMMARY", "Untitled Event"))
-            start = component.get("DTSTART").dt.isoformat()
-            end = component.get("DTEND").dt.isoformat() if component.get("DTEND") else None
-            description = str(component.get("DESCRIPTION", ""))
-
-            # Handle recurring events (rrule)
-            rrule = component.get("RRULE")
-
-            rrule_str = None
-            if rrule:
-                # Convert ical module rrule to fullcalendar readable string
-                rrule_str = rrulestr(rrule.to_ical().decode('utf-8'), dtstart=component.get("DTSTART").dt)
-
-            event = Event(
-                calendar = user_calendar,
-                title = title,
-                start = start,
-                end = end,
-                description = description,
-                rrule = rrule_str
-            )
-            event.save()
\ No newline at end of file
+from calendarapp.signals import feeds_invalidated_by_caller
+from icalendar import Component
+from util.feed_cache import invalidate_feeds
+from util.occurrences import materialize
+from util.recurrence import parse_rule
+from util.workers import run, worker_pool
+
+# Number of events sent to the database per INSERT
+BATCH_SIZE = 500
+
+# Number of bytes read from the uploaded file at a time
+CHUNK_SIZE = 64 * 1024
+
+# Part of the key parsed feeds are cached under. Change it whenever event_fields() changes,
+# so files parsed by the old code are parsed again. Version 2 drops feeds whose custom timezones
+# were lost by parallel parsing.
+PARSER_VERSION = "2"
+
+# Number of VEVENTs sent to a parse worker at a time
+PARSE_CHUNK_SIZE = 1000
+
+# VEVENT properties the importer reads. Everything else (CATEGORIES, LOCATION, alarms...) is
+# dropped while scanning so icalendar never has to parse it.
+VEVENT_PROPERTIES = {"UID", "RECURRENCE-ID", "SEQUENCE", "SUMMARY", "DESCRIPTION", "DTSTART", "DTEND", "RRULE"}
+
+# Fields a re-import overwrites on events that changed in the feed
+SYNCED_FIELDS = [
+    "title", "start", "end", "duration", "description", "rrule", "uid", "sequence", "content_hash",
+    "rrule_freq", "rrule_interval", "rrule_count", "rrule_until", "rrule_byday", "last_occurrence",
+]
+
+# Only this many rejected events are described in an ImportResult, the rest are just counted
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportResult:
+    """
+    Summary of an ICS import: how many events were written, and which VEVENTs were rejected and why.
+    """
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.deleted = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.errors = []
+
+    def add_error(self, index, title, messages):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"index": index, "title": title, "messages": messages})
+
+    def merge(self, other):
+        """
+        Adds the counts and errors of another result, such as one returned by a parse worker.
+        """
+        self.created += other.created
+        self.updated += other.updated
+        self.deleted += other.deleted
+        self.unchanged += other.unchanged
+        self.skipped += other.skipped
+        room = MAX_REPORTED_ERRORS - len(self.errors)
+        self.errors.extend(other.errors[:max(room, 0)])
+
+    def __str__(self):
+        if self.updated or self.deleted or self.unchanged:
+            return (f"{self.created} events added, {self.updated} updated, {self.deleted} removed, "
+                    f"{self.unchanged} unchanged, {self.skipped} skipped")
+        return f"{self.created} events imported, {self.skipped} skipped"
+
+
+def parse_ics(file, user_calendar, batch_size=BATCH_SIZE, workers=1):
+    """
+    This function scans the uploaded ICS file, parses each event,
+    and stores them in the database in batches. Events that fail validation are
+    skipped and reported in the returned ImportResult instead of aborting the import.
+    Only one chunk of the file and one batch of events are held in memory at a time.
+    A single ICS file or a list of them can be given; with workers > 1 the events are
+    parsed in a pool of worker processes.
+    """
+    result = ImportResult()
+    rows = iter_rows(file, result, workers)
+    return write_rows(rows, user_calendar, result, batch_size)
+
+
+def reimport_ics(file, user_calendar, batch_size=BATCH_SIZE, workers=1):
+    """
+    Imports a new version of a feed into a calendar it was imported into before. Events are
+    matched on their UID, and only the ones that were added, changed or removed are written.
+    """
+    result = ImportResult()
+    rows = iter_rows(file, result, workers)
+    return sync_rows(rows, user_calendar, result, batch_size)
+
+
+def iter_rows(files, result, workers=1):
+    """
+    Scans one ICS file, or each of a list of them in turn, and yields the parsed (index, fields)
+    rows. Indexes count on across files. With workers > 1 the parsing is done by parse_rows_parallel().
+    """
+    if not isinstance(files, (list, tuple)):
+        files = [files]
+
+    timezones = []
+    blocks = itertools.chain.from_iterable(iter_vevent_blocks(file, timezones=timezones) for file in files)
+    if workers > 1:
+        return parse_rows_parallel(blocks, result, workers, timezones)
+    return parse_rows(blocks, result)
+
+
+def file_sha256(file, chunk_size=CHUNK_SIZE):
+    """
+    Returns the key a file's parsed events are cached under: a SHA-256 of its content and PARSER_VERSION.
+    """
+    digest = hashlib.sha256(PARSER_VERSION.encode("utf-8") + b"\n")
+    if hasattr(file, "chunks"):
+        chunks = file.chunks(chunk_size)
+    else:
+        chunks = iter(lambda: file.read(chunk_size), b"")
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_lines(file, chunk_size=CHUNK_SIZE):
+    """
+    Yields the decoded lines of a file, reading it a chunk at a time.
+    """
+    if hasattr(file, "chunks"):
+        chunks = file.chunks(chunk_size)
+    else:
+        chunks = iter(lambda: file.read(chunk_size), b"")
+
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        lines = (pending + chunk).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+
+    pending += decoder.decode(b"", final=True)
+    if pending.rstrip("\r"):
+        yield pending.rstrip("\r")
+
+
+def iter_vevent_blocks(file, chunk_size=CHUNK_SIZE, timezones=None):
+    """
+    Splits an ICS file on its BEGIN/END:VEVENT boundaries and yields the text of each VEVENT,
+    keeping only the properties in VEVENT_PROPERTIES. VTIMEZONE definitions are parsed as they
+    are found, which registers them with icalendar for the events that refer to them. If a
+    timezones list is given, the text of each VTIMEZONE is also appended to it so it can be
+    passed on to parse workers.
+    """
+    block = None
+    component = None
+    depth = 0
+    keep = False
+
+    for line in iter_lines(file, chunk_size):
+        # Folded lines continue the property above them
+        if line[:1] in (" ", "\t"):
+            if block is not None and keep:
+                block.append(line)
+            continue
+
+        name, _, value = line.partition(":")
+        name = name.split(";", 1)[0].upper()
+        if name in ("BEGIN", "END"):
+            value = value.strip().upper()
+
+        if block is None:
+            if name == "BEGIN" and value in ("VEVENT", "VTIMEZONE"):
+                block = [line]
+                component = value
+                depth = 0
+                keep = True
+            continue
+
+        if name == "BEGIN":
+            depth += 1
+        elif name == "END" and depth:
+            depth -= 1
+            keep = component == "VTIMEZONE"
+            if keep:
+                block.append(line)
+            continue
+        elif name == "END" and value == component:
+            block.append(line)
+            text = "\r\n".join(block) + "\r\n"
+            if component == "VEVENT":
+                yield text
+            else:
+                register_timezone(text)
+                if timezones is not None:
+                    timezones.append(text)
+            block = None
+            continue
+
+        # Nested components such as VALARM are dropped from events
+        keep = component == "VTIMEZONE" or (depth == 0 and name in VEVENT_PROPERTIES)
+        if keep:
+            block.append(line)
+
+
+def register_timezone(text):
+    """
+    Parses a VTIMEZONE, which makes icalendar use it for the events that refer to its TZID.
+    """
+    try:
+        Component.from_ical(text)
+    except ValueError:
+        # Events using a broken timezone are reported when they fail to parse
+        pass
+
+
+def event_fields(component):
+    """
+    Reads the values needed for an Event out of a VEVENT component.
+    """
+    title = str(component.get("SUMMARY", "Untitled Event"))
+    start = component.get("DTSTART").dt.isoformat()
+    end = component.get("DTEND").dt.isoformat() if component.get("DTEND") else None
+    description = str(component.get("DESCRIPTION", ""))
+
+    # Handle recurring events (rrule)
+    rrule = component.get("RRULE")
+
+    rrule_str = None
+    if rrule:
+        # Convert ical module rrule to fullcalendar readable string
+        rrule_str = str(parse_rule(rrule.to_ical().decode('utf-8'), component.get("DTSTART").dt))
+
+    fields = {
+        "title": title,
+        "start": start,
+        "end": end,
+        "description": description,
+        "rrule": rrule_str,
+    }
+
+    # An event that overrides one occurrence of a recurring event shares the recurring event's UID
+    uid = str(component.get("UID", ""))
+    if uid and component.get("RECURRENCE-ID"):
+        uid += "/" + component.get("RECURRENCE-ID").dt.isoformat()
+
+    fields["uid"] = uid[:255]
+    fields["sequence"] = int(component.get("SEQUENCE", 0))
+    fields["content_hash"] = content_hash(fields)
+    return fields
+
+
+def content_hash(fields):
+    """
+    Hashes the values an import writes to an event, so unchanged events can be skipped on re-import.
+    """
+    values = [fields[name] for name in ("title", "start", "end", "description", "rrule")]
+    return hashlib.sha256(json.dumps(values).encode("utf-8")).hexdigest()
+
+
+def event_key(uid, hash):
+    # Events without a UID can only be matched on their content
+    return uid or "#" + hash
+
+
+def legacy_key(title, start, end, description, rrule):
+    """
+    Returns what an event imported before events kept their UID and content hash is matched on: the
+    values it was imported with, as stored.
+    """
+    def instant(value):
+        return timezone.make_aware(value) if value and timezone.is_naive(value) else value
+
+    return title, instant(start), instant(end), description or "", rrule or None
+
+
+def build_event(fields, user_calendar):
+    """
+    Creates an unsaved Event and validates it in memory. The calendar is excluded from
+    validation since it is already known to exist, which saves a lookup per event.
+    """
+    event = Event(calendar=user_calendar, **fields)
+    event.normalize()
+    event.full_clean(exclude=["calendar"])
+    return event
+
+
+def parse_rows(blocks, result, start=0):
+    """
+    Parses each VEVENT block and yields (index, fields) pairs, where fields are the Event values
+    from event_fields(). Blocks that cannot be parsed are recorded in result and skipped.
+    The values are all strings, so rows can be spooled to disk or sent to other processes.
+    """
+    for index, block in enumerate(blocks, start):
+        title = "Untitled Event"
+        try:
+            component = Component.from_ical(block)
+            title = str(component.get("SUMMARY", title))
+            yield index, event_fields(component)
+        except (AttributeError, TypeError, ValueError) as e:
+            result.add_error(index, title, [str(e)])
+
+
+# VTIMEZONE texts a parse worker has already registered
+_registered_timezones = set()
+
+
+def parse_chunk(start, blocks, timezones):
+    """
+    Runs in a parse worker: registers the feed's timezones, then parses a chunk of VEVENT blocks
+    whose first block has the given index. Returns the parsed rows and an ImportResult of the failures.
+    """
+    for text in timezones:
+        if text not in _registered_timezones:
+            register_timezone(text)
+            _registered_timezones.add(text)
+
+    result = ImportResult()
+    rows = list(parse_rows(blocks, result, start))
+    return rows, result
+
+
+def parse_rows_parallel(blocks, result, workers, timezones, chunk_size=PARSE_CHUNK_SIZE):
+    """
+    Does the same as parse_rows(), but sends the blocks in chunks of chunk_size to a pool of
+    worker processes. Rows are still yielded in file order. Only two chunks per worker are
+    queued at a time, so large files are not read into memory ahead of the workers.
+
+    timezones is the list iter_vevent_blocks() appends to, so each chunk is sent with every
+    VTIMEZONE that came before its events.
+    """
+    pending = deque()
+    index = 0
+
+    def finished():
+        rows, chunk_result = pending.popleft().result()
+        result.merge(chunk_result)
+        return rows
+
+    with worker_pool(workers) as pool:
+        while True:
+            chunk = list(itertools.islice(blocks, chunk_size))
+            if not chunk:
+                break
+            pending.append(pool.submit(run, "util.parse_ics.parse_chunk", index, chunk, list(timezones)))
+            index += len(chunk)
+            if len(pending) >= workers * 2:
+                yield from finished()
+
+        while pending:
+            yield from finished()
+
+
+def write_rows(rows, user_calendar, result, batch_size=BATCH_SIZE):
+    """
+    Validates each parsed row and bulk inserts the valid ones inside a single transaction,
+    batch_size events at a time, along with the occurrences of the recurring ones. Rows that fail
+    validation are recorded in result.
+    """
+    batch = []
+
+    with transaction.atomic():
+        for index, fields in rows:
+            try:
+                batch.append(build_event(fields, user_calendar))
+            except ValidationError as e:
+                result.add_error(index, fields["title"], e.messages)
+                continue
+
+            if len(batch) >= batch_size:
+                Event.objects.bulk_create(batch)
+                materialize(batch)
+                result.created += len(batch)
+                batch = []
+
+        if batch:
+            Event.objects.bulk_create(batch)
+            materialize(batch)
+            result.created += len(batch)
+
+    # Bulk writes don't send the signals that normally invalidate cached feeds
+    if result.created:
+        invalidate_feeds([user_calendar.user_id])
+    return result
+
+
+def sync_rows(rows, user_calendar, result, batch_size=BATCH_SIZE):
+    """
+    Compares parsed rows with the imported events already in the calendar, then inserts new
+    events, updates changed ones and deletes the ones that are no longer in the feed, all inside a
+    single transaction. Events whose content hash is unchanged, or whose SEQUENCE is older than the
+    stored one, are left alone. Events that were created by hand rather than imported are never touched.
+
+    Events imported before events kept their UID and content hash can't be told apart from ones created
+    by hand, so they are never deleted. A new event with the same values takes one over instead of
+    being inserted next to it, and is matched by its UID from then on.
+    """
+    existing = {}
+    calendar_events = Event.objects.filter(calendar=user_calendar)
+    imported = calendar_events.exclude(uid="", content_hash="")
+    for pk, uid, sequence, stored_hash in imported.values_list("id", "uid", "sequence", "content_hash"):
+        existing[event_key(uid, stored_hash)] = (pk, sequence, stored_hash)
+    legacy = {}
+    for pk, *values in calendar_events.filter(uid="", content_hash="").values_list(
+        "id", "title", "start", "end", "description", "rrule"
+    ):
+        legacy.setdefault(legacy_key(*values), []).append(pk)
+
+    seen = set()
+    created = []
+    updated = []
+
+    with transaction.atomic():
+        for index, fields in rows:
+            key = event_key(fields["uid"], fields["content_hash"])
+            if key in seen:
+                result.add_error(index, fields["title"], [f"Duplicate event UID: {fields['uid']}"])
+                continue
+            seen.add(key)
+
+            match = existing.get(key)
+            if match and (match[2] == fields["content_hash"] or fields["sequence"] < match[1]):
+                result.unchanged += 1
+                continue
+
+            try:
+                event = build_event(fields, user_calendar)
+            except ValidationError as e:
+                result.add_error(index, fields["title"], e.messages)
+                continue
+
+            if not match:
+                same = legacy.get(legacy_key(event.title, event.start, event.end, event.description, event.rrule))
+                if same:
+                    match = (same.pop(),)
+            if match:
+                event.id = match[0]
+                updated.append(event)
+            else:
+                created.append(event)
+
+            if len(created) >= batch_size:
+                Event.objects.bulk_create(created)
+                materialize(created)
+                result.created += len(created)
+                created = []
+            if len(updated) >= batch_size:
+                Event.objects.bulk_update(updated, SYNCED_FIELDS)
+                materialize(updated)
+                result.updated += len(updated)
+                updated = []
+
+        Event.objects.bulk_create(created)
+        Event.objects.bulk_update(updated, SYNCED_FIELDS)
+        materialize(created + updated)
+        result.created += len(created)
+        result.updated += len(updated)
+
+        deleted = [match[0] for key, match in existing.items() if key not in seen]
+        # The feeds are invalidated once below rather than for each event, and occurrences go with their
+        # events in one DELETE through the foreign key
+        with feeds_invalidated_by_caller():
+            for i in range(0, len(deleted), batch_size):
+                Event.objects.filter(id__in=deleted[i:i + batch_size]).delete()
+        result.deleted += len(deleted)
+
+    if result.created or result.updated or result.deleted:
+        invalidate_feeds([user_calendar.user_id])
+    return result
@@ -0,0 +1,220 @@
+"""
+Helpers for expanding the recurrence rules stored on events.
+
+Event.rrule holds either a bare rule ("FREQ=WEEKLY;COUNT=5") or, for imported events, the output
+of str(rrulestr(...)), which has a DTSTART line with the naive local start followed by an RRULE
+line. Either way the event's own start is used as the first occurrence.
+
+Parsed rules and expanded occurrences are kept in per-process LRU caches, since the same rule
+text turns up on many events and is expanded again on every request.
+"""
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from itertools import islice
+
+from dateutil.rrule import rrule as Rule, rrulestr
+from django.utils import timezone
+
+from util.vector_recurrence import day_pattern, expand_rules, last_wall, to_datetime
+
+# A naive UNTIL, as written by dateutil, holds a UTC time
+NAIVE_UNTIL = re.compile(r"UNTIL=(\d{8})(T\d{6})?(?=;|$)", re.IGNORECASE)
+
+# Any UNTIL, with whether it has a time and whether that time is UTC
+UNTIL = re.compile(r"UNTIL=(\d{8})(?:T(\d{6})(Z?))?(?=;|$)", re.IGNORECASE | re.MULTILINE)
+
+# The DTSTART line of imported rule text, which the calendar's rrule plugin starts the rule from
+DTSTART = re.compile(r"^(DTSTART(?:;[^:\n]*)?:)(\d{8})(?:T(\d{6})(Z?))?$", re.IGNORECASE | re.MULTILINE)
+
+# Later than any occurrence of a rule with a COUNT or UNTIL that is worth storing
+FAR_FUTURE = datetime(9000, 1, 1, tzinfo=dt_timezone.utc)
+
+# The most occurrences of a rule stepped through to find its last one. Rules with more, such as a
+# FREQ=MINUTELY rule running for years, are given no last_occurrence, as if they never ended
+MAX_SCANNED_OCCURRENCES = 5000
+
+# Number of parsed rules, and of expanded occurrence lists, kept by each process
+RULE_CACHE_SIZE = 4096
+EXPANSION_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=RULE_CACHE_SIZE)
+def parse_rule(text, dtstart):
+    """
+    Returns rrulestr(text, dtstart=dtstart), parsing each distinct rule and start only once. The
+    returned rule is shared with every other caller, so it must not be changed.
+    """
+    return rrulestr(text, dtstart=dtstart)
+
+
+@lru_cache(maxsize=EXPANSION_CACHE_SIZE)
+def expand_rule(text, dtstart, window_start=None, window_end=None):
+    """
+    Returns a tuple of the occurrences of a rule between window_start and window_end inclusive,
+    or of all its occurrences if no window is given, which the rule must then have a COUNT or UNTIL for.
+    """
+    rule = parse_rule(text, dtstart)
+    if window_start is None:
+        return tuple(rule)
+    return tuple(rule.between(window_start, window_end, inc=True))
+
+
+def rule_cache_stats():
+    """
+    Returns the hits, misses, size and hit rate of this process's rule and expansion caches.
+    """
+    return {"rules": _cache_stats(parse_rule), "expansions": _cache_stats(expand_rule)}
+
+
+def clear_rule_caches():
+    parse_rule.cache_clear()
+    expand_rule.cache_clear()
+
+
+def _cache_stats(cached):
+    info = cached.cache_info()
+    total = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "hit_rate": info.hits / total if total else 0.0,
+    }
+
+
+def rule_text(rrule):
+    """
+    Returns just the RRULE part of an event's stored rrule text, without its DTSTART line.
+    """
+    lines = [line.strip() for line in rrule.splitlines() if line.strip()]
+    lines = [line for line in lines if not line.upper().startswith("DTSTART")]
+    return "\n".join(line[len("RRULE:"):] if line.upper().startswith("RRULE:") else line for line in lines)
+
+
+def event_rule(rrule, start):
+    """
+    Returns a dateutil rule for an event's stored rrule text, with its first occurrence at start.
+
+    Occurrences are generated in the site's time zone, so a weekly 9am lecture stays at 9am after
+    the clocks change. Naive UNTIL values are taken as UTC, as required with an aware start.
+    """
+    text = rule_text(rrule)
+
+    def utc_until(match):
+        return f"UNTIL={match.group(1)}{match.group(2) or 'T235959'}Z"
+
+    text = NAIVE_UNTIL.sub(utc_until, text)
+    return parse_rule(text, timezone.localtime(start))
+
+
+def shift_rule(rrule, delta):
+    """
+    Returns an event's stored rrule text with its DTSTART and UNTIL moved by delta in local time,
+    so the rule still starts and ends with the same occurrences once the event's start has been
+    moved by delta too. UTC times keep their local time of day, as the occurrences do, and naive
+    or zoned DTSTARTs, which are local times already, simply have delta added.
+    """
+    def parse(day, time):
+        return datetime(
+            int(day[:4]), int(day[4:6]), int(day[6:]), int(time[:2]), int(time[2:4]), int(time[4:])
+        )
+
+    def local(value, utc):
+        if not utc:
+            return value + delta
+        value = timezone.localtime(value.replace(tzinfo=dt_timezone.utc)) + delta
+        return value.astimezone(dt_timezone.utc).replace(tzinfo=None)
+
+    def shifted_start(match):
+        prefix, day, time, utc = match.groups()
+        if time is None:
+            return f"{prefix}{(datetime.strptime(day, '%Y%m%d') + delta):%Y%m%d}"
+        start = local(parse(day, time), utc)
+        return f"{prefix}{start:%Y%m%dT%H%M%S}{utc}"
+
+    def shifted_until(match):
+        day, time, utc = match.groups()
+        if time is None and delta % timedelta(days=1) == timedelta(0):
+            return f"UNTIL={(datetime.strptime(day, '%Y%m%d') + delta):%Y%m%d}"
+        # A naive UNTIL is UTC, as event_rule() reads it
+        until = local(parse(day, time or "235959"), True)
+        return f"UNTIL={until:%Y%m%dT%H%M%S}{utc or ''}"
+
+    if not rrule:
+        return rrule
+    return UNTIL.sub(shifted_until, DTSTART.sub(shifted_start, rrule))
+
+
+def first_occurrence_between(rrule, start, duration, window_start, window_end):
+    """
+    Returns the start of the first occurrence of a recurring event that overlaps the window
+    [window_start, window_end), or None if it has none. Events without a duration overlap the
+    window if they start inside it.
+    """
+    duration = duration or timedelta(0)
+    rule = event_rule(rrule, start)
+    occurrence = rule.after(window_start - duration, inc=not duration)
+    if occurrence is not None and occurrence < window_end:
+        return occurrence
+    return None
+
+
+def recurrence_fields(rrule, start, duration=None):
+    """
+    Returns the values of an event's structured recurrence columns for its rrule text: the rule's
+    FREQ, INTERVAL, COUNT, UNTIL and BYDAY, and last_occurrence, when its last occurrence ends.
+    Rules that never end, or can't be read, have no last_occurrence, so queries never rule them out.
+    """
+    fields = {
+        "rrule_freq": "",
+        "rrule_interval": None,
+        "rrule_count": None,
+        "rrule_until": None,
+        "rrule_byday": "",
+        "last_occurrence": None,
+    }
+    if not rrule or not start:
+        return fields
+
+    for line in rule_text(rrule).splitlines():
+        parts = dict(part.split("=", 1) for part in line.upper().split(";") if "=" in part)
+        if "FREQ" in parts:
+            fields["rrule_freq"] = parts["FREQ"][:10]
+            fields["rrule_byday"] = parts.get("BYDAY", "")[:64]
+            break
+
+    try:
+        rule = event_rule(rrule, start)
+    except (TypeError, ValueError):
+        return fields
+    if not isinstance(rule, Rule):
+        # An RRULE with RDATE or EXDATE lines is kept opaque
+        return fields
+
+    fields["rrule_interval"] = rule._interval
+    fields["rrule_count"] = rule._count
+    fields["rrule_until"] = rule._until
+    if rule._count is None and rule._until is None:
+        return fields
+
+    last = last_wall(rule)
+    if last is not None:
+        last = to_datetime(last, rule._tzinfo)
+    elif day_pattern(rule) is not None:
+        occurrences = expand_rules([rule], start, FAR_FUTURE)[0]
+        last = to_datetime(occurrences[-1], rule._tzinfo) if len(occurrences) else None
+    elif rule._count is not None and rule._count > MAX_SCANNED_OCCURRENCES:
+        return fields
+    else:
+        # dateutil steps through the occurrences one at a time, so it is only asked for so many
+        occurrences = list(islice(rule, MAX_SCANNED_OCCURRENCES + 1))
+        if len(occurrences) > MAX_SCANNED_OCCURRENCES:
+            return fields
+        last = occurrences[-1] if occurrences else None
+    if last is None:
+        # The rule ends before it starts, so the event never recurs
+        fields["last_occurrence"] = start
+    else:
+        fields["last_occurrence"] = last + (duration or timedelta(0))
+    return fields
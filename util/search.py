@@ -0,0 +1,145 @@
+"""
+Full-text search over a user's events and study sessions.
+
+On PostgreSQL, Event and StudySession have a search_vector column holding their weighted title
+and description. A trigger keeps it current on every insert and update, bulk writes included, and
+a GIN index covers it, both created by the migrations that add the columns.
+Each word of a query is matched as a prefix, and the matching ids are used as a subquery.
+
+Other databases have no full-text search, so there an inverted index of each user's events and
+sessions is built in the process on their first search. It is cached until their FeedVersion
+changes, which happens whenever any of their events or sessions do.
+"""
+import heapq
+import re
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+from itertools import islice
+
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection
+from django.utils.dateparse import parse_date
+
+# Text search configuration of queries, which must match the one the migrations created the triggers with
+SEARCH_CONFIG = "english"
+
+# Rank given to a match in the title and in the description, by the in-process index. The trigger
+# weighs them as A and B, which ts_rank scores 1.0 and 0.4 by default.
+TITLE_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+
+# Number of users whose in-process indexes are kept
+INDEX_CACHE_SIZE = 128
+
+# Letters and digits, which are safe to pass to to_tsquery()
+WORD = re.compile(r"[^\W_]+")
+
+_indexes = OrderedDict()
+
+
+def words(text):
+    return WORD.findall((text or "").lower())
+
+
+class SearchIndex:
+    """
+    An in-process inverted index from words to the ids of the rows they appear in, with a
+    sorted word list for prefix lookups.
+    """
+
+    def __init__(self, rows):
+        """
+        rows are (id, title, description) tuples.
+        """
+        postings = defaultdict(dict)
+        for row_id, title, description in rows:
+            for word in words(description):
+                postings[word][row_id] = postings[word].get(row_id, 0) + DESCRIPTION_WEIGHT
+            for word in words(title):
+                postings[word][row_id] = postings[word].get(row_id, 0) + TITLE_WEIGHT
+        self.postings = dict(postings)
+        self.words = sorted(self.postings)
+
+    def prefix_matches(self, prefix):
+        """
+        Returns {id: score} for the rows with a word starting with prefix.
+        """
+        matches = {}
+        position = bisect_left(self.words, prefix)
+        while position < len(self.words) and self.words[position].startswith(prefix):
+            for row_id, score in self.postings[self.words[position]].items():
+                matches[row_id] = matches.get(row_id, 0) + score
+            position += 1
+        return matches
+
+    def search(self, query):
+        """
+        Returns the ids of the rows matching every word of the query as a prefix, best first.
+        """
+        terms = words(query)
+        if not terms:
+            return []
+        scores = self.prefix_matches(terms[0])
+        for term in terms[1:]:
+            matches = self.prefix_matches(term)
+            scores = {row_id: score + matches[row_id] for row_id, score in scores.items() if row_id in matches}
+        return sorted(scores, key=lambda row_id: (-scores[row_id], row_id))
+
+
+def prefix_query(query):
+    """
+    Returns a SearchQuery matching every word of the query as a prefix, or None if it has no words.
+    """
+    terms = words(query)
+    if not terms:
+        return None
+    return SearchQuery(" & ".join(f"{term}:*" for term in terms), search_type="raw", config=SEARCH_CONFIG)
+
+
+def matching_ids(queryset, query, kind, version):
+    """
+    Returns the ids of the rows of queryset, one user's events or sessions, whose title or
+    description match the query, for an id__in lookup. On PostgreSQL that is a values("id")
+    queryset, which runs as a subquery, so only the rows a page needs are ever read. kind and
+    version key the in-process index used on databases without full-text search; version must
+    change whenever the rows do.
+    """
+    if connection.vendor == "postgresql":
+        search_query = prefix_query(query)
+        if search_query is None:
+            return queryset.none().values("id")
+        return queryset.filter(search_vector=search_query).values("id")
+
+    index = _indexes.get(kind)
+    if index is None or index[0] != version:
+        index = (version, SearchIndex(queryset.values_list("id", "title", "description").iterator()))
+    _indexes[kind] = index
+    _indexes.move_to_end(kind)
+    while len(_indexes) > INDEX_CACHE_SIZE:
+        _indexes.popitem(last=False)
+    return index[1].search(query)
+
+
+def parse_search_date(query):
+    """
+    Returns the date a query such as "2025-05-15" stands for, or None if it isn't one.
+    """
+    try:
+        return parse_date(query.strip())
+    except ValueError:
+        return None
+
+
+def merged_page(sources, key, page, page_size, reverse=True):
+    """
+    Merges iterables that are each sorted by key, newest first by default, and returns the items
+    on the given page along with whether there is a page after it. The merge is lazy, so sources
+    are only read as far as the page reaches.
+    """
+    first = (page - 1) * page_size
+    items = list(islice(heapq.merge(*sources, key=key, reverse=reverse), first, first + page_size + 1))
+    return items[:page_size], len(items) > page_size
+
+
+def clear_search_indexes():
+    _indexes.clear()
@@ -0,0 +1,177 @@
+"""
+Moves everything in a calendar, or all of a user's study sessions, by the same amount of time,
+as when a university shifts a whole term.
+
+Each shift is a handful of set-based UPDATEs (start = start + interval) run in one transaction,
+so the number of statements doesn't grow with the number of rows. Durations are unchanged, as
+start and end move together. Times move in the site's time zone, so a 9am lecture moved across a
+clock change is still at 9am, as its recurrence rule expects. Moving a time that way adds the
+interval plus a correction of the offset change, which only changes at the few points around a
+clock change; the UPDATEs add it with a CASE over those points. Recurring events' occurrences
+are moved the same way rather than expanded again. Only the DTSTART and UNTIL in their rule
+text, which SQL can't parse portably, are rewritten one by one, for the rules that have them.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Case, DurationField, F, Max, Min, Q, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThan
+from django.utils.timezone import localtime
+
+from calendarapp.models import Event, EventOccurrence
+from study_sessions.models import StudySession, StudySessionParticipant
+from util.feed_cache import invalidate_feeds
+from util.occurrences import MICROSECOND, ROLL_BATCH_SIZE, history_start
+from util.recurrence import shift_rule
+
+# Step that the time zone is checked at for offset changes, shorter than the time between any two
+OFFSET_SCAN_STEP = timedelta(days=7)
+
+
+def parse_shift(data):
+    """
+    Returns the timedelta given by the days, hours and minutes of a request's data, any of which
+    may be negative or left out. Raises ValueError if none is given or they add up to nothing.
+    """
+    parts = {unit: data.get(unit) for unit in ("days", "hours", "minutes") if data.get(unit) not in (None, "")}
+    try:
+        delta = timedelta(**{unit: int(str(value)) for unit, value in parts.items()})
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("days, hours and minutes must be whole numbers")
+    if not delta:
+        raise ValueError("Give a number of days, hours or minutes to move by")
+    return delta
+
+
+def offset_changes(start, end):
+    """
+    Returns the times between start and end at which the site's time zone changes its UTC offset.
+    """
+    changes = []
+    before = start
+    while before < end:
+        after = min(before + OFFSET_SCAN_STEP, end)
+        if localtime(before).utcoffset() != localtime(after).utcoffset():
+            low, high = before, after
+            while high - low > MICROSECOND:
+                middle = low + (high - low) / 2
+                if localtime(middle).utcoffset() == localtime(low).utcoffset():
+                    low = middle
+                else:
+                    high = middle
+            changes.append(high)
+        before = after
+    return changes
+
+
+def local_shift_corrections(start, end, delta):
+    """
+    Returns what has to be added to t + delta to move t by delta in local time instead, for every
+    t between start and end, as a list of (from, correction) sorted by from, the first from None.
+    The correction only changes at a clock change, or where t + delta in local time reaches one.
+    """
+    def correction(t):
+        return (localtime(t) + delta).astimezone(dt_timezone.utc) - (t + delta).astimezone(dt_timezone.utc)
+
+    margin = abs(delta) + timedelta(days=1)
+    changes = offset_changes(start - margin, end + margin)
+    offsets = {localtime(t).utcoffset() for t in [start, *changes, *(t - MICROSECOND for t in changes)]}
+    points = set(changes)
+    for change in changes:
+        for wall in (change + localtime(change - MICROSECOND).utcoffset(), change + localtime(change).utcoffset()):
+            points.update(wall - delta - offset for offset in offsets)
+
+    corrections = [(None, correction(start))]
+    for point in sorted(t for t in points if start < t <= end):
+        if correction(point) != corrections[-1][1]:
+            corrections.append((point, correction(point)))
+    return corrections
+
+
+def local_shift(field, delta, corrections, by=None):
+    """
+    Returns an expression for field moved by delta in local time, using the corrections of the
+    value of by, an expression that is field itself by default.
+    """
+    shifted = F(field) + delta
+    if len(corrections) == 1 and not corrections[0][1]:
+        return shifted
+    by = by or F(field)
+    whens = [
+        When(LessThan(by, point), then=Value(correction))
+        for (_, correction), (point, _) in zip(corrections, corrections[1:])
+    ]
+    return shifted + Case(*whens, default=Value(corrections[-1][1]), output_field=DurationField())
+
+
+def shift_calendar(calendar, delta):
+    """
+    Moves every event in calendar by delta, a timedelta, in local time. Returns the number of
+    events moved.
+    """
+    events = Event.objects.filter(calendar=calendar)
+    with transaction.atomic():
+        bounds = events.aggregate(
+            Min("start"), Max("start"), Max("rrule_until"), Max("last_occurrence"), Max("occurrences_until")
+        )
+        if bounds["start__min"] is None:
+            return 0
+        corrections = local_shift_corrections(
+            bounds["start__min"], max(value for value in bounds.values() if value is not None), delta
+        )
+
+        # An occurrence ends its duration after it starts, so both move with its start's correction
+        last_start = F("last_occurrence") - Coalesce(F("duration"), Value(timedelta(0)))
+        moved = events.update(
+            start=local_shift("start", delta, corrections),
+            end=local_shift("end", delta, corrections, by=F("start")),
+            rrule_until=local_shift("rrule_until", delta, corrections),
+            last_occurrence=local_shift("last_occurrence", delta, corrections, by=last_start),
+            occurrences_until=local_shift("occurrences_until", delta, corrections),
+        )
+        EventOccurrence.objects.filter(event__calendar=calendar).update(
+            occurrence_start=local_shift("occurrence_start", delta, corrections),
+            occurrence_end=local_shift("occurrence_end", delta, corrections, by=F("occurrence_start")),
+        )
+        if delta > timedelta(0):
+            # Events written from OCCURRENCE_HISTORY ago now have nothing written for the start of it, so
+            # they are left for roll_occurrences to write again, with their rule checked directly until then
+            clipped = events.filter(rrule__isnull=False, start__lt=history_start() + delta).exclude(rrule="")
+            EventOccurrence.objects.filter(event__in=clipped).delete()
+            clipped.update(occurrences_until=None)
+
+        # Rule text is rewritten once for each distinct rule, and written back with one executemany
+        rules = events.filter(Q(rrule__icontains="DTSTART") | Q(rrule__icontains="UNTIL="))
+        shifted = {}
+        changed = []
+        for event_id, rrule in rules.values_list("id", "rrule").iterator(chunk_size=ROLL_BATCH_SIZE):
+            if rrule not in shifted:
+                shifted[rrule] = shift_rule(rrule, delta)
+            changed.append((shifted[rrule], event_id))
+        if changed:
+            quote = connection.ops.quote_name
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"UPDATE {quote(Event._meta.db_table)} SET {quote('rrule')} = %s WHERE {quote('id')} = %s", changed
+                )
+
+        invalidate_feeds([calendar.user_id])
+    return moved
+
+
+def shift_sessions(user, delta):
+    """
+    Moves every study session user hosts by delta, which must be a whole number of days, as a
+    session's times are kept apart from its date. Recurring sessions follow their first date.
+    Returns the number of sessions moved.
+    """
+    if delta % timedelta(days=1):
+        raise ValueError("Study sessions can only be moved by whole days")
+
+    sessions = StudySession.objects.filter(host=user, calendar_id__pending_delete=False)
+    with transaction.atomic():
+        moved = sessions.update(date=F("date") + delta)
+        participants = StudySessionParticipant.objects.filter(study_session__host=user)
+        invalidate_feeds([user.id, *participants.values_list("participant_id", flat=True)])
+    return moved
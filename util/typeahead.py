@@ -0,0 +1,163 @@
+"""
+Search-as-you-type suggestions from the titles of a user's events and study sessions and the names
+of their modules.
+
+On PostgreSQL the titles are matched fuzzily with pg_trgm, whose GIN indexes are created by the
+*_trgm migrations of each app. Other databases use a prefix trie of the user's
+distinct titles, built in the process on their first keystroke and cached until their FeedVersion
+changes. Modules are few enough (at most six a user) to be matched directly every time.
+"""
+from collections import Counter, OrderedDict
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Count, Max
+
+from calendarapp.models import Event
+from modules.models import Module
+from study_sessions.models import StudySession
+from util.busy_intervals import session_feed_queryset
+from util.search import words
+
+# Number of suggestions returned by default, and at most
+TYPEAHEAD_LIMIT = 8
+MAX_TYPEAHEAD_LIMIT = 25
+
+# Lowest pg_trgm word similarity a title needs to be suggested
+MIN_SIMILARITY = 0.3
+
+# Number of users whose tries are kept
+TRIE_CACHE_SIZE = 128
+
+_tries = OrderedDict()
+
+
+class TitleTrie:
+    """
+    A trie over every word of a set of titles. Each node holds the titles with a word starting with
+    its prefix, best first, so the suggestions for a prefix are read off the node it ends at.
+    """
+
+    def __init__(self, titles):
+        """
+        titles maps (kind, title) to the number of rows with that title.
+        """
+        self.titles = sorted(titles, key=lambda key: (-titles[key], key[1].lower(), key[0]))
+        self.counts = [titles[key] for key in self.titles]
+        self.root = {}
+        self.sets = {}
+        # Titles are added best first, so each node's list ends up in order. A title whose first
+        # word has the prefix goes in the node's leading list, ahead of those matching later words.
+        for index, (_, title) in enumerate(self.titles):
+            for position, word in enumerate(dict.fromkeys(words(title))):
+                node = self.root
+                for character in word:
+                    node = node.setdefault(character, {})
+                    leading, other = node.setdefault(None, ([], []))
+                    matches = leading if position == 0 else other
+                    if not matches or matches[-1] != index:
+                        matches.append(index)
+        self._merge(self.root)
+
+    def _merge(self, node):
+        # A title can be listed under both leading and other when two of its words share a prefix
+        for character, child in node.items():
+            if character is None:
+                continue
+            leading, other = child[None]
+            first = set(leading)
+            child[None] = leading + [index for index in other if index not in first]
+            self._merge(child)
+
+    def node(self, prefix):
+        node = self.root
+        for character in prefix:
+            node = node.get(character)
+            if node is None:
+                return None
+        return node
+
+    def search(self, query, limit=TYPEAHEAD_LIMIT):
+        """
+        Returns up to limit (kind, title, count) tuples for the titles with a word starting with each
+        word of the query, best first.
+        """
+        terms = words(query)
+        if not terms:
+            return []
+        nodes = []
+        for term in terms:
+            node = self.node(term)
+            if node is None:
+                return []
+            nodes.append((term, node[None]))
+        nodes.sort(key=lambda item: len(item[1]))
+        # Membership in the other words' lists is checked against sets, made once per prefix
+        others = [self.sets.get(term) or self.sets.setdefault(term, set(matches)) for term, matches in nodes[1:]]
+
+        suggestions = []
+        for index in nodes[0][1]:
+            if all(index in matches for matches in others):
+                suggestions.append((*self.titles[index], self.counts[index]))
+                if len(suggestions) == limit:
+                    break
+        return suggestions
+
+
+def title_trie(user, version):
+    """
+    Returns the trie of the user's event and session titles, building it if version, which must
+    change whenever they do, differs from that of the cached one.
+    """
+    trie = _tries.get(user.id)
+    if trie is None or trie[0] != version:
+        titles = Counter()
+        for title in Event.objects.filter(calendar__user=user, calendar__pending_delete=False).values_list("title", flat=True).iterator():
+            titles["event", title] += 1
+        for title in session_feed_queryset(user).values_list("title", flat=True):
+            titles["session", title] += 1
+        trie = (version, TitleTrie(titles))
+    _tries[user.id] = trie
+    _tries.move_to_end(user.id)
+    while len(_tries) > TRIE_CACHE_SIZE:
+        _tries.popitem(last=False)
+    return trie[1]
+
+
+def trigram_suggestions(queryset, kind, field, query, limit):
+    """
+    Returns up to limit (kind, title, count) tuples for the distinct values of field in queryset
+    that are similar to the query, most similar first.
+    """
+    matches = queryset.filter(**{f"{field}__trigram_word_similar": query}).values(field)
+    matches = matches.annotate(count=Count("id"), similarity=Max(TrigramWordSimilarity(query, field)))
+    matches = matches.filter(similarity__gte=MIN_SIMILARITY).order_by("-similarity", "-count", field)[:limit]
+    return [(kind, match[field], match["count"]) for match in matches]
+
+
+def suggestions(user, query, version, limit=TYPEAHEAD_LIMIT):
+    """
+    Returns up to limit suggestions for what the user is typing, as dicts with the kind ("module",
+    "event" or "session"), title and number of matching rows. Modules come first.
+    """
+    modules = Module.objects.filter(user=user)
+    if connection.vendor == "postgresql":
+        found = trigram_suggestions(modules, "module", "name", query, limit)
+        events = Event.objects.filter(calendar__user=user, calendar__pending_delete=False)
+        found += trigram_suggestions(events, "event", "title", query, limit)
+        sessions = StudySession.objects.filter(id__in=session_feed_queryset(user).values("id"))
+        found += trigram_suggestions(sessions, "session", "title", query, limit)
+    else:
+        terms = words(query)
+        module_names = Counter(
+            name for name in modules.values_list("name", flat=True)
+            if terms and all(any(word.startswith(term) for word in words(name)) for term in terms)
+        )
+        found = [("module", name, count) for name, count in sorted(module_names.items())]
+        found += title_trie(user, version).search(query, limit)
+
+    return [{"kind": kind, "title": title, "count": count} for kind, title, count in found[:limit]]
+
+
+def clear_typeahead_tries():
+    _tries.clear()
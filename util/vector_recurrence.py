@@ -0,0 +1,208 @@
+"""
+Expands many recurrence rules at once with NumPy.
+
+Most imported timetable rules are plain DAILY or WEEKLY rules with an INTERVAL, COUNT, UNTIL or
+BYDAY. The occurrences of such a rule are a fixed pattern of days repeated every period, all at the
+time of day of its start, so the occurrences of every event sharing a pattern can be worked out
+together as one array. Any other rule falls back to dateutil.
+
+Occurrences are returned as int64 arrays of wall clock times, in seconds since 1970-01-01, in the
+time zone of the rule's start. The results match dateutil's rrule.between() exactly: bounds are
+compared approximately in wall clock time, and the few occurrences within a day of a bound, where
+a time zone change could decide it, are compared with real datetimes just as dateutil would.
+"""
+from datetime import datetime, timedelta
+from math import gcd
+
+import numpy as np
+from dateutil.rrule import DAILY, WEEKLY, rrule
+
+DAY = 24 * 60 * 60
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+# Stands in for a missing COUNT or UNTIL
+NO_BOUND = 2 ** 60
+
+# Margin, in seconds, outside which wall clock times are ordered the same way as the instants they stand for
+BOUND_MARGIN = DAY
+
+# Rule attributes that make a rule too complex to vectorize when set
+COMPLEX_PARTS = (
+    "_bymonth", "_bymonthday", "_bynmonthday", "_byyearday", "_byeaster", "_byweekno", "_bysetpos", "_bynweekday",
+)
+
+
+def day_pattern(rule):
+    """
+    Returns (first period day, period, day offsets, skipped) for a simple DAILY or WEEKLY dateutil
+    rule, or None if the rule is not simple. The candidate days of the rule are the offsets added
+    to the first period day plus a multiple of the period, with the first `skipped` of them falling
+    before the rule's start.
+    """
+    if not isinstance(rule, rrule) or rule._freq not in (DAILY, WEEKLY):
+        return None
+    if any(getattr(rule, part) for part in COMPLEX_PARTS) or len(rule._timeset or ()) != 1:
+        return None
+
+    start_day = rule._dtstart.toordinal() - EPOCH_ORDINAL
+    weekday = rule._dtstart.weekday()
+    if rule._freq == WEEKLY:
+        # Weeks begin on WKST, and only the days of the first week from the start onwards count
+        first_day = start_day - (weekday - rule._wkst) % 7
+        offsets = sorted({(day - rule._wkst) % 7 for day in rule._byweekday})
+        skipped = sum(1 for offset in offsets if offset < start_day - first_day)
+        return first_day, 7 * rule._interval, tuple(offsets), skipped
+
+    if not rule._byweekday:
+        return start_day, rule._interval, (0,), 0
+    # Which days match BYDAY repeats every lcm(interval, 7) days
+    period = rule._interval * 7 // gcd(rule._interval, 7)
+    offsets = tuple(
+        offset for offset in range(0, period, rule._interval) if (weekday + offset) % 7 in rule._byweekday
+    )
+    return start_day, period, offsets, 0
+
+
+def time_of_day(rule):
+    return rule._dtstart.hour * 3600 + rule._dtstart.minute * 60 + rule._dtstart.second
+
+
+def last_wall(rule):
+    """
+    Returns the wall clock time of the last occurrence of a simple rule with a COUNT and no UNTIL,
+    worked out directly rather than by expanding the rule, or None for any other rule.
+    """
+    pattern = day_pattern(rule)
+    if pattern is None or not rule._count or rule._until is not None or not pattern[2]:
+        return None
+    first_day, period, offsets, skipped = pattern
+    index = skipped + rule._count - 1
+    return (first_day + period * (index // len(offsets)) + offsets[index % len(offsets)]) * DAY + time_of_day(rule)
+
+
+def to_wall(value, tzinfo):
+    """
+    Returns a datetime as wall clock seconds in tzinfo, the time zone of a rule's start.
+    """
+    if value.tzinfo is not None and tzinfo is not None:
+        value = value.astimezone(tzinfo)
+    return int((value.replace(tzinfo=None) - EPOCH).total_seconds())
+
+
+def to_datetime(wall, tzinfo):
+    """
+    Returns the datetime dateutil gives for an occurrence at wall clock seconds in tzinfo.
+    """
+    return (EPOCH + timedelta(seconds=int(wall))).replace(tzinfo=tzinfo)
+
+
+def to_datetimes(walls, tzinfo):
+    """
+    Returns the datetimes of an array of wall clock occurrences.
+    """
+    return [value.replace(tzinfo=tzinfo) for value in walls.astype("datetime64[s]").tolist()]
+
+
+def expand_rules(rules, after, before, inc=True):
+    """
+    Returns, for each dateutil rule, an array of the wall clock times of the occurrences that
+    rule.between(after, before, inc) would return. after and before are either datetimes or lists
+    with a datetime for each rule. Simple rules sharing a day pattern are expanded together as one
+    array; other rules are expanded by dateutil.
+    """
+    rules = list(rules)
+    afters = after if isinstance(after, (list, tuple)) else [after] * len(rules)
+    befores = before if isinstance(before, (list, tuple)) else [before] * len(rules)
+    results = [None] * len(rules)
+    groups = {}
+    for index, rule in enumerate(rules):
+        pattern = day_pattern(rule)
+        if pattern is None:
+            occurrences = rule.between(afters[index], befores[index], inc=inc)
+            walls = [to_wall(occurrence, rule._tzinfo) for occurrence in occurrences]
+            results[index] = np.array(walls, dtype=np.int64)
+        else:
+            first_day, period, offsets, skipped = pattern
+            groups.setdefault((period, offsets), []).append((index, first_day, skipped))
+
+    for (period, offsets), members in groups.items():
+        for index, walls in _expand_group(rules, period, offsets, members, afters, befores, inc):
+            results[index] = walls
+    return results
+
+
+def _expand_group(rules, period, offsets, members, afters, befores, inc):
+    """
+    Expands rules with the same period and day offsets as one two-dimensional array, a row per rule.
+    """
+    per_period = len(offsets)
+    if not per_period:
+        # A DAILY rule whose interval never lands on one of its BYDAY days
+        for index, _, _ in members:
+            yield index, np.empty(0, dtype=np.int64)
+        return
+
+    # Most rules share their bounds and time zone, so each bound is converted once. Bounds are keyed
+    # by id, as hashing an aware datetime is slow, and all of them are alive until this returns.
+    walls_of = {}
+    rows = []
+    for index, first_day, skipped in members:
+        rule = rules[index]
+        tzinfo = rule._tzinfo
+        for bound in (afters[index], befores[index]):
+            if (id(bound), tzinfo) not in walls_of:
+                walls_of[id(bound), tzinfo] = to_wall(bound, tzinfo)
+        until_wall = NO_BOUND if rule._until is None else to_wall(rule._until, tzinfo)
+        count = NO_BOUND if rule._count is None else rule._count
+        after_wall, before_wall = walls_of[id(afters[index]), tzinfo], walls_of[id(befores[index]), tzinfo]
+        rows.append((index, first_day, skipped, count, time_of_day(rule), after_wall, before_wall, until_wall))
+
+    columns = (np.array(column, dtype=np.int64) for column in zip(*rows))
+    indexes, first_days, skipped, counts, times, after_walls, before_walls, until_walls = columns
+    stop_walls = np.minimum(before_walls, until_walls)
+
+    # Only generate the candidates from a few days before after to a few days past the stop. If the
+    # stop is well before after, every occurrence from after onwards is past it and none is returned.
+    low_days = (after_walls - 3 * BOUND_MARGIN) // DAY
+    high_days = (stop_walls + 3 * BOUND_MARGIN) // DAY
+    firsts = np.maximum(0, np.maximum(0, (low_days - first_days) // period) * per_period - skipped)
+    lasts = np.minimum(np.maximum(0, ((high_days - first_days) // period + 1) * per_period - skipped), counts)
+    lasts[stop_walls < after_walls - 2 * BOUND_MARGIN] = 0
+    widths = np.maximum(0, lasts - firsts)
+
+    columns = np.arange(int(widths.max()), dtype=np.int64)[None, :]
+    candidates = skipped[:, None] + firsts[:, None] + columns
+    days = first_days[:, None] + period * (candidates // per_period) + np.array(offsets)[candidates % per_period]
+    # Padding past a row's candidates sorts after every bound
+    walls = np.where(columns < widths[:, None], days * DAY + times[:, None], NO_BOUND + 2 * BOUND_MARGIN)
+
+    until_stops = _first_indexes(rules, indexes, walls, until_walls, lambda i, value: value > rules[i]._until)
+    if inc:
+        before_stops = _first_indexes(rules, indexes, walls, before_walls, lambda i, value: value > befores[i])
+        starts = _first_indexes(rules, indexes, walls, after_walls, lambda i, value: value >= afters[i])
+    else:
+        before_stops = _first_indexes(rules, indexes, walls, before_walls, lambda i, value: value >= befores[i])
+        starts = _first_indexes(rules, indexes, walls, after_walls, lambda i, value: value > afters[i])
+    stops = np.minimum(np.minimum(until_stops, before_stops), widths)
+
+    for row, (index, start, stop) in enumerate(zip(indexes.tolist(), starts.tolist(), stops.tolist())):
+        yield index, walls[row, start:max(start, stop)]
+
+
+def _first_indexes(rules, indexes, walls, bound_walls, test):
+    """
+    Returns, for each row of wall clock times, the index of the first for which test, a comparison
+    with a bound given the rule's index and an occurrence, is true. Times more than BOUND_MARGIN either side of the bound are settled by their
+    wall clock time alone, and only the rows with times closer than that are compared as datetimes.
+    """
+    low = (walls < (bound_walls - BOUND_MARGIN)[:, None]).sum(axis=1)
+    high = (walls <= (bound_walls + BOUND_MARGIN)[:, None]).sum(axis=1)
+    for row in np.flatnonzero(low != high).tolist():
+        index = int(indexes[row])
+        for position in range(low[row], high[row]):
+            if test(index, to_datetime(walls[row, position], rules[index]._tzinfo)):
+                high[row] = position
+                break
+    return high
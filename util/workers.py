@@ -0,0 +1,37 @@
+"""
+Helpers for running work in a pool of spawned worker processes.
+
+Workers are spawned rather than forked so they never share the parent's database connection.
+A spawned worker imports this module before Django is set up, so it must not import any models
+at the top level. Work is referred to by its dotted path and only imported once Django is ready.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from importlib import import_module
+
+import django
+from django.db import connections
+
+
+def init_worker():
+    django.setup()
+
+
+def run(path, *args):
+    """
+    Imports the function at the dotted path and calls it with args.
+    """
+    module_name, function_name = path.rsplit(".", 1)
+    try:
+        return getattr(import_module(module_name), function_name)(*args)
+    finally:
+        # Workers are long lived, so don't hold a connection open between jobs
+        connections.close_all()
+
+
+def worker_pool(workers):
+    """
+    Returns a process pool whose workers have Django set up. Submit work to it with run().
+    """
+    context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker)